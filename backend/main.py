@@ -1,6 +1,6 @@
 from fastapi import FastAPI, HTTPException, Request, Response, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse, RedirectResponse
+from fastapi.responses import FileResponse, StreamingResponse, RedirectResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 import os
 import mimetypes
@@ -12,9 +12,36 @@ import tempfile
 import base64
 import asyncio
 import threading
+import signal
 from concurrent.futures import ThreadPoolExecutor
 import hashlib
+import io
 import json
+import math
+import re
+import sqlite3
+import struct
+import ctypes
+import ctypes.util
+import bisect
+import contextlib
+import contextvars
+import cProfile
+import heapq
+import ipaddress
+import socket
+import itertools
+import shutil
+import sys
+import time
+import warnings
+from PIL import Image, ImageOps
+
+# AVIF encoding is optional: newer Pillow builds ship it, older ones need the plugin
+try:
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
 
 app = FastAPI(title="Photo Viewer API", version="1.0.0")
 
@@ -22,19 +49,59 @@ app = FastAPI(title="Photo Viewer API", version="1.0.0")
 async def startup_event():
     """Start the thumbnail queue processor on app startup."""
     print("🚀 Starting queue processors...")
+    trusted_proxy_networks[:] = await asyncio.get_event_loop().run_in_executor(None, resolve_trusted_proxies_sync)
+    
+    try:
+        await load_job_journal()
+        asyncio.create_task(job_journal_writer())
+    except Exception as e:
+        print(f"❌ Error loading job journal: {e}")
+    
     try:
-        asyncio.create_task(process_thumbnail_queue())
+        for worker_id in range(MAX_CONCURRENT_THUMBNAILS):
+            asyncio.create_task(process_thumbnail_queue(worker_id))
         print("✅ Thumbnail queue processor started")
     except Exception as e:
         print(f"❌ Error starting thumbnail queue processor: {e}")
     
     try:
-        asyncio.create_task(process_conversion_queue())
+        for worker_id in range(MAX_CONCURRENT_CONVERSIONS):
+            asyncio.create_task(process_conversion_queue(worker_id))
         print("✅ Conversion queue processor started")
     except Exception as e:
         print(f"❌ Error starting conversion queue processor: {e}")
     
     print("🎯 All queue processors started")
+    
+    setup_qos_cgroups()
+    
+    try:
+        asyncio.create_task(resume_journaled_jobs())
+    except Exception as e:
+        print(f"❌ Error resuming journaled jobs: {e}")
+    
+    try:
+        asyncio.create_task(search_index_loop())
+        asyncio.create_task(folder_stats_loop())
+        asyncio.create_task(admission_backlog_loop())
+        print("✅ Search indexer started")
+    except Exception as e:
+        print(f"❌ Error starting search indexer: {e}")
+    
+    try:
+        await start_library_watcher()
+    except Exception as e:
+        print(f"❌ Error starting library watcher: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Kill any ffmpeg still running so none outlive the server, and write out the last journal changes."""
+    for process in list(ffmpeg_processes):
+        signal_process_group(process, signal.SIGKILL)
+    try:
+        await flush_job_journal()
+    except Exception as e:
+        print(f"❌ Error writing job journal: {e}")
 
 # CORS middleware
 app.add_middleware(
@@ -43,8 +110,80 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],  # So the frontend can back off when a queue is full
 )
 
+def add_timing(name: str, seconds: float, description: str = None):
+    """Add time to a span of the current request (does nothing outside a request, e.g. in queue workers)."""
+    timings = request_timings.get()
+    if timings is None:
+        return
+    span = timings.setdefault(name, [0.0, None])
+    span[0] += seconds
+    if description is not None:
+        span[1] = description
+
+@contextlib.contextmanager
+def timing_span(name: str):
+    """Time a block as a span of the current request; spans with the same name add up."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(name, time.perf_counter() - started)
+
+def start_background_task(coro) -> asyncio.Task:
+    """Start a task that may outlive the current request, in a fresh context so its time isn't added to the request's spans."""
+    return asyncio.create_task(coro, context=contextvars.Context())
+
+def format_server_timing(timings: Dict[str, List[Any]]) -> str:
+    """Server-Timing header value for a request's spans."""
+    metrics = []
+    for name, (seconds, description) in timings.items():
+        metric = f"{name};dur={seconds * 1000:.1f}"
+        if description:
+            metric += f';desc="{description}"'
+        metrics.append(metric)
+    return ", ".join(metrics)
+
+@app.middleware("http")
+async def server_timing_middleware(request: Request, call_next):
+    """Collect timing spans while a request is handled and report them in a Server-Timing header."""
+    if not SERVER_TIMING_ENABLED:
+        return await call_next(request)
+    # Spans are added to this dict in place, so they're seen here even though the endpoint runs in its own task
+    timings = {}
+    request_timings.set(timings)
+    started = time.perf_counter()
+    response = await call_next(request)
+    add_timing("total", time.perf_counter() - started)
+    response.headers["Server-Timing"] = format_server_timing(timings)
+    response.headers["Timing-Allow-Origin"] = "*"  # Let the frontend's Resource Timing API read it across origins
+    return response
+
+@app.middleware("http")
+async def request_profile_middleware(request: Request, call_next):
+    """With REQUEST_PROFILING on, run requests sent with an X-Profile header under cProfile and save the stats."""
+    if not REQUEST_PROFILING or not request.headers.get("x-profile") or profile_state["request_profiling"]:
+        return await call_next(request)
+    
+    # cProfile sees everything the event loop thread runs meanwhile, so only one request is profiled at a time
+    profile_state["request_profiling"] = True
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        response = await call_next(request)
+    finally:
+        profiler.disable()
+        profile_state["request_profiling"] = False
+    
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    name = f"{int(time.time() * 1000)}{request.url.path.replace('/', '_')[:100]}.prof"
+    profiler.dump_stats(str(PROFILE_DIR / name))
+    response.headers["X-Profile-File"] = name
+    print(f"🔬 Saved request profile {name}")
+    return response
+
 # Photo directory from environment variable
 PHOTOS_DIR = os.getenv("PHOTOS_DIR", "/photos")
 
@@ -58,18 +197,41 @@ CONVERTIBLE_VIDEO_EXTENSIONS = {'.avi', '.wmv', '.flv'}
 
 # Thumbnail cache and processing state
 thumbnail_cache = {}
+thumbnail_cache_keys = {}  # file path -> its current key in thumbnail_cache, for cleanup when the file changes
 thumbnail_processing = set()
-thumbnail_queued = set()  # Track items already in queue to prevent duplicates
+thumbnail_queued = {}  # file path -> priority, queue time and client of each waiting job (also prevents duplicates)
+thumbnail_queued_by_priority = {}  # priority -> {file path: None} of its waiting jobs, oldest first, so shedding needn't scan
 thumbnail_queue = asyncio.PriorityQueue()  # Changed to PriorityQueue
-thumbnail_executor = ThreadPoolExecutor(max_workers=4)  # Reduced from 6 to 4 to leave resources for conversions
-MAX_CONCURRENT_THUMBNAILS = 4  # Reduced from 6 to 4
+thumbnail_running_tasks = {}  # file path -> (running job task, priority), so clear_thumbnail_queue can cancel it
+MAX_CONCURRENT_THUMBNAILS = 4  # Thumbnail queue workers - reduced from 6 to 4 to leave resources for conversions
+BACKGROUND_THUMBNAIL_PRIORITY = 20  # Below both current-folder (1) and other-folder (10) requests
 
 # Conversion cache and processing state
 conversion_cache = {}
 conversion_processing = set()
 conversion_queue = asyncio.Queue()
-conversion_executor = ThreadPoolExecutor(max_workers=2)  # Increased from 1 to 2 for better throughput
-MAX_CONCURRENT_CONVERSIONS = 2  # Increased from 1 to 2
+conversion_queued = set()  # Track items already in queue to prevent duplicates
+MAX_CONCURRENT_CONVERSIONS = 2  # Conversion queue workers - increased from 1 to 2
+
+# Admission control - queues are bounded so bursts of requests can't pile up unbounded work
+THUMBNAIL_QUEUE_LIMIT = int(os.getenv("THUMBNAIL_QUEUE_LIMIT", "5000"))  # Thumbnail jobs waiting for a worker
+CONVERSION_QUEUE_LIMIT = int(os.getenv("CONVERSION_QUEUE_LIMIT", "1000"))  # Conversions waiting for a worker
+CLIENT_QUEUED_LIMIT = int(os.getenv("CLIENT_QUEUED_LIMIT", "500"))  # Thumbnail jobs one client may have waiting
+QUEUE_STALE_SECONDS = 120  # Waiting this long, a job can be shed for a new one of the same priority
+ADMISSION_RETRY_AFTER_SECONDS = 5  # Retry-After sent when a request's job is turned away
+ADMISSION_READMIT_INTERVAL = 10  # Seconds between checks for room to requeue shed jobs from the journal
+TRUSTED_PROXIES = [  # Peers (addresses, networks or hostnames) whose X-Real-IP / X-Forwarded-For name the real client
+    proxy.strip() for proxy in os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1,frontend").split(",") if proxy.strip()
+]
+trusted_proxy_networks = []  # TRUSTED_PROXIES resolved to networks at startup
+client_queued_counts = {}  # client address -> thumbnail jobs it has waiting
+admission_state = {
+    "backlog": {"thumbnail": False, "conversion": False},  # Journal holds queued jobs that aren't in memory
+    "shed": 0,
+    "rejected_client": 0,
+    "rejected_saturated": 0,
+    "readmitted": 0
+}
 
 # Track current folder for thumbnail priority
 current_folder = None
@@ -78,6 +240,252 @@ current_folder = None
 MAX_TOTAL_FFMPEG_PROCESSES = 6  # Total FFmpeg processes across both systems
 current_ffmpeg_processes = 0
 ffmpeg_semaphore = asyncio.Semaphore(MAX_TOTAL_FFMPEG_PROCESSES)
+INTERACTIVE_FFMPEG_LIMIT = int(os.getenv("INTERACTIVE_FFMPEG_LIMIT", "3"))  # Streaming conversions + open-folder thumbnails at once
+INTERACTIVE_FFMPEG_WAIT_SECONDS = 5  # How long a streaming conversion waits for a slot before getting 503
+interactive_ffmpeg_semaphore = asyncio.Semaphore(INTERACTIVE_FFMPEG_LIMIT)
+
+# QoS classes for ffmpeg - interactive work (what the user is looking at) runs first, backfill only on spare capacity
+QOS_CLASSES = {
+    "interactive": {"nice": 0, "ionice": ["-c", "2", "-n", "0"], "cpu_weight": 1000, "io_weight": 1000},
+    "prefetch": {"nice": 10, "ionice": ["-c", "2", "-n", "4"], "cpu_weight": 100, "io_weight": 100},
+    "backfill": {"nice": 19, "ionice": ["-c", "3"], "cpu_weight": 10, "io_weight": 10},
+}
+QOS_PAUSE_BACKFILL = os.getenv("QOS_PAUSE_BACKFILL", "true").lower() == "true"  # SIGSTOP backfill ffmpeg while interactive work runs
+QOS_CGROUPS = os.getenv("QOS_CGROUPS", "true").lower() == "true"  # Use cgroup v2 cpu/io weights when the cgroup is writable
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+NICE_AVAILABLE = shutil.which("nice") is not None
+IONICE_AVAILABLE = shutil.which("ionice") is not None
+FFMPEG_STDERR_TAIL_BYTES = 8192  # How much of ffmpeg's stderr is kept for error messages
+qos_state = {
+    "interactive_active": 0,  # Interactive ffmpeg jobs currently running
+    "backfill_paused": False,
+    "cgroup_dirs": {},  # QoS class -> cgroup directory, when cgroup weights are in use
+}
+ffmpeg_processes = set()  # All running ffmpeg processes, killed on shutdown
+backfill_processes = set()  # Running backfill processes, paused and resumed as a group
+
+# Persistent cache directory for generated artifacts (display renditions, etc.)
+CACHE_DIR = Path(os.getenv("CACHE_DIR", "/tmp/viewarr_cache"))
+
+# Job journal - thumbnail/conversion job states kept on disk so queued work survives restarts
+JOBS_DB_PATH = CACHE_DIR / "jobs.db"
+JOB_MAX_ATTEMPTS = 3  # After this many failures a file is left alone until it changes
+JOB_RETRY_BASE_SECONDS = 60  # Delay before the first retry, doubled after each further failure
+JOB_RETRY_MAX_SECONDS = 6 * 3600
+JOB_RESUME_BATCH_SIZE = 200  # Jobs resubmitted per event loop turn when resuming at startup
+JOB_KINDS = ("thumbnail", "conversion")
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    state TEXT NOT NULL,  -- queued, running, failed (will retry) or dead (gave up); finished jobs are deleted
+    attempts INTEGER NOT NULL DEFAULT 0,
+    mtime_ns INTEGER,  -- Source file version the attempts were made against
+    last_error TEXT,
+    next_attempt REAL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (kind, path)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state);
+"""
+JOB_JOURNAL_FLUSH_SECONDS = 0.5  # Journal writes are batched into one transaction per this window
+job_journal_connection = None  # Only used from the journal executor's thread
+job_journal_executor = ThreadPoolExecutor(max_workers=1)
+job_states = {}  # (kind, path) -> state, attempts, mtime_ns, last_error, next_attempt, updated of every job not done
+job_journal_pending = {}  # (kind, path) -> row to write, or None to delete; the writer flushes these in batches
+job_journal_event = asyncio.Event()
+
+# Display renditions - screen-sized WebP/AVIF/JPEG copies of images for full-screen viewing
+RENDITION_DIR = CACHE_DIR / "renditions"
+RENDITION_SIZE_BUCKETS = [640, 960, 1280, 1920, 2560, 3840]  # Round viewport sizes up to these to share cache entries
+RENDITION_QUALITY = {"avif": 60, "webp": 80, "jpeg": 85}
+RENDITION_MEDIA_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg"}
+RENDITION_PASSTHROUGH_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}  # Formats every browser can show as-is
+RENDITION_PASSTHROUGH_MAX_BYTES = 2 * 1024 * 1024  # Small browser-friendly originals are served untouched
+rendition_executor = ThreadPoolExecutor(max_workers=2)
+rendition_inflight = {}  # output path -> Future, so concurrent identical requests share one encode
+Image.init()  # Make sure all format plugins are registered before checking encoders
+AVIF_SUPPORTED = "AVIF" in Image.SAVE
+
+# Deep zoom - DZI tile pyramids for images too large to view as one rendition (panoramas, scans)
+DEEP_ZOOM_DIR = CACHE_DIR / "deepzoom"
+DEEP_ZOOM_EXTENSIONS = IMAGE_EXTENSIONS - {'.gif'}
+DEEP_ZOOM_MIN_PIXELS = int(os.getenv("DEEP_ZOOM_MIN_MEGAPIXELS", "50")) * 1000000  # Smaller images only get display renditions
+DEEP_ZOOM_MAX_PIXELS = int(os.getenv("DEEP_ZOOM_MAX_MEGAPIXELS", "1000")) * 1000000  # Never open anything bigger
+DEEP_ZOOM_DECODE_MAX_PIXELS = int(os.getenv("DEEP_ZOOM_DECODE_MEGAPIXELS", "250")) * 1000000  # Bigger JPEGs are tiled from a 1/2, 1/4 or 1/8 scale decode
+DEEP_ZOOM_TILE_SIZE = 254  # DZI convention: 254px plus 1px overlap on each side
+DEEP_ZOOM_TILE_OVERLAP = 1
+DEEP_ZOOM_QUALITY = 85
+deepzoom_executor = ThreadPoolExecutor(max_workers=1)  # One pyramid at a time - a build holds the whole decoded image in memory
+deepzoom_building = set()  # Pyramid dirs being built
+deepzoom_building_sources = set()  # Source paths of those builds - their renditions queue behind the build instead of decoding alongside it
+deepzoom_failed = set()  # Pyramid dirs whose build failed (the source mtime is part of the dir, so edits retry)
+large_image_lock = threading.Lock()  # Held while Pillow's decompression bomb limit is lifted for one open
+
+# Large animated GIFs are transcoded to MP4 - a fraction of the size and far cheaper for the browser to decode
+GIF_VIDEO_DIR = CACHE_DIR / "gif_videos"
+GIF_VIDEO_MIN_BYTES = int(os.getenv("GIF_VIDEO_MIN_MB", "2")) * 1024 * 1024  # Smaller GIFs are served as-is
+
+# Read-ahead prefetching of neighbouring items for full-screen navigation on slow disks
+PREFETCH_NEIGHBORS = int(os.getenv("PREFETCH_NEIGHBORS", "1"))  # Items to warm on each side of the one being viewed
+PREFETCH_READ_BYTES = int(os.getenv("PREFETCH_READ_MB", "8")) * 1024 * 1024  # How much of each file to pull into the page cache
+PREFETCH_MAX_PER_DEVICE = 1  # Concurrent prefetch jobs per disk
+PREFETCH_MAX_PENDING = 8  # Prefetch jobs waiting or running across all disks
+PREFETCH_LIVE_QUIET_SECONDS = 0.5  # A disk must have had no live request for this long before prefetch touches it
+PREFETCH_MAX_WAIT_SECONDS = 10  # Give up on a prefetch that never found a quiet disk
+prefetch_executor = ThreadPoolExecutor(max_workers=2)  # Separate from rendition_executor so prefetch never queues ahead of live encodes
+prefetch_pending = set()  # Relative paths with a prefetch job waiting or running
+prefetch_running_by_device = {}  # st_dev -> running prefetch jobs
+live_reads_by_device = {}  # st_dev -> live reads currently in progress
+last_live_read_by_device = {}  # st_dev -> time.monotonic() of the last live request
+folder_order_cache = {}  # folder path -> (dir mtime_ns, media names in listing order)
+FOLDER_ORDER_CACHE_SIZE = 256
+
+# Per-device I/O scheduling - each disk/mount the library spans gets its own concurrency limit and priority queue
+IO_DEVICE_LIMITS = {  # Concurrent reads per device by kind, overridable with IO_LIMIT_SSD, IO_LIMIT_ROTATIONAL, ...
+    kind: int(os.getenv(f"IO_LIMIT_{kind.upper()}", str(default)))
+    for kind, default in {"ssd": 16, "rotational": 2, "network": 4, "unknown": 4}.items()
+}
+IO_PRIORITY_LIVE = 0  # Range reads, folder listings, thumbnails for the open folder
+IO_PRIORITY_SCAN = 1  # Search index scans
+IO_PRIORITY_PREFETCH = 2  # Neighbour read-ahead, thumbnails for other folders
+THUMBNAIL_IO_PRIORITY = {"interactive": IO_PRIORITY_LIVE, "prefetch": IO_PRIORITY_PREFETCH}  # Backfill reads at idle I/O class instead
+BACKFILL_THUMBNAIL_TIMEOUT = 120.0  # Seconds of unpaused run time before a backfill thumbnail job is given up
+IO_LATENCY_EWMA_ALPHA = 0.2  # Weight of the newest sample in the per-device service time average
+io_read_executor = ThreadPoolExecutor(max_workers=8)  # Range reads, so a slow disk never blocks the event loop
+device_io_state = {}  # st_dev -> kind, limit, in-flight count, waiter heap and latency stats
+io_waiter_seq = itertools.count()  # Tie-breaker so equal-priority waiters are served in arrival order
+
+# Request timing and profiling
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"  # Add Server-Timing headers to API responses
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING", "false").lower() == "true"  # Allow cProfile of requests sent with X-Profile: 1
+PROFILE_DIR = CACHE_DIR / "profiles"
+PROFILE_MAX_SECONDS = 60  # Longest sampling profile one request can ask for
+PROFILE_IDLE_FUNCTIONS = {"wait", "select", "poll", "_worker"}  # Leaf frames of threads blocked waiting for work
+request_timings = contextvars.ContextVar("request_timings", default=None)  # span name -> [seconds, description] for this request
+profile_state = {"sampling": False, "request_profiling": False}
+profile_executor = ThreadPoolExecutor(max_workers=1)  # The sampler sleeps for up to a minute, so it never takes a listing's thread
+
+# Contact sheets - one sprite image per grid page instead of one request per tile
+CONTACT_SHEET_DIR = CACHE_DIR / "contact_sheets"
+CONTACT_SHEET_TILE_SIZES = [128, 256, 384, 512]  # Tile edge in device pixels; larger grid tiles load individually
+CONTACT_SHEET_COLUMNS = 10
+CONTACT_SHEET_DEFAULT_LIMIT = 100
+CONTACT_SHEET_MAX_LIMIT = 200
+CONTACT_SHEET_BACKGROUND = (229, 231, 235)  # Tailwind gray-200, same as an empty tile in the UI
+CONTACT_SHEET_VIDEO_PLACEHOLDER = (31, 41, 55)  # Tailwind gray-800 for videos without a thumbnail yet
+
+# Folder covers and recursive stats - aggregated in the search index as folders change, never walked per request
+FOLDER_COVER_DIR = CACHE_DIR / "folder_covers"
+FOLDER_COVER_ITEMS = 4  # Media in a cover's 2x2 mosaic
+FOLDER_COVER_TILE = 128  # Edge of one mosaic cell in pixels
+FOLDER_STATS_DEBOUNCE_SECONDS = 1  # Let a burst of ingests settle before re-aggregating
+folder_stats_dirty = set()  # Folders whose aggregates need recomputing
+folder_stats_event = asyncio.Event()
+folder_cover_inflight = {}  # output path -> Future
+
+# Recursive listings - every media file beneath a folder, walked in parallel, cached and served a page at a time
+RECURSIVE_WALK_CONCURRENCY = int(os.getenv("RECURSIVE_WALK_CONCURRENCY", "8"))  # Directories one walk lists at once
+RECURSIVE_SORT_KEYS = {  # Sort -> key of a walked (path, name, size, mtime, folder) entry; the path breaks ties
+    "name": lambda entry: (entry[1].lower(), entry[0]),
+    "modified": lambda entry: (entry[3], entry[0]),
+    "size": lambda entry: (entry[2], entry[0])
+}
+RECURSIVE_SORT_COLUMNS = {"name": "py_lower(name)", "modified": "mtime", "size": "size"}  # The same keys as search index columns
+RECURSIVE_DEFAULT_LIMIT = 200
+RECURSIVE_MAX_LIMIT = 1000
+RECURSIVE_CACHE_SIZE = 8  # Walked subtrees kept in memory, least recently used dropped first
+RECURSIVE_REVALIDATE_SECONDS = 10  # Without inotify, re-stat a cached subtree's directories at most this often
+recursive_walk_executor = ThreadPoolExecutor(max_workers=RECURSIVE_WALK_CONCURRENCY)
+recursive_listing_cache = {}  # relative folder -> entries, directory mtimes, change seq and sorted orders
+recursive_walk_inflight = {}  # relative folder -> walk Task, so concurrent requests share one walk
+recursive_index_checked = {}  # relative folder -> when its indexed subtree's mtimes were last checked (polled mounts only)
+contact_sheet_executor = ThreadPoolExecutor(max_workers=2)
+contact_sheet_inflight = {}  # output path -> Future
+
+# Filesystem watcher - inotify where it works, periodic mtime rescans where it doesn't (network mounts)
+WATCH_ENABLED = os.getenv("WATCH_ENABLED", "true").lower() == "true"
+WATCH_DEBOUNCE_SECONDS = 2.0  # Wait for this much quiet before ingesting a changed folder
+WATCH_MAX_DELAY_SECONDS = 30.0  # ...but never hold changes back longer than this during a long copy
+WATCH_SCAN_INTERVAL = int(os.getenv("WATCH_SCAN_INTERVAL", "60"))  # Rescan interval when some folders can't be watched
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', '9p', 'afs', 'ceph', 'glusterfs', 'davfs', 'virtiofs'}
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+INOTIFY_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, name length
+MOUNT_ESCAPE = re.compile(r'\\([0-7]{3})')  # /proc/mounts octal-escapes space, tab, newline and backslash only
+watcher_state = {
+    "fd": None,
+    "watch_count": 0,
+    "fallback_needed": not WATCH_ENABLED,  # True when some folders rely on periodic rescans
+    "pending": set(),  # Folders with changes waiting for the debounce window
+    "first_event": None,
+    "last_event": None,
+    "flush_task": None
+}
+libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+watch_descriptors = {}  # inotify watch descriptor -> relative folder
+mount_table = None  # [(mount point, fstype)], longest mount point first
+library_change_seq = 0
+folder_change_seqs = {}  # relative folder -> change sequence number of its last change
+MAX_TRACKED_FOLDER_CHANGES = 10000
+
+# Filename search index - SQLite table of relative paths with an FTS5 trigram index on top
+SEARCH_DB_PATH = CACHE_DIR / "search_index.db"
+SEARCH_REFRESH_INTERVAL = int(os.getenv("SEARCH_REFRESH_INTERVAL", "300"))  # Seconds between incremental rescans
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_LIMIT = 500
+search_index_executor = ThreadPoolExecutor(max_workers=1)  # Single writer thread owns the write connection
+search_query_executor = ThreadPoolExecutor(max_workers=4)
+search_index_state = {"ready": False, "fts": False, "refreshing": False, "refresh_pending": False, "last_refresh": None, "initial_build": False}
+search_write_connection = None
+search_read_local = threading.local()  # One read-only connection per query thread
+
+SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    folder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_folder ON files(folder);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+CREATE TABLE IF NOT EXISTS folder_stats (
+    path TEXT PRIMARY KEY,
+    file_count INTEGER NOT NULL,
+    total_bytes INTEGER NOT NULL,
+    newest_mtime REAL,
+    cover TEXT NOT NULL
+);
+"""
+
+SEARCH_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(path, content='files', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+    INSERT INTO files_fts(rowid, path) VALUES (new.id, new.path);
+END;
+CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+    INSERT INTO files_fts(files_fts, rowid, path) VALUES ('delete', old.id, old.path);
+END;
+"""
 
 def get_file_type(file_path: Path) -> str:
     """Determine if file is image or video based on extension and magic bytes."""
@@ -107,13 +515,187 @@ def get_converted_filename(file_path: Path) -> str:
     """Generate the filename for a converted video."""
     return f"{file_path.stem}_converted.mp4"
 
-def generate_video_thumbnail_sync(video_path: Path) -> str:
-    """Generate a base64 thumbnail for a video file (synchronous version for background tasks)."""
+def get_converted_path(file_path: Path) -> Path:
+    """Where the background conversion of a video is kept."""
+    return Path("/tmp/video_conversions") / get_converted_filename(file_path)
+
+def is_gif_video_candidate(full_path: Path) -> bool:
+    """Whether a GIF is big enough to be transcoded to MP4 (whether it's animated is checked when converting)."""
+    return full_path.suffix.lower() == '.gif' and full_path.stat().st_size >= GIF_VIDEO_MIN_BYTES
+
+def get_gif_video_path(file_path: str, full_path: Path) -> Path:
+    """Cache path of a GIF's MP4; the source mtime is part of the name so edits invalidate it."""
+    return GIF_VIDEO_DIR / f"{hashlib.md5(file_path.encode()).hexdigest()}_{full_path.stat().st_mtime_ns}.mp4"
+
+def get_gif_still_marker_path(file_path: str, full_path: Path) -> Path:
+    """Marker recording that this version of a large GIF has a single frame, so it's never probed or queued again."""
+    return get_gif_video_path(file_path, full_path).with_suffix(".still")
+
+def is_gif_video_sync(file_path: str, full_path: Path) -> bool:
+    """Whether a GIF plays as MP4 - big enough and not known to be a still."""
+    return is_gif_video_candidate(full_path) and not get_gif_still_marker_path(file_path, full_path).exists()
+
+def is_animated_image_sync(full_path: Path) -> bool:
+    """Whether an image has more than one frame."""
+    with Image.open(full_path) as img:
+        return getattr(img, "is_animated", False)
+
+def build_qos_command(cmd: List[str], qos: str) -> List[str]:
+    """Prefix a command with nice/ionice for its QoS class."""
+    settings = QOS_CLASSES[qos]
+    prefix = []
+    if NICE_AVAILABLE and settings["nice"]:
+        prefix += ['nice', '-n', str(settings["nice"])]
+    if IONICE_AVAILABLE:
+        prefix += ['ionice', '-t'] + settings["ionice"]  # -t: still run the command if the I/O class can't be set
+    return prefix + cmd
+
+def setup_qos_cgroups():
+    """Create one cgroup v2 child per QoS class with cpu/io weights, if our cgroup can be managed."""
+    if not QOS_CGROUPS or not (CGROUP_ROOT / "cgroup.controllers").exists():
+        return
     try:
-        # Create a temporary file for the thumbnail
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-            temp_thumbnail_path = temp_file.name
+        own_cgroup = None
+        with open("/proc/self/cgroup") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    own_cgroup = CGROUP_ROOT / line[3:].strip().lstrip('/')
+        if own_cgroup is None:
+            return
+        
+        # cgroup v2 only lets a cgroup without processes hand controllers to its children,
+        # so the server moves into a "server" leaf next to the QoS groups
+        server_cgroup = own_cgroup / "server"
+        server_cgroup.mkdir(exist_ok=True)
+        (server_cgroup / "cgroup.procs").write_text(str(os.getpid()))
         
+        available = (own_cgroup / "cgroup.controllers").read_text().split()
+        controllers = [name for name in ("cpu", "io") if name in available]
+        if not controllers:
+            return
+        (own_cgroup / "cgroup.subtree_control").write_text(" ".join(f"+{name}" for name in controllers))
+        
+        for qos, settings in QOS_CLASSES.items():
+            qos_cgroup = own_cgroup / qos
+            qos_cgroup.mkdir(exist_ok=True)
+            if "cpu" in controllers:
+                (qos_cgroup / "cpu.weight").write_text(str(settings["cpu_weight"]))
+            if "io" in controllers:
+                try:
+                    (qos_cgroup / "io.weight").write_text(f"default {settings['io_weight']}")
+                except OSError:
+                    pass  # Needs an I/O scheduler with weight support (BFQ)
+            qos_state["cgroup_dirs"][qos] = qos_cgroup
+        print(f"⚖️ cgroup QoS enabled ({', '.join(controllers)}) under {own_cgroup}")
+    except OSError as e:
+        print(f"⚖️ cgroup QoS not available ({e}), using nice/ionice only")
+        qos_state["cgroup_dirs"] = {}
+
+def signal_process_group(process, sig: int):
+    """Send a signal to an ffmpeg process and anything it spawned (each one runs in its own session)."""
+    try:
+        os.killpg(process.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def register_qos_process(process, qos: str):
+    """Put a freshly started ffmpeg process under its QoS class (cgroup, pausable if backfill)."""
+    global current_ffmpeg_processes
+    cgroup_dir = qos_state["cgroup_dirs"].get(qos)
+    if cgroup_dir is not None:
+        try:
+            (cgroup_dir / "cgroup.procs").write_text(str(process.pid))
+        except OSError:
+            pass
+    current_ffmpeg_processes += 1
+    ffmpeg_processes.add(process)
+    if qos == "backfill":
+        backfill_processes.add(process)
+        if qos_state["backfill_paused"]:
+            signal_process_group(process, signal.SIGSTOP)
+
+def unregister_qos_process(process):
+    """Forget a process registered with register_qos_process once it has exited."""
+    global current_ffmpeg_processes
+    if process in ffmpeg_processes:
+        current_ffmpeg_processes -= 1
+        ffmpeg_processes.discard(process)
+    backfill_processes.discard(process)
+
+def set_backfill_paused(paused: bool):
+    """Stop or continue every running backfill ffmpeg process."""
+    if qos_state["backfill_paused"] == paused:
+        return
+    qos_state["backfill_paused"] = paused
+    for process in backfill_processes:
+        signal_process_group(process, signal.SIGSTOP if paused else signal.SIGCONT)
+    if backfill_processes:
+        print(f"{'⏸️ Paused' if paused else '▶️ Resumed'} {len(backfill_processes)} backfill ffmpeg processes")
+
+def begin_interactive_work():
+    """Mark interactive ffmpeg work as running; backfill is paused until it's all done."""
+    qos_state["interactive_active"] += 1
+    if QOS_PAUSE_BACKFILL:
+        set_backfill_paused(True)
+
+def end_interactive_work():
+    """Counterpart of begin_interactive_work."""
+    qos_state["interactive_active"] = max(0, qos_state["interactive_active"] - 1)
+    if qos_state["interactive_active"] == 0:
+        set_backfill_paused(False)
+
+async def start_ffmpeg(cmd: List[str], qos: str, **kwargs) -> asyncio.subprocess.Process:
+    """Start ffmpeg in its own process group under a QoS class."""
+    process = await asyncio.create_subprocess_exec(*build_qos_command(cmd, qos), start_new_session=True, **kwargs)
+    register_qos_process(process, qos)
+    return process
+
+async def stop_ffmpeg(process: asyncio.subprocess.Process):
+    """Kill an ffmpeg process group (if still running) and reap it."""
+    if process.returncode is None:
+        signal_process_group(process, signal.SIGKILL)
+        await process.wait()
+    unregister_qos_process(process)
+
+async def collect_stderr_tail(stream: asyncio.StreamReader, tail: bytearray):
+    """Drain a process's stderr, keeping only the last FFMPEG_STDERR_TAIL_BYTES for error messages."""
+    while True:
+        chunk = await stream.read(4096)
+        if not chunk:
+            return
+        tail += chunk
+        del tail[:-FFMPEG_STDERR_TAIL_BYTES]
+
+async def run_ffmpeg(cmd: List[str], qos: str, timeout: float):
+    """Run ffmpeg under a QoS class; returns (exit code, end of stderr), TimeoutError after `timeout` unpaused seconds."""
+    process = await start_ffmpeg(cmd, qos, stdin=asyncio.subprocess.DEVNULL,
+                                 stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+    stderr_tail = bytearray()
+    stderr_task = asyncio.create_task(collect_stderr_tail(process.stderr, stderr_tail))
+    wait_task = asyncio.create_task(process.wait())
+    try:
+        active_time = 0.0
+        while True:
+            started = time.monotonic()
+            done, _ = await asyncio.wait({wait_task}, timeout=0.5)
+            if done:
+                break
+            if not (qos == "backfill" and qos_state["backfill_paused"]):
+                active_time += time.monotonic() - started
+            if active_time > timeout:
+                raise asyncio.TimeoutError()
+        await stderr_task
+        return process.returncode, stderr_tail.decode(errors='replace')
+    finally:
+        wait_task.cancel()
+        stderr_task.cancel()
+        await stop_ffmpeg(process)
+
+async def generate_video_thumbnail(video_path: Path, qos: str = "prefetch") -> str:
+    """Generate a base64 thumbnail for a video file."""
+    fd, temp_thumbnail_path = tempfile.mkstemp(suffix='.jpg')
+    os.close(fd)
+    try:
         # Try 1 second first, then fallback to 0.1 seconds (much faster)
         for seek_time in ['00:00:01', '00:00:00.1']:
             # Use ffmpeg to generate thumbnail at specified time with optimized settings
@@ -126,39 +708,33 @@ def generate_video_thumbnail_sync(video_path: Path) -> str:
             ]
             
             # Reduced timeout to 3 seconds (much faster)
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=3)
+            try:
+                returncode, stderr = await run_ffmpeg(cmd, qos, timeout=3)
+            except asyncio.TimeoutError:
+                print(f"⏰ FFmpeg timed out for {video_path} at {seek_time}")
+                continue
             
-            if result.returncode == 0 and os.path.exists(temp_thumbnail_path):
-                # Check if the thumbnail file has content
-                if os.path.getsize(temp_thumbnail_path) > 0:
-                    # Read the thumbnail and convert to base64
-                    with open(temp_thumbnail_path, 'rb') as f:
-                        thumbnail_data = f.read()
-                    
-                    # Clean up temporary file
-                    os.unlink(temp_thumbnail_path)
-                    
-                    # Return base64 encoded thumbnail
-                    return f"data:image/jpeg;base64,{base64.b64encode(thumbnail_data).decode()}"
-                else:
-                    # Empty file, try next seek time
-                    os.unlink(temp_thumbnail_path)
-            else:
+            # Check if the thumbnail file has content
+            if returncode == 0 and os.path.getsize(temp_thumbnail_path) > 0:
+                # Read the thumbnail and return it base64 encoded
+                with open(temp_thumbnail_path, 'rb') as f:
+                    thumbnail_data = f.read()
+                return f"data:image/jpeg;base64,{base64.b64encode(thumbnail_data).decode()}"
+            if returncode != 0:
                 # Log the error for debugging
-                print(f"FFmpeg error for {video_path} at {seek_time}: {result.stderr}")
-                # Clean up if file exists
-                if os.path.exists(temp_thumbnail_path):
-                    os.unlink(temp_thumbnail_path)
+                print(f"FFmpeg error for {video_path} at {seek_time}: {stderr}")
         
         # If both attempts failed, return None
         return None
-    except Exception as e:
+    except OSError as e:
         print(f"Error generating thumbnail for {video_path}: {e}")
         return None
-
-def generate_video_thumbnail(video_path: Path) -> str:
-    """Generate a base64 thumbnail for a video file (legacy synchronous version)."""
-    return generate_video_thumbnail_sync(video_path)
+    finally:
+        # Clean up temporary file
+        try:
+            os.unlink(temp_thumbnail_path)
+        except OSError:
+            pass
 
 def get_thumbnail_cache_key(file_path: str) -> str:
     """Generate a cache key for thumbnails based on file path and modification time."""
@@ -169,8 +745,197 @@ def get_thumbnail_cache_key(file_path: str) -> str:
         return hashlib.md5(f"{file_path}:{mtime}".encode()).hexdigest()
     return hashlib.md5(file_path.encode()).hexdigest()
 
-async def generate_thumbnail_background(file_path: str):
-    """Background task to generate thumbnail asynchronously."""
+def get_job_journal_connection() -> sqlite3.Connection:
+    """Open (once) the job journal database."""
+    global job_journal_connection
+    if job_journal_connection is None:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(JOBS_DB_PATH))
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # Losing the last few state changes on power loss is fine
+        conn.executescript(JOBS_SCHEMA)
+        conn.commit()
+        job_journal_connection = conn
+    return job_journal_connection
+
+def get_source_mtime_ns(file_path: str):
+    """Modification time of a library file, or None if it's gone."""
+    try:
+        return (Path(PHOTOS_DIR) / file_path).stat().st_mtime_ns
+    except OSError:
+        return None
+
+def load_job_states_sync() -> Dict[tuple, Dict[str, Any]]:
+    """Read every unfinished job from the journal, pruning finished rows older versions left behind."""
+    conn = get_job_journal_connection()
+    conn.execute("DELETE FROM jobs WHERE state = 'done'")
+    conn.commit()
+    rows = conn.execute(
+        "SELECT kind, path, state, attempts, mtime_ns, last_error, next_attempt, updated FROM jobs"
+    ).fetchall()
+    return {
+        (kind, path): {"state": state, "attempts": attempts, "mtime_ns": mtime_ns, "last_error": last_error,
+                       "next_attempt": next_attempt, "updated": updated}
+        for kind, path, state, attempts, mtime_ns, last_error, next_attempt, updated in rows
+    }
+
+def write_job_journal_sync(batch: Dict[tuple, Any]):
+    """Write a batch of job rows in one transaction."""
+    conn = get_job_journal_connection()
+    conn.executemany("DELETE FROM jobs WHERE kind = ? AND path = ?", [key for key, row in batch.items() if row is None])
+    conn.executemany(
+        "INSERT OR REPLACE INTO jobs (kind, path, state, attempts, mtime_ns, last_error, next_attempt, updated) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (kind, path, row["state"], row["attempts"], row["mtime_ns"], row["last_error"], row["next_attempt"], row["updated"])
+            for (kind, path), row in batch.items() if row is not None
+        ]
+    )
+    conn.commit()
+
+async def load_job_journal():
+    """Load the jobs that aren't done into memory, so journal lookups never touch the database on the event loop."""
+    loop = asyncio.get_event_loop()
+    job_states.update(await loop.run_in_executor(job_journal_executor, load_job_states_sync))
+
+async def flush_job_journal():
+    """Write all pending journal changes."""
+    global job_journal_pending
+    job_journal_event.clear()
+    batch, job_journal_pending = job_journal_pending, {}
+    if batch:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(job_journal_executor, write_job_journal_sync, batch)
+
+async def job_journal_writer():
+    """Flush journal changes in batches, so a burst of submissions costs one commit, off the event loop."""
+    while True:
+        await job_journal_event.wait()
+        await asyncio.sleep(JOB_JOURNAL_FLUSH_SECONDS)
+        try:
+            await flush_job_journal()
+        except Exception as e:
+            print(f"❌ Error writing job journal: {e}")
+
+def set_job_state(kind: str, file_path: str, entry):
+    """Update a job in memory and queue the change for the journal writer (entry None forgets the job)."""
+    key = (kind, file_path)
+    if entry is None:
+        job_states.pop(key, None)
+    else:
+        job_states[key] = entry
+    job_journal_pending[key] = entry
+    job_journal_event.set()
+
+def journal_job_queued(kind: str, file_path: str):
+    """Record that a job was queued; earlier failures only count while the source file is unchanged."""
+    previous = job_states.get((kind, file_path))
+    mtime_ns = get_source_mtime_ns(file_path)
+    set_job_state(kind, file_path, {
+        "state": 'queued',
+        "attempts": previous["attempts"] if previous and previous["mtime_ns"] == mtime_ns else 0,
+        "mtime_ns": mtime_ns,
+        "last_error": previous and previous["last_error"],
+        "next_attempt": None,
+        "updated": time.time()
+    })
+
+def journal_job_running(kind: str, file_path: str):
+    """Record that a job started."""
+    previous = job_states.get((kind, file_path))
+    if previous is not None:
+        set_job_state(kind, file_path, {**previous, "state": 'running', "updated": time.time()})
+
+def journal_job_finished(kind: str, file_path: str, success: bool, error: str = None):
+    """Record the outcome of a job. Returns the delay before a retry, or None if there shouldn't be one."""
+    previous = job_states.get((kind, file_path))
+    now = time.time()
+    if success:
+        if previous is not None:
+            set_job_state(kind, file_path, None)  # Finished jobs leave the journal, so it only holds outstanding work
+        return None
+    
+    attempts = (previous["attempts"] if previous else 0) + 1
+    if attempts >= JOB_MAX_ATTEMPTS:
+        state, retry_delay = 'dead', None
+    else:
+        state = 'failed'
+        retry_delay = min(JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), JOB_RETRY_MAX_SECONDS)
+    set_job_state(kind, file_path, {
+        "state": state,
+        "attempts": attempts,
+        "mtime_ns": previous["mtime_ns"] if previous else get_source_mtime_ns(file_path),
+        "last_error": error,
+        "next_attempt": now + retry_delay if retry_delay is not None else None,
+        "updated": now
+    })
+    if retry_delay is None:
+        print(f"🪦 Giving up on {kind} for {file_path} after {attempts} failed attempts")
+    return retry_delay
+
+def journal_job_dropped(kind: str, file_path: str):
+    """Forget a queued job that was cleared rather than shed, so it isn't readmitted."""
+    entry = job_states.get((kind, file_path))
+    if entry is not None and entry["state"] == 'queued':
+        set_job_state(kind, file_path, None)
+
+def get_job_failure(kind: str, file_path: str):
+    """Return the journal entry if a job has given up or is waiting to retry for the file's current version, else None."""
+    entry = job_states.get((kind, file_path))
+    if entry is None or entry["state"] not in ('failed', 'dead'):
+        return None
+    if entry["mtime_ns"] != get_source_mtime_ns(file_path):
+        return None  # File changed since - worth another try
+    if entry["state"] == 'failed' and entry["next_attempt"] - time.time() <= 1:
+        return None  # Retry is due
+    return {"state": entry["state"], "attempts": entry["attempts"], "error": entry["last_error"],
+            "next_attempt": entry["next_attempt"]}
+
+def forget_jobs(file_path: str):
+    """Drop all journal entries for a file that no longer exists."""
+    for kind in JOB_KINDS:
+        set_job_state(kind, file_path, None)
+
+def resubmit_job(kind: str, file_path: str):
+    """Put a journaled job back on its queue at background priority."""
+    if not (Path(PHOTOS_DIR) / file_path).is_file():
+        forget_jobs(file_path)
+        return
+    if kind == "thumbnail":
+        submit_thumbnail_with_priority(file_path, None, background=True)
+    elif kind == "conversion":
+        submit_conversion_generation(file_path)
+
+def schedule_job_retry(kind: str, file_path: str, retry_delay: float):
+    """Resubmit a failed job once its backoff has passed."""
+    print(f"🔁 Retrying {kind} for {file_path} in {retry_delay:.0f}s")
+    asyncio.get_event_loop().call_later(retry_delay, resubmit_job, kind, file_path)
+
+async def resume_journaled_jobs():
+    """Requeue jobs left pending by the previous run, a batch at a time so startup isn't held up."""
+    rows = [
+        (kind, file_path, entry["state"], entry["next_attempt"])
+        for (kind, file_path), entry in job_states.items() if entry["state"] in ('queued', 'running', 'failed')
+    ]
+    
+    now = time.time()
+    for index, (kind, file_path, state, next_attempt) in enumerate(rows):
+        if index % JOB_RESUME_BATCH_SIZE == 0:
+            await asyncio.sleep(0)
+        if state == 'running':
+            # The previous run died mid-job - count it, in case the file is what took it down
+            retry_delay = journal_job_finished(kind, file_path, False, "Interrupted by restart")
+            if retry_delay is not None:
+                resubmit_job(kind, file_path)
+        elif state == 'failed' and next_attempt and next_attempt > now:
+            schedule_job_retry(kind, file_path, next_attempt - now)
+        else:
+            resubmit_job(kind, file_path)
+    if rows:
+        print(f"📒 Resumed {len(rows)} jobs from the journal")
+
+async def generate_thumbnail_background(file_path: str, qos: str = "prefetch") -> bool:
+    """Generate and cache the thumbnail of a video. Returns False if it failed."""
     try:
         # URL decode the file path
         from urllib.parse import unquote
@@ -178,36 +943,108 @@ async def generate_thumbnail_background(file_path: str):
         full_path = Path(PHOTOS_DIR) / decoded_file_path
         
         if not full_path.exists() or not full_path.is_file():
-            return
+            return True  # Nothing left to do
         
         # Only generate thumbnails for video files
         if full_path.suffix.lower() not in VIDEO_EXTENSIONS:
-            return
+            return True
         
         # Generate thumbnail
-        thumbnail_data = generate_video_thumbnail_sync(full_path)
+        thumbnail_data = await generate_video_thumbnail(full_path, qos)
         
         if thumbnail_data:
+            # Cache the thumbnail
             cache_key = get_thumbnail_cache_key(file_path)
             thumbnail_cache[cache_key] = thumbnail_data
-            print(f"Generated thumbnail for {file_path}")
+            thumbnail_cache_keys[file_path] = cache_key
+            print(f"✅ Thumbnail generated and cached for {file_path}")
+            return True
         else:
-            print(f"Failed to generate thumbnail for {file_path}")
+            print(f"❌ Failed to generate thumbnail for {file_path}")
+            return False
             
     except Exception as e:
-        print(f"Error in background thumbnail generation for {file_path}: {e}")
+        print(f"❌ Error in background thumbnail generation for {file_path}: {e}")
+        return False
+
+def get_thumbnail_qos(priority: int) -> str:
+    """QoS class of a thumbnail job from its queue priority."""
+    if priority <= 1:
+        return "interactive"  # Current folder
+    if priority >= BACKGROUND_THUMBNAIL_PRIORITY:
+        return "backfill"  # Ingest of new files
+    return "prefetch"
+
+async def wait_for_unpaused(awaitable, timeout: float):
+    """Like asyncio.wait_for for backfill work, but time spent with backfill paused doesn't count towards the timeout."""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        active_time = 0.0
+        while True:
+            started = time.monotonic()
+            done, _ = await asyncio.wait({task}, timeout=0.5)
+            if done:
+                return task.result()
+            if not qos_state["backfill_paused"]:
+                active_time += time.monotonic() - started
+            if active_time > timeout:
+                raise asyncio.TimeoutError()
     finally:
-        # Remove from processing set
-        thumbnail_processing.discard(file_path)
+        if not task.done():
+            task.cancel()
+            await asyncio.wait({task})
+
+async def run_thumbnail_job(file_path: str, qos: str):
+    """Run one thumbnail job under its QoS class with a timeout. Returns (success, error)."""
+    try:
+        from urllib.parse import unquote
+        full_path = Path(PHOTOS_DIR) / unquote(file_path)
+        if qos == "interactive":
+            # Thumbnails for the open folder skip the shared ffmpeg slots - backfill is paused instead - but
+            # share the bounded interactive ones with streaming conversions
+            async with interactive_ffmpeg_semaphore:
+                async with device_io_slot(full_path, "thumbnail_input", IO_PRIORITY_LIVE):
+                    begin_interactive_work()
+                    try:
+                        success = await asyncio.wait_for(generate_thumbnail_background(file_path, qos), timeout=30.0)
+                    finally:
+                        end_interactive_work()
+        elif qos == "backfill":
+            # Backfill can sit SIGSTOPped for a while, so it takes no device slot (it reads at idle I/O class)
+            # and only time spent running counts towards its timeout
+            async with ffmpeg_semaphore:
+                success = await wait_for_unpaused(generate_thumbnail_background(file_path, qos), BACKFILL_THUMBNAIL_TIMEOUT)
+        else:
+            # Acquire FFmpeg semaphore to prevent resource overload, then queue on the source disk
+            async with ffmpeg_semaphore:
+                async with device_io_slot(full_path, "thumbnail_input", THUMBNAIL_IO_PRIORITY[qos]):
+                    success = await asyncio.wait_for(
+                        generate_thumbnail_background(file_path, qos),
+                        timeout=30.0  # 30 second timeout for the entire operation
+                    )
+        print(f"✅ Completed processing {file_path}")
+        return success, None if success else "Thumbnail generation failed"
+    except asyncio.TimeoutError:
+        print(f"⏰ Timeout processing thumbnail for {file_path}")
+        return False, "Timed out"
+    except Exception as e:
+        print(f"❌ Error processing thumbnail for {file_path}: {e}")
+        return False, str(e)
 
-async def process_thumbnail_queue():
-    """Process thumbnail generation queue in the background."""
-    print("🔄 Thumbnail queue processor started")
+async def process_thumbnail_queue(worker_id: int = 0):
+    """Process thumbnail generation queue in the background (one of MAX_CONCURRENT_THUMBNAILS workers)."""
+    print(f"🔄 Thumbnail queue worker {worker_id} started")
     while True:
         try:
-            print(f"🔍 Waiting for thumbnail queue item... (queue size: {thumbnail_queue.qsize()})")
             # Get next item from priority queue (priority, file_path)
             priority, file_path = await thumbnail_queue.get()
+            
+            # Shed or cleared while it waited - the entry is all that's left of it
+            entry = thumbnail_queued.get(file_path)
+            if entry is None:
+                thumbnail_queue.task_done()
+                continue
+            priority = entry["priority"]  # Readmitted at another priority, the older entry comes out first
             print(f"📥 Processing thumbnail: {file_path} (priority: {priority})")
             
             # Check if we're already processing this file
@@ -216,52 +1053,50 @@ async def process_thumbnail_queue():
                 thumbnail_queue.task_done()
                 continue
             
-            # Check if we have too many concurrent thumbnails
-            if len(thumbnail_processing) >= MAX_CONCURRENT_THUMBNAILS:
-                print(f"⏳ Too many concurrent thumbnails ({len(thumbnail_processing)}), putting back in queue")
-                # Put it back in the queue for later
-                await thumbnail_queue.put((priority, file_path))
-                await asyncio.sleep(1)  # Wait a bit before trying again
-                continue
-            
             # Start processing
             thumbnail_processing.add(file_path)
-            thumbnail_queued.discard(file_path)  # Remove from queued set
+            release_queued_thumbnail(file_path)  # Remove from queued jobs
+            journal_job_running("thumbnail", file_path)
             print(f"🔄 Started processing {file_path}")
             
+            # Run the job as its own task so clear_thumbnail_queue can cancel it without stopping this worker
+            job = asyncio.create_task(run_thumbnail_job(file_path, get_thumbnail_qos(priority)))
+            thumbnail_running_tasks[file_path] = (job, priority)
             try:
-                # Acquire FFmpeg semaphore to prevent resource overload
-                async with ffmpeg_semaphore:
-                    # Run thumbnail generation in dedicated thread pool with timeout
-                    loop = asyncio.get_event_loop()
-                    await asyncio.wait_for(
-                        loop.run_in_executor(thumbnail_executor, generate_thumbnail_background_sync, file_path),
-                        timeout=30.0  # 30 second timeout for the entire operation
-                    )
-                print(f"✅ Completed processing {file_path}")
-            except asyncio.TimeoutError:
-                print(f"⏰ Timeout processing thumbnail for {file_path}")
-            except Exception as e:
-                print(f"❌ Error processing thumbnail for {file_path}: {e}")
+                await asyncio.wait({job})
             finally:
                 # Always remove from processing set, even if there was an error
+                thumbnail_running_tasks.pop(file_path, None)
                 thumbnail_processing.discard(file_path)
                 thumbnail_queue.task_done()
                 print(f"🧹 Removed {file_path} from processing set")
             
+            if job.cancelled():
+                # Not a failure - it's picked up again when the folder is opened
+                print(f"🚫 Cancelled thumbnail for {file_path}")
+                journal_job_queued("thumbnail", file_path)
+                continue
+            
+            success, error = job.result()
+            retry_delay = journal_job_finished("thumbnail", file_path, success, error)
+            if retry_delay is not None:
+                schedule_job_retry("thumbnail", file_path, retry_delay)
+            
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            print(f"❌ Error in thumbnail queue processor: {e}")
+            print(f"❌ Error in thumbnail queue worker {worker_id}: {e}")
             # Make sure we don't get stuck in an infinite loop
             await asyncio.sleep(1)
 
-async def process_conversion_queue():
-    """Process video conversion queue in the background."""
-    print("🔄 Conversion queue processor started")
+async def process_conversion_queue(worker_id: int = 0):
+    """Process video conversion queue in the background (one of MAX_CONCURRENT_CONVERSIONS workers)."""
+    print(f"🔄 Conversion queue worker {worker_id} started")
     while True:
         try:
-            print(f"🔍 Waiting for conversion queue item... (queue size: {conversion_queue.qsize()})")
             # Get next item from queue
             file_path = await conversion_queue.get()
+            conversion_queued.discard(file_path)
             print(f"📥 Processing conversion: {file_path}")
             
             # Check if we're already processing this file
@@ -270,31 +1105,24 @@ async def process_conversion_queue():
                 conversion_queue.task_done()
                 continue
             
-            # Check if we have too many concurrent conversions
-            if len(conversion_processing) >= MAX_CONCURRENT_CONVERSIONS:
-                print(f"⏳ Too many concurrent conversions ({len(conversion_processing)}), putting back in queue")
-                # Put it back in the queue for later
-                await conversion_queue.put(file_path)
-                await asyncio.sleep(1)  # Wait a bit before trying again
-                continue
-            
             # Start processing
             conversion_processing.add(file_path)
+            journal_job_running("conversion", file_path)
             print(f"🔄 Started processing conversion for {file_path}")
             
+            success, error = False, "Conversion failed"
+            # Large GIFs share the conversion queue (and its journal, retries and cache) with videos
+            convert = convert_gif_background if file_path.lower().endswith('.gif') else convert_video_background
             try:
                 # Acquire FFmpeg semaphore to prevent resource overload
                 async with ffmpeg_semaphore:
-                    # Run conversion in dedicated thread pool with timeout
-                    loop = asyncio.get_event_loop()
-                    await asyncio.wait_for(
-                        loop.run_in_executor(conversion_executor, convert_video_background_sync, file_path),
-                        timeout=300.0  # 5 minute timeout for conversion operations
-                    )
+                    success = await convert(file_path)
                 print(f"✅ Completed conversion for {file_path}")
             except asyncio.TimeoutError:
+                error = "Timed out"
                 print(f"⏰ Timeout processing conversion for {file_path}")
             except Exception as e:
+                error = str(e)
                 print(f"❌ Error processing conversion for {file_path}: {e}")
             finally:
                 # Always remove from processing set, even if there was an error
@@ -302,137 +1130,1154 @@ async def process_conversion_queue():
                 conversion_queue.task_done()
                 print(f"🧹 Removed {file_path} from conversion processing set")
             
+            retry_delay = journal_job_finished("conversion", file_path, success, None if success else error)
+            if retry_delay is not None:
+                schedule_job_retry("conversion", file_path, retry_delay)
+            
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            print(f"❌ Error in conversion queue processor: {e}")
+            print(f"❌ Error in conversion queue worker {worker_id}: {e}")
             # Make sure we don't get stuck in an infinite loop
             await asyncio.sleep(1)
 
-def generate_thumbnail_background_sync(file_path: str):
-    """Synchronous version of background thumbnail generation for thread pool."""
+async def convert_video_background(file_path: str) -> bool:
+    """Convert a video to browser-friendly MP4 in the background. Returns False if it failed."""
+    # URL decode the file path
+    from urllib.parse import unquote
+    decoded_file_path = unquote(file_path)
+    full_path = Path(PHOTOS_DIR) / decoded_file_path
+    
+    if not full_path.exists() or not full_path.is_file():
+        return True  # Nothing left to do
+    
+    # Check if file needs conversion
+    if not needs_conversion(full_path):
+        return True
+    
+    # Create persistent conversion directory
+    output_path = get_converted_path(full_path)
+    output_path.parent.mkdir(exist_ok=True)
+    
+    # Check if already converted
+    if output_path.exists():
+        cache_key = f"{file_path}_converted"
+        conversion_cache[cache_key] = output_path
+        print(f"✅ Found existing conversion for {file_path}")
+        return True
+    
+    # Write to a temporary name so an interrupted conversion never passes for a finished one
+    partial_path = output_path.with_name(output_path.name + ".part")
+    
+    # FFmpeg command for fast conversion with resource limits
+    cmd = [
+        'ffmpeg', '-i', str(full_path),
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '32',
+        '-threads', '2',  # Limit threads to prevent resource overload
+        '-c:a', 'aac', '-b:a', '32k', '-ac', '1',
+        '-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov',
+        '-y', str(partial_path)
+    ]
+    
     try:
-        # URL decode the file path
-        from urllib.parse import unquote
-        decoded_file_path = unquote(file_path)
-        full_path = Path(PHOTOS_DIR) / decoded_file_path
-        
-        if not full_path.exists() or not full_path.is_file():
-            return
-        
-        # Only generate thumbnails for video files
-        if full_path.suffix.lower() not in VIDEO_EXTENSIONS:
-            return
+        # Background conversions are backfill - paused while the user is waiting on ffmpeg
+        returncode, stderr = await run_ffmpeg(cmd, "backfill", timeout=300)  # 5 minute timeout
         
-        # Generate thumbnail
-        thumbnail_data = generate_video_thumbnail_sync(full_path)
+        if returncode == 0 and partial_path.exists():
+            os.replace(partial_path, output_path)
+            # Cache the converted file
+            cache_key = f"{file_path}_converted"
+            conversion_cache[cache_key] = output_path
+            print(f"✅ Converted video for {file_path}")
+            return True
         
-        if thumbnail_data:
-            # Cache the thumbnail
-            cache_key = get_thumbnail_cache_key(file_path)
-            thumbnail_cache[cache_key] = thumbnail_data
-            print(f"✅ Thumbnail generated and cached for {file_path}")
-        else:
-            print(f"❌ Failed to generate thumbnail for {file_path}")
-            
-    except Exception as e:
-        print(f"❌ Error in background thumbnail generation for {file_path}: {e}")
+        print(f"❌ Failed to convert video for {file_path}: {stderr}")
+        return False
     finally:
-        # Remove from processing set
-        thumbnail_processing.discard(file_path)
+        partial_path.unlink(missing_ok=True)
 
-def convert_video_background_sync(file_path: str):
-    """Synchronous version of background video conversion for thread pool."""
+def remove_stale_gif_videos(output_path: Path, keep_path: Path):
+    """Drop the videos and still markers made from older versions of a GIF."""
+    prefix = output_path.name.rsplit('_', 1)[0]
+    for pattern in (f"{prefix}_*.mp4", f"{prefix}_*.still"):
+        for stale in GIF_VIDEO_DIR.glob(pattern):
+            if stale != keep_path:
+                stale.unlink(missing_ok=True)
+
+async def convert_gif_background(file_path: str) -> bool:
+    """Transcode a large animated GIF to a silent looping MP4 in the background. Returns False if it failed."""
+    # URL decode the file path
+    from urllib.parse import unquote
+    decoded_file_path = unquote(file_path)
+    full_path = Path(PHOTOS_DIR) / decoded_file_path
+    
+    if not full_path.exists() or not full_path.is_file() or not is_gif_video_sync(decoded_file_path, full_path):
+        return True  # Nothing left to do
+    
+    output_path = get_gif_video_path(decoded_file_path, full_path)
+    cache_key = f"{file_path}_converted"
+    if output_path.exists():
+        conversion_cache[cache_key] = output_path
+        print(f"✅ Found existing conversion for {file_path}")
+        return True
+    
+    loop = asyncio.get_event_loop()
+    if not await loop.run_in_executor(None, is_animated_image_sync, full_path):
+        # Remember it, so listings show it as an image and nothing queues it again until it changes
+        GIF_VIDEO_DIR.mkdir(parents=True, exist_ok=True)
+        still_marker_path = get_gif_still_marker_path(decoded_file_path, full_path)
+        still_marker_path.touch()
+        remove_stale_gif_videos(output_path, still_marker_path)
+        print(f"⏭️ {file_path} is a still GIF - serving it as an image")
+        return True
+    
+    GIF_VIDEO_DIR.mkdir(parents=True, exist_ok=True)
+    partial_path = output_path.with_name(output_path.name + ".part")
+    cmd = [
+        'ffmpeg', '-i', str(full_path),
+        '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2',  # yuv420p needs even dimensions
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '28', '-pix_fmt', 'yuv420p',
+        '-threads', '2',  # Limit threads to prevent resource overload
+        '-an', '-movflags', '+faststart',
+        '-f', 'mp4', '-y', str(partial_path)
+    ]
+    
     try:
-        # URL decode the file path
-        from urllib.parse import unquote
-        decoded_file_path = unquote(file_path)
-        full_path = Path(PHOTOS_DIR) / decoded_file_path
-        
-        if not full_path.exists() or not full_path.is_file():
-            return
-        
-        # Check if file needs conversion
-        if not needs_conversion(full_path):
-            return
-        
-        # Create persistent conversion directory
-        conversion_dir = Path("/tmp/video_conversions")
-        conversion_dir.mkdir(exist_ok=True)
-        output_path = conversion_dir / get_converted_filename(full_path)
+        returncode, stderr = await run_ffmpeg(cmd, "backfill", timeout=300)  # 5 minute timeout
         
-        # Check if already converted
-        if output_path.exists():
-            cache_key = f"{file_path}_converted"
+        if returncode == 0 and partial_path.exists():
+            os.replace(partial_path, output_path)
             conversion_cache[cache_key] = output_path
-            print(f"✅ Found existing conversion for {file_path}")
-            return
-        
-        # FFmpeg command for fast conversion with resource limits
-        cmd = [
-            'ffmpeg', '-i', str(full_path),
-            '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '32',
-            '-threads', '2',  # Limit threads to prevent resource overload
-            '-c:a', 'aac', '-b:a', '32k', '-ac', '1',
-            '-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov',
-            str(output_path)
-        ]
+            remove_stale_gif_videos(output_path, output_path)
+            print(f"✅ Converted GIF for {file_path}: {full_path.stat().st_size // 1024} KB -> {output_path.stat().st_size // 1024} KB")
+            return True
         
-        # Run conversion with timeout
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)  # 5 minute timeout
+        print(f"❌ Failed to convert GIF for {file_path}: {stderr}")
+        return False
+    finally:
+        partial_path.unlink(missing_ok=True)
+
+def bucket_rendition_size(requested: int) -> int:
+    """Round a requested dimension up to the nearest rendition size bucket."""
+    for bucket in RENDITION_SIZE_BUCKETS:
+        if requested <= bucket:
+            return bucket
+    return RENDITION_SIZE_BUCKETS[-1]
+
+def negotiate_rendition_format(accept_header: str) -> str:
+    """Pick the best rendition format the client accepts (AVIF > WebP > JPEG)."""
+    accept_header = (accept_header or "").lower()
+    if AVIF_SUPPORTED and "image/avif" in accept_header:
+        return "avif"
+    if "image/webp" in accept_header:
+        return "webp"
+    return "jpeg"
+
+def get_rendition_dir(file_path: str) -> Path:
+    """Directory holding all renditions of one source file (removed as a unit when the source goes away)."""
+    return RENDITION_DIR / hashlib.md5(file_path.encode()).hexdigest()
+
+def get_rendition_path(file_path: str, full_path: Path, width: int, height: int, fmt: str) -> Path:
+    """Cache path for a rendition; the source mtime is part of the name so edits invalidate it."""
+    mtime_ns = full_path.stat().st_mtime_ns
+    return get_rendition_dir(file_path) / f"{mtime_ns}_{width}x{height}.{fmt}"
+
+def generate_display_rendition_sync(source_path: Path, output_path: Path, max_width: int, max_height: int, fmt: str) -> bool:
+    """Downscale an image to fit max_width x max_height and encode it."""
+    try:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
         
-        if result.returncode == 0 and output_path.exists():
-            # Cache the converted file
-            cache_key = f"{file_path}_converted"
-            conversion_cache[cache_key] = output_path
-            print(f"✅ Converted video for {file_path}")
-        else:
-            print(f"❌ Failed to convert video for {file_path}: {result.stderr}")
+        with open_large_image(source_path) as img:
+            # Let the JPEG decoder downscale with DCT scaling instead of decoding at full size
+            img.draft('RGB', (max_width, max_height))
+            if img.size[0] * img.size[1] > 2 * Image.MAX_IMAGE_PIXELS:
+                raise Image.DecompressionBombError(f"{source_path} is too large to decode for a rendition")
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+            
+            has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+            if fmt == "jpeg" or not has_alpha:
+                img = img.convert('RGB')
+            else:
+                img = img.convert('RGBA')
             
-    except subprocess.TimeoutExpired:
-        print(f"⏰ Timeout converting video for {file_path}")
+            # Write to a temp file in the same directory and rename, so readers never see partial output
+            temp_path = output_path.with_name(output_path.name + ".tmp")
+            save_kwargs = {"quality": RENDITION_QUALITY[fmt]}
+            if fmt == "jpeg":
+                save_kwargs.update(optimize=True, progressive=True)
+            elif fmt == "webp":
+                save_kwargs["method"] = 4
+            img.save(temp_path, format=fmt.upper(), **save_kwargs)
+            os.replace(temp_path, output_path)
+        
+        # Drop renditions made from older versions of this file
+        current_prefix = output_path.name.split('_', 1)[0] + '_'
+        for stale in output_path.parent.iterdir():
+            if not stale.name.startswith(current_prefix):
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass
+        
+        print(f"✅ Display rendition created: {output_path.name} for {source_path}")
+        return True
     except Exception as e:
-        print(f"❌ Error in background video conversion for {file_path}: {e}")
-    finally:
-        # Remove from processing set
-        conversion_processing.discard(file_path)
+        print(f"❌ Error generating display rendition for {source_path}: {e}")
+        try:
+            output_path.with_name(output_path.name + ".tmp").unlink()
+        except OSError:
+            pass
+        return False
 
-def submit_thumbnail_generation(file_path: str, background_tasks: BackgroundTasks):
-    """Submit thumbnail generation to queue if not already processing."""
-    if file_path not in thumbnail_processing:
-        # Add to queue instead of directly starting
-        asyncio.create_task(thumbnail_queue.put(file_path))
+def is_rendition_passthrough(full_path: Path) -> bool:
+    """Whether an image is sent as-is instead of as a display rendition."""
+    ext = full_path.suffix.lower()
+    # GIFs keep their animation (large ones play as MP4 instead, so their rendition is a still of the first frame),
+    # and small browser-friendly files are cheaper to send as-is
+    if ext == '.gif':
+        return not is_gif_video_candidate(full_path)
+    return (
+        ext in RENDITION_PASSTHROUGH_EXTENSIONS and full_path.stat().st_size <= RENDITION_PASSTHROUGH_MAX_BYTES
+    )
 
-def submit_conversion_generation(file_path: str):
-    """Submit video conversion to queue if not already processing."""
-    if file_path not in conversion_processing:
-        # Add to queue instead of directly starting
-        asyncio.create_task(conversion_queue.put(file_path))
+async def ensure_display_rendition(source_path: Path, output_path: Path, max_width: int, max_height: int, fmt: str,
+                                   executor: ThreadPoolExecutor = rendition_executor) -> bool:
+    """Return True once the rendition exists on disk, generating it if needed."""
+    if output_path.exists():
+        return True
+    if str(source_path) in deepzoom_building_sources:
+        executor = deepzoom_executor  # Wait for the pyramid build rather than decode a huge image twice at once
+    return await run_deduplicated(
+        rendition_inflight, str(output_path), executor,
+        generate_display_rendition_sync, source_path, output_path, max_width, max_height, fmt
+    )
 
-def set_current_folder(folder_path: str):
-    """Set the current folder for thumbnail priority."""
-    global current_folder
-    old_folder = current_folder
-    current_folder = folder_path
-    
-    # If we're switching to a different folder, clear the queue to prioritize new folder
-    if old_folder != folder_path:
-        clear_thumbnail_queue()
-        print(f"Current folder changed from '{old_folder}' to '{folder_path}' - queue cleared")
-    else:
-        print(f"Current folder set to: {folder_path}")
+def get_deep_zoom_dir(file_path: str) -> Path:
+    """Directory holding the tile pyramids of one source file."""
+    return DEEP_ZOOM_DIR / hashlib.md5(file_path.encode()).hexdigest()
 
-def clear_thumbnail_queue():
-    """Clear the thumbnail queue to prioritize current folder."""
-    global thumbnail_queue, thumbnail_queued
-    # Clear the existing queue by getting all items and discarding them
-    while not thumbnail_queue.empty():
+def get_deep_zoom_pyramid_dir(file_path: str, full_path: Path) -> Path:
+    """Directory of the pyramid for the current version of a file; the source mtime is part of the name."""
+    return get_deep_zoom_dir(file_path) / str(full_path.stat().st_mtime_ns)
+
+def get_deep_zoom_max_level(width: int, height: int) -> int:
+    """Highest DZI level - level 0 is 1x1 and each level doubles the size up to the full image."""
+    return math.ceil(math.log2(max(width, height, 1)))
+
+def open_large_image(source_path: Path) -> Image.Image:
+    """Open an image of up to DEEP_ZOOM_MAX_PIXELS, lifting Pillow's decompression bomb limit for the open only."""
+    with large_image_lock:
+        default_limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = DEEP_ZOOM_MAX_PIXELS
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+                return Image.open(source_path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = default_limit
+
+def get_deep_zoom_scale(width: int, height: int, fmt: str) -> int:
+    """Factor a source is decoded at for its pyramid - 1, or 2/4/8 for JPEGs over the decode budget; 0 if it doesn't fit at all."""
+    if width * height > DEEP_ZOOM_MAX_PIXELS:
+        return 0
+    for scale in ((1, 2, 4, 8) if fmt in ("JPEG", "MPO") else (1,)):
+        if math.ceil(width / scale) * math.ceil(height / scale) <= DEEP_ZOOM_DECODE_MAX_PIXELS:
+            return scale
+    return 0
+
+def read_deep_zoom_geometry_sync(full_path: Path):
+    """Displayed size of an image from its header, after EXIF rotation, and its pyramid decode scale."""
+    with open_large_image(full_path) as img:
+        width, height = img.size
+        if img.getexif().get(0x0112) in (5, 6, 7, 8):  # Rotated by 90 degrees
+            width, height = height, width
+        return width, height, get_deep_zoom_scale(width, height, img.format)
+
+def save_deep_zoom_level_sync(img: Image.Image, level_dir: Path):
+    """Cut one pyramid level into overlapping JPEG tiles."""
+    level_dir.mkdir(parents=True, exist_ok=True)
+    width, height = img.size
+    for row in range(math.ceil(height / DEEP_ZOOM_TILE_SIZE)):
+        for column in range(math.ceil(width / DEEP_ZOOM_TILE_SIZE)):
+            box = (
+                max(0, column * DEEP_ZOOM_TILE_SIZE - DEEP_ZOOM_TILE_OVERLAP),
+                max(0, row * DEEP_ZOOM_TILE_SIZE - DEEP_ZOOM_TILE_OVERLAP),
+                min(width, (column + 1) * DEEP_ZOOM_TILE_SIZE + DEEP_ZOOM_TILE_OVERLAP),
+                min(height, (row + 1) * DEEP_ZOOM_TILE_SIZE + DEEP_ZOOM_TILE_OVERLAP),
+            )
+            img.crop(box).save(level_dir / f"{column}_{row}.jpeg", format="JPEG", quality=DEEP_ZOOM_QUALITY)
+
+def load_deep_zoom_source_sync(source_path: Path) -> Image.Image:
+    """Decode an image for tiling, at the scale get_deep_zoom_scale picks, upright and in RGB."""
+    source = open_large_image(source_path)
+    img = source
+    try:
+        scale = get_deep_zoom_scale(*source.size, source.format)
+        if scale == 0:
+            raise Image.DecompressionBombError(f"{source_path} is too large to decode for tiling")
+        if scale > 1:
+            # Let the JPEG decoder downscale with DCT scaling, so the full-size image is never in memory
+            source.draft('RGB', (source.size[0] // scale, source.size[1] // scale))
+        source.load()  # Decode now, while the caller holds the device slot
+        if source.mode != 'RGB':
+            img = source.convert('RGB')
+            source.close()  # Frees the decoded pixels too, so only one copy is ever kept
+        ImageOps.exif_transpose(img, in_place=True)
+        return img
+    except Exception:
+        source.close()
+        img.close()
+        raise
+
+def build_deep_zoom_pyramid_sync(img: Image.Image, source_path: Path, pyramid_dir: Path) -> bool:
+    """Write every DZI level of a decoded image, largest first."""
+    temp_dir = pyramid_dir.with_name(pyramid_dir.name + ".tmp")
+    try:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        started = time.time()
+        max_level = get_deep_zoom_max_level(*img.size)
+        for level in range(max_level, -1, -1):
+            if level < max_level:
+                # Each level is half the one above, rounded up - exactly what reduce(2) produces
+                # Only the level being cut is kept, so memory peaks at the decoded image plus a quarter of it
+                img = img.reduce(2)
+            save_deep_zoom_level_sync(img, temp_dir / str(level))
+        
+        # Publish the finished pyramid in one rename so readers never see a partial one
+        os.replace(temp_dir, pyramid_dir)
+        
+        # Drop pyramids made from older versions of this file
+        for stale in pyramid_dir.parent.iterdir():
+            if stale.name != pyramid_dir.name and not stale.name.endswith(".tmp"):
+                shutil.rmtree(stale, ignore_errors=True)
+        
+        print(f"✅ Deep zoom pyramid created for {source_path} ({max_level + 1} levels, {time.time() - started:.1f}s)")
+        return True
+    except Exception as e:
+        print(f"❌ Error building deep zoom pyramid for {source_path}: {e}")
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        return False
+
+async def build_deep_zoom_pyramid(full_path: Path, pyramid_dir: Path):
+    """Build a pyramid in the background, remembering failures so they aren't retried on every request."""
+    key = str(pyramid_dir)
+    try:
+        loop = asyncio.get_event_loop()
+        try:
+            # Only reading the source competes with other reads of its disk - cutting tiles doesn't hold a slot
+            async with device_io_slot(full_path, "deep_zoom", IO_PRIORITY_LIVE):
+                img = await loop.run_in_executor(deepzoom_executor, load_deep_zoom_source_sync, full_path)
+        except Exception as e:
+            print(f"❌ Error decoding {full_path} for deep zoom: {e}")
+            deepzoom_failed.add(key)
+            return
+        try:
+            built = await loop.run_in_executor(deepzoom_executor, build_deep_zoom_pyramid_sync, img, full_path, pyramid_dir)
+        finally:
+            img.close()
+        if not built:
+            deepzoom_failed.add(key)
+    finally:
+        deepzoom_building.discard(key)
+        deepzoom_building_sources.discard(str(full_path))
+
+def submit_deep_zoom_build(full_path: Path, pyramid_dir: Path):
+    """Start building a pyramid unless it's already being built or has failed."""
+    key = str(pyramid_dir)
+    if key in deepzoom_building or key in deepzoom_failed:
+        return
+    deepzoom_building.add(key)
+    deepzoom_building_sources.add(str(full_path))
+    start_background_task(build_deep_zoom_pyramid(full_path, pyramid_dir))
+
+async def run_deduplicated(inflight: Dict[str, Any], key: str, executor: ThreadPoolExecutor, func, *args):
+    """Run func in the executor unless an identical job (same key) is already running; either way await its result."""
+    future = inflight.get(key)
+    if future is None:
+        loop = asyncio.get_event_loop()
+        future = loop.run_in_executor(executor, func, *args)
+        inflight[key] = future
+        future.add_done_callback(lambda _: inflight.pop(key, None))
+    # Shield so one client disconnecting doesn't cancel the job for everyone else waiting on it
+    return await asyncio.shield(future)
+
+def mark_live_read(full_path: Path) -> int:
+    """Record a live request touching a file's disk so prefetch backs off; returns the device id."""
+    device = full_path.stat().st_dev
+    last_live_read_by_device[device] = time.monotonic()
+    return device
+
+def detect_device_kind(full_path: Path, device: int) -> str:
+    """Classify the device behind a path as ssd, rotational, network or unknown."""
+    if is_network_mount(full_path):
+        return "network"
+    try:
+        # Partitions have no queue directory of their own - their parent disk does
+        block = Path(f"/sys/dev/block/{os.major(device)}:{os.minor(device)}").resolve()
+        for queue_dir in (block / "queue", block.parent / "queue"):
+            rotational = queue_dir / "rotational"
+            if rotational.exists():
+                return "rotational" if rotational.read_text().strip() == "1" else "ssd"
+    except OSError:
+        pass
+    return "unknown"  # tmpfs, overlayfs, btrfs subvolumes and other virtual devices
+
+def get_device_io_state(full_path: Path) -> Dict[str, Any]:
+    """Scheduler state of the device a path lives on, created on first use."""
+    device = full_path.stat().st_dev
+    state = device_io_state.get(device)
+    if state is None:
+        kind = detect_device_kind(full_path, device)
+        state = {
+            "device": f"{os.major(device)}:{os.minor(device)}",
+            "kind": kind,
+            "fstype": get_mount_fstype(full_path),
+            "limit": max(1, IO_DEVICE_LIMITS[kind]),
+            "in_flight": 0,
+            "waiters": [],  # heap of (priority, seq, future)
+            "ops": {},  # operation -> latency stats
+        }
+        device_io_state[device] = state
+        print(f"💽 I/O device {state['device']} ({kind}, {state['fstype']}): limit {state['limit']}")
+    return state
+
+async def acquire_device_slot(state: Dict[str, Any], priority: int):
+    """Wait for a free I/O slot on a device; lower priority values are served first."""
+    if state["in_flight"] < state["limit"] and not state["waiters"]:
+        state["in_flight"] += 1
+        return
+    future = asyncio.get_event_loop().create_future()
+    heapq.heappush(state["waiters"], (priority, next(io_waiter_seq), future))
+    try:
+        await future
+    except asyncio.CancelledError:
+        if future.done() and not future.cancelled():
+            # The slot was handed over just as we were cancelled - pass it on
+            release_device_slot(state)
+        raise
+
+def release_device_slot(state: Dict[str, Any]):
+    """Give a slot back, handing it straight to the highest-priority waiter if there is one."""
+    while state["waiters"]:
+        _, _, future = heapq.heappop(state["waiters"])
+        if not future.done():  # Skip waiters that were cancelled
+            future.set_result(None)
+            return
+    state["in_flight"] -= 1
+
+def record_device_io(state: Dict[str, Any], op: str, waited: float, service: float):
+    """Add one operation's queue wait and service time to a device's latency stats."""
+    stats = state["ops"].get(op)
+    if stats is None:
+        stats = {"count": 0, "wait_total": 0.0, "wait_max": 0.0, "service_total": 0.0, "service_max": 0.0, "service_ewma": service}
+        state["ops"][op] = stats
+    stats["count"] += 1
+    stats["wait_total"] += waited
+    stats["wait_max"] = max(stats["wait_max"], waited)
+    stats["service_total"] += service
+    stats["service_max"] = max(stats["service_max"], service)
+    stats["service_ewma"] += IO_LATENCY_EWMA_ALPHA * (service - stats["service_ewma"])
+
+@contextlib.asynccontextmanager
+async def device_io_slot(full_path: Path, op: str, priority: int):
+    """Hold one I/O slot on the device behind full_path for the duration of the block."""
+    try:
+        state = get_device_io_state(full_path)
+    except OSError:
+        state = None  # Gone or unreadable - let the caller's own I/O report it
+    if state is None:
+        yield
+        return
+    
+    queued_at = time.monotonic()
+    await acquire_device_slot(state, priority)
+    started_at = time.monotonic()
+    add_timing(f"{op}_queue", started_at - queued_at, f"{state['kind']} {state['device']}")
+    try:
+        yield
+    finally:
+        release_device_slot(state)
+        record_device_io(state, op, started_at - queued_at, time.monotonic() - started_at)
+
+def read_file_range_sync(full_path: Path, start: int, length: int) -> bytes:
+    """Read a byte range of a file."""
+    with open(full_path, "rb") as f:
+        f.seek(start)
+        return f.read(length)
+
+def list_folder_media_sync(folder_full_path: Path) -> List[str]:
+    """Media file names in a folder, in the order get_photos lists them (cached until the folder changes)."""
+    mtime_ns = folder_full_path.stat().st_mtime_ns
+    cache_key = str(folder_full_path)
+    cached = folder_order_cache.get(cache_key)
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+    
+    names = []
+    with os.scandir(folder_full_path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file() and Path(entry.name).suffix.lower() in SUPPORTED_EXTENSIONS:
+                    names.append(entry.name)
+            except (OSError, PermissionError):
+                continue
+    names.sort(key=lambda name: name.lower())
+    
+    if len(folder_order_cache) >= FOLDER_ORDER_CACHE_SIZE:
+        folder_order_cache.pop(next(iter(folder_order_cache)))
+    folder_order_cache[cache_key] = (mtime_ns, names)
+    return names
+
+def get_neighbor_paths_sync(rel_path: str) -> List[str]:
+    """Relative paths of the items next to and before this one in its folder's listing order."""
+    rel_folder, _, name = rel_path.rpartition('/')
+    names = list_folder_media_sync(Path(PHOTOS_DIR) / rel_folder)
+    try:
+        index = names.index(name)
+    except ValueError:
+        return []
+    
+    neighbors = []
+    for distance in range(1, PREFETCH_NEIGHBORS + 1):
+        # Next items first - forward is the common direction when paging through a folder
+        for neighbor_index in (index + distance, index - distance):
+            if 0 <= neighbor_index < len(names):
+                neighbors.append(join_relative_path(rel_folder, names[neighbor_index]))
+    return neighbors
+
+def warm_page_cache_sync(full_path: Path, max_bytes: int):
+    """Pull the start of a file into the OS page cache."""
+    fd = os.open(full_path, os.O_RDONLY)
+    try:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, max_bytes, os.POSIX_FADV_WILLNEED)
+        else:
+            remaining = max_bytes
+            while remaining > 0:
+                chunk = os.read(fd, min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+    finally:
+        os.close(fd)
+
+async def prefetch_item(rel_path: str, rendition_size=None):
+    """Warm one neighbouring item once its disk is quiet, pre-generating its display rendition if asked."""
+    try:
+        full_path = Path(PHOTOS_DIR) / rel_path
+        device = full_path.stat().st_dev
+        
+        # Wait for the disk to be free of live requests and other prefetches
+        deadline = time.monotonic() + PREFETCH_MAX_WAIT_SECONDS
+        while True:
+            quiet_for = time.monotonic() - last_live_read_by_device.get(device, 0)
+            io_state = device_io_state.get(device)
+            if (live_reads_by_device.get(device, 0) == 0 and quiet_for >= PREFETCH_LIVE_QUIET_SECONDS
+                    and prefetch_running_by_device.get(device, 0) < PREFETCH_MAX_PER_DEVICE
+                    and not (io_state and io_state["waiters"])):
+                break
+            if time.monotonic() > deadline:
+                print(f"⏭️ Prefetch gave up waiting for a quiet disk: {rel_path}")
+                return
+            await asyncio.sleep(0.1)
+        
+        prefetch_running_by_device[device] = prefetch_running_by_device.get(device, 0) + 1
+        try:
+            async with device_io_slot(full_path, "prefetch", IO_PRIORITY_PREFETCH):
+                loop = asyncio.get_event_loop()
+                await loop.run_in_executor(prefetch_executor, warm_page_cache_sync, full_path, PREFETCH_READ_BYTES)
+                
+                if rendition_size and full_path.suffix.lower() in IMAGE_EXTENSIONS and not is_rendition_passthrough(full_path):
+                    max_width, max_height, fmt = rendition_size
+                    output_path = get_rendition_path(rel_path, full_path, max_width, max_height, fmt)
+                    await ensure_display_rendition(full_path, output_path, max_width, max_height, fmt, executor=prefetch_executor)
+            print(f"📦 Prefetched {rel_path}")
+        finally:
+            prefetch_running_by_device[device] -= 1
+    except Exception as e:
+        print(f"❌ Error prefetching {rel_path}: {e}")
+    finally:
+        prefetch_pending.discard(rel_path)
+
+async def prefetch_neighbors(rel_path: str, rendition_size=None):
+    """Find the items around rel_path in its folder and start bounded prefetch jobs for them."""
+    try:
+        loop = asyncio.get_event_loop()
+        neighbors = await loop.run_in_executor(prefetch_executor, get_neighbor_paths_sync, rel_path)
+    except Exception as e:
+        print(f"❌ Error finding neighbours of {rel_path}: {e}")
+        return
+    
+    for neighbor in neighbors:
+        if neighbor in prefetch_pending or len(prefetch_pending) >= PREFETCH_MAX_PENDING:
+            continue
+        prefetch_pending.add(neighbor)
+        start_background_task(prefetch_item(neighbor, rendition_size))
+
+def schedule_prefetch(rel_path: str, rendition_size=None):
+    """Prefetch the neighbours of an item being viewed without delaying the current response."""
+    if PREFETCH_NEIGHBORS > 0:
+        start_background_task(prefetch_neighbors(rel_path, rendition_size))
+
+def join_relative_path(rel_folder: str, name: str) -> str:
+    """Join a library-relative folder and an entry name the way listings report paths."""
+    return f"{rel_folder}/{name}" if rel_folder else name
+
+def get_parent_folder(rel_folder: str):
+    """Parent of a library-relative folder ('' for top-level folders, None for the library root)."""
+    if not rel_folder:
+        return None
+    return rel_folder.rsplit('/', 1)[0] if '/' in rel_folder else ''
+
+def get_search_write_connection() -> sqlite3.Connection:
+    """Open the index connection used by the writer thread, creating the schema on first use."""
+    global search_write_connection
+    if search_write_connection is None:
+        SEARCH_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(SEARCH_DB_PATH), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")  # Lets searches read while the indexer writes
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SEARCH_SCHEMA)
+        try:
+            conn.executescript(SEARCH_FTS_SCHEMA)
+            search_index_state["fts"] = True
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Trigram FTS not available ({e}), search will scan the path table")
+        conn.commit()
+        search_write_connection = conn
+    return search_write_connection
+
+def get_search_read_connection() -> sqlite3.Connection:
+    """Get this thread's read-only connection to the search index."""
+    conn = getattr(search_read_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(f"file:{SEARCH_DB_PATH}?mode=ro", uri=True)
+        # SQLite's lower() only folds ASCII; recursive listings sort by name with Python's, so walk and index agree
+        conn.create_function("py_lower", 1, str.lower, deterministic=True)
+        search_read_local.conn = conn
+    return conn
+
+def remove_indexed_subtree_sync(conn: sqlite3.Connection, rel_folder: str):
+    """Drop a directory and everything beneath it from the index, returning the removed (file paths, folder paths)."""
+    # Every path under 'folder/' sorts between 'folder/' and 'folder0' ('0' follows '/'), so the UNIQUE index covers it
+    prefix = rel_folder + '/'
+    prefix_end = rel_folder + '0'
+    removed_files = [row[0] for row in conn.execute(
+        "SELECT path FROM files WHERE path >= ? AND path < ?", (prefix, prefix_end)
+    )]
+    removed_dirs = [row[0] for row in conn.execute(
+        "SELECT path FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (rel_folder, prefix, prefix_end)
+    )]
+    conn.execute("DELETE FROM files WHERE path >= ? AND path < ?", (prefix, prefix_end))
+    conn.execute("DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (rel_folder, prefix, prefix_end))
+    conn.execute("DELETE FROM folder_stats WHERE path = ? OR (path >= ? AND path < ?)", (rel_folder, prefix, prefix_end))
+    return removed_files, removed_dirs
+
+def get_folder_depth(rel_folder: str) -> int:
+    """Nesting depth of a library-relative folder (0 for the library root)."""
+    return rel_folder.count('/') + 1 if rel_folder else 0
+
+def compute_folder_stats_sync(conn: sqlite3.Connection, rel_folder: str):
+    """Aggregate one folder from its own files and its subfolders' stored aggregates."""
+    file_count, total_bytes, newest_mtime = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0), MAX(mtime) FROM files WHERE folder = ?", (rel_folder,)
+    ).fetchone()
+    # Cover: the folder's newest images first, then its videos
+    cover = [
+        {"path": path, "type": file_type, "mtime": mtime}
+        for path, file_type, mtime in conn.execute(
+            "SELECT path, type, mtime FROM files WHERE folder = ? ORDER BY type = 'image' DESC, mtime DESC LIMIT ?",
+            (rel_folder, FOLDER_COVER_ITEMS)
+        )
+    ]
+    
+    subfolder_covers = []
+    for count, size, newest, subfolder_cover in conn.execute(
+        "SELECT s.file_count, s.total_bytes, s.newest_mtime, s.cover FROM dirs d JOIN folder_stats s ON s.path = d.path "
+        "WHERE d.parent = ? ORDER BY s.newest_mtime DESC", (rel_folder,)
+    ):
+        file_count += count
+        total_bytes += size
+        if newest is not None and (newest_mtime is None or newest > newest_mtime):
+            newest_mtime = newest
+        subfolder_covers.append(json.loads(subfolder_cover))
+    
+    # Fill the rest from the most recently changed subfolders' covers, one from each in turn
+    for index in range(FOLDER_COVER_ITEMS):
+        for items in subfolder_covers:
+            if len(cover) < FOLDER_COVER_ITEMS and index < len(items):
+                cover.append(items[index])
+    
+    conn.execute(
+        "INSERT INTO folder_stats (path, file_count, total_bytes, newest_mtime, cover) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(path) DO UPDATE SET file_count = excluded.file_count, total_bytes = excluded.total_bytes, "
+        "newest_mtime = excluded.newest_mtime, cover = excluded.cover",
+        (rel_folder, file_count, total_bytes, newest_mtime, json.dumps(cover))
+    )
+
+def update_folder_stats_sync(dirty: set) -> int:
+    """Recompute changed folders and their ancestors, deepest first so parents see fresh children."""
+    conn = get_search_write_connection()
+    # Folders that never had stats (new index, or empty folders no ingest touched) are picked up here too
+    dirty = set(dirty)
+    dirty.update(row[0] for row in conn.execute(
+        "SELECT path FROM dirs WHERE path NOT IN (SELECT path FROM folder_stats)"
+    ))
+    for rel_folder in list(dirty):
+        parent = get_parent_folder(rel_folder)
+        while parent is not None and parent not in dirty:
+            dirty.add(parent)
+            parent = get_parent_folder(parent)
+    
+    known_dirs = {row[0] for row in conn.execute("SELECT path FROM dirs")}
+    updated = 0
+    for rel_folder in sorted(dirty, key=get_folder_depth, reverse=True):
+        if rel_folder in known_dirs:
+            compute_folder_stats_sync(conn, rel_folder)
+            updated += 1
+    conn.commit()
+    return updated
+
+def mark_folder_stats_dirty(rel_folder: str):
+    """Queue a folder's aggregates (and so its ancestors') for recomputing."""
+    folder_stats_dirty.add(rel_folder)
+    folder_stats_event.set()
+
+async def folder_stats_loop():
+    """Keep folder aggregates current, recomputing only the folders that changed."""
+    loop = asyncio.get_event_loop()
+    while True:
+        await folder_stats_event.wait()
+        await asyncio.sleep(FOLDER_STATS_DEBOUNCE_SECONDS)
+        folder_stats_event.clear()
+        if not search_index_state["ready"]:
+            continue
+        dirty = set(folder_stats_dirty)
+        folder_stats_dirty.clear()
         try:
-            thumbnail_queue.get_nowait()
+            updated = await loop.run_in_executor(search_index_executor, update_folder_stats_sync, dirty)
+            if updated:
+                print(f"📊 Folder stats updated for {updated} folders")
+        except Exception as e:
+            folder_stats_dirty.update(dirty)  # Try again on the next change
+            print(f"❌ Error updating folder stats: {e}")
+
+def get_folder_stats_sync(rel_folders: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Stored aggregates of some folders by path; folders without stats yet are left out."""
+    if not rel_folders or not search_index_state["ready"]:
+        return {}
+    conn = get_search_read_connection()
+    stats = {}
+    for start in range(0, len(rel_folders), 500):  # Stay under SQLite's bound parameter limit
+        batch = rel_folders[start:start + 500]
+        for path, file_count, total_bytes, newest_mtime, cover in conn.execute(
+            f"SELECT path, file_count, total_bytes, newest_mtime, cover FROM folder_stats WHERE path IN ({','.join('?' * len(batch))})",
+            batch
+        ):
+            stats[path] = {
+                "file_count": file_count,
+                "total_bytes": total_bytes,
+                "newest_mtime": newest_mtime,
+                "cover": json.loads(cover)
+            }
+    return stats
+
+def refresh_indexed_files_sync(conn: sqlite3.Connection, rel_folder: str, result: Dict[str, Any]) -> bool:
+    """Stat a folder's indexed files into result["modified"]; False if one is gone and the folder needs re-listing."""
+    updates = []
+    for path, size, mtime in conn.execute("SELECT path, size, mtime FROM files WHERE folder = ?", (rel_folder,)).fetchall():
+        try:
+            stat = (Path(PHOTOS_DIR) / path).stat()
+        except OSError:
+            return False
+        if (stat.st_size, stat.st_mtime) != (size, mtime):
+            updates.append((stat.st_size, stat.st_mtime, path))
+    if updates:
+        conn.executemany("UPDATE files SET size = ?, mtime = ? WHERE path = ?", updates)
+        conn.commit()
+        result["modified"].extend(path for _, _, path in updates)
+    return True
+
+def index_scan_folder_sync(rel_folder: str, only_if_changed: bool = False, refresh_files: bool = True) -> Dict[str, Any]:
+    """Reconcile the index with one directory's direct children, returning what was added, changed and removed."""
+    conn = get_search_write_connection()
+    folder_full_path = Path(PHOTOS_DIR) / rel_folder
+    result = {
+        "added": [], "modified": [], "removed": [],
+        "subdirs": [], "new_subdirs": [], "removed_dirs": [], "skipped": False
+    }
+    
+    try:
+        dir_mtime_ns = folder_full_path.stat().st_mtime_ns
+    except OSError:
+        # Directory is gone - drop it and everything that was beneath it
+        if rel_folder:
+            result["removed"], result["removed_dirs"] = remove_indexed_subtree_sync(conn, rel_folder)
+            conn.commit()
+        return result
+    
+    if only_if_changed:
+        # An unchanged mtime means no entries were added or removed; files rewritten in place don't touch it,
+        # so they're stat'ed too unless this is a periodic pass (those only compare directory mtimes)
+        row = conn.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (rel_folder,)).fetchone()
+        if row and row[0] == dir_mtime_ns and (not refresh_files or refresh_indexed_files_sync(conn, rel_folder, result)):
+            result["subdirs"] = [r[0] for r in conn.execute("SELECT path FROM dirs WHERE parent = ?", (rel_folder,))]
+            result["skipped"] = not result["modified"]
+            return result
+    
+    on_disk = {}
+    try:
+        with os.scandir(folder_full_path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        result["subdirs"].append(join_relative_path(rel_folder, entry.name))
+                    elif entry.is_file() and Path(entry.name).suffix.lower() in SUPPORTED_EXTENSIONS:
+                        stat = entry.stat()
+                        on_disk[join_relative_path(rel_folder, entry.name)] = (entry.name, stat.st_size, stat.st_mtime)
+                except (OSError, PermissionError):
+                    # Skip entries we can't access
+                    continue
+    except (OSError, PermissionError) as e:
+        print(f"⚠️ Could not index {rel_folder or '/'}: {e}")
+        return result
+    
+    indexed = {row[0]: (row[1], row[2]) for row in conn.execute(
+        "SELECT path, size, mtime FROM files WHERE folder = ?", (rel_folder,)
+    )}
+    
+    for path, (name, size, mtime) in on_disk.items():
+        if path not in indexed:
+            ext = Path(name).suffix.lower()
+            file_type = "image" if ext in IMAGE_EXTENSIONS else "video"
+            conn.execute(
+                "INSERT INTO files (path, folder, name, type, size, mtime) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, rel_folder, name, file_type, size, mtime)
+            )
+            result["added"].append(path)
+        elif indexed[path] != (size, mtime):
+            conn.execute("UPDATE files SET size = ?, mtime = ? WHERE path = ?", (size, mtime, path))
+            result["modified"].append(path)
+    
+    for path in indexed.keys() - on_disk.keys():
+        conn.execute("DELETE FROM files WHERE path = ?", (path,))
+        result["removed"].append(path)
+    
+    # Subdirectories that disappeared take their whole subtree with them
+    known_subdirs = {r[0] for r in conn.execute("SELECT path FROM dirs WHERE parent = ?", (rel_folder,))}
+    for gone in known_subdirs - set(result["subdirs"]):
+        removed_files, removed_dirs = remove_indexed_subtree_sync(conn, gone)
+        result["removed"].extend(removed_files)
+        result["removed_dirs"].extend(removed_dirs)
+    
+    # New subdirectories get a placeholder mtime so an interrupted walk still visits them next time
+    result["new_subdirs"] = [subdir for subdir in result["subdirs"] if subdir not in known_subdirs]
+    conn.executemany(
+        "INSERT OR IGNORE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, 0)",
+        [(subdir, rel_folder) for subdir in result["new_subdirs"]]
+    )
+    conn.execute(
+        "INSERT INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?) "
+        "ON CONFLICT(path) DO UPDATE SET mtime_ns = excluded.mtime_ns",
+        (rel_folder, get_parent_folder(rel_folder), dir_mtime_ns)
+    )
+    conn.commit()
+    return result
+
+async def run_index_scan(rel_folder: str, only_if_changed: bool, refresh_files: bool = True) -> Dict[str, Any]:
+    """Run index_scan_folder_sync for one folder while holding a scan slot on its device."""
+    loop = asyncio.get_event_loop()
+    async with device_io_slot(Path(PHOTOS_DIR) / rel_folder, "scan", IO_PRIORITY_SCAN):
+        return await loop.run_in_executor(
+            search_index_executor, index_scan_folder_sync, rel_folder, only_if_changed, refresh_files
+        )
+
+async def refresh_search_index():
+    """Walk the library and re-list only the directories whose mtime changed since the last pass."""
+    if search_index_state["refreshing"]:
+        # One pass at a time - the running one goes round again instead (periodic and overflow rescans coalesce)
+        search_index_state["refresh_pending"] = True
+        return
+    search_index_state["refreshing"] = True
+    try:
+        while True:
+            search_index_state["refresh_pending"] = False
+            rescanned = 0
+            pending = ['']
+            while pending:
+                rel_folder = pending.pop()
+                try:
+                    result = await run_index_scan(rel_folder, True, refresh_files=False)
+                except Exception as e:
+                    print(f"❌ Error indexing {rel_folder or '/'}: {e}")
+                    continue
+                if not result["skipped"]:
+                    rescanned += 1
+                    await apply_ingest_result(rel_folder, result)
+                pending.extend(result["subdirs"])
+            search_index_state["last_refresh"] = time.time()
+            folder_stats_event.set()  # Pick up folders that have no aggregates yet
+            print(f"🔎 Search index refreshed ({rescanned} directories rescanned)")
+            if not search_index_state["refresh_pending"]:
+                break
+    finally:
+        search_index_state["refreshing"] = False
+
+async def search_index_loop():
+    """Build the search index at startup, then keep it current with periodic incremental rescans."""
+    loop = asyncio.get_event_loop()
+    try:
+        conn = await loop.run_in_executor(search_index_executor, get_search_write_connection)
+        # An empty index means this pass discovers the whole library - don't treat that as newly copied-in media
+        search_index_state["initial_build"] = conn.execute("SELECT COUNT(*) FROM dirs").fetchone()[0] == 0
+        search_index_state["ready"] = True
+    except Exception as e:
+        print(f"❌ Could not open search index at {SEARCH_DB_PATH}: {e}")
+        return
+    
+    while True:
+        try:
+            await refresh_search_index()
+        except Exception as e:
+            print(f"❌ Error refreshing search index: {e}")
+        search_index_state["initial_build"] = False
+        # Rescan more often when part of the library can't be watched (network mounts, watch limit, no inotify)
+        await asyncio.sleep(WATCH_SCAN_INTERVAL if watcher_state["fallback_needed"] else SEARCH_REFRESH_INTERVAL)
+
+def submit_index_folder_update(rel_folder: str):
+    """Queue a re-index of one folder without waiting for it."""
+    if search_index_state["ready"]:
+        start_background_task(ingest_folder(rel_folder, only_if_changed=True))
+
+def search_index_query_sync(query: str, limit: int, cursor: int) -> Dict[str, Any]:
+    """Find indexed files whose relative path contains every whitespace-separated term."""
+    conn = get_search_read_connection()
+    # With FTS the LIKE terms go against the trigram table; otherwise they scan the files table
+    source = "files_fts" if search_index_state["fts"] else "f"
+    
+    conditions = []
+    params = []
+    for term in query.split():
+        if any(c in term for c in '%_\\'):
+            escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append(f"{source}.path LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        else:
+            # Trigram FTS answers plain LIKE '%term%' from its index (terms of 3+ characters)
+            conditions.append(f"{source}.path LIKE ?")
+            params.append(f"%{term}%")
+    conditions.append(f"{source}.rowid > ?")
+    params.append(cursor)
+    params.append(limit + 1)  # One extra row tells us whether there is another page
+    
+    if source == "files_fts":
+        from_clause = "files_fts JOIN files f ON f.id = files_fts.rowid"
+    else:
+        from_clause = "files f"
+    sql = (
+        f"SELECT f.id, f.path, f.name, f.type, f.size, f.mtime, f.folder FROM {from_clause} "
+        f"WHERE {' AND '.join(conditions)} ORDER BY {source}.rowid LIMIT ?"
+    )
+    rows = conn.execute(sql, params).fetchall()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "results": [
+            {
+                "name": name,
+                "path": path,
+                "type": file_type,
+                "size": size,
+                "modified": mtime,
+                "folder": folder
+            }
+            for _, path, name, file_type, size, mtime, folder in rows
+        ],
+        "next_cursor": rows[-1][0] if has_more else None
+    }
+
+def submit_thumbnail_generation(file_path: str, background_tasks: BackgroundTasks):
+    """Submit thumbnail generation to queue if not already processing."""
+    return submit_thumbnail_with_priority(file_path, background_tasks)
+
+def submit_conversion_generation(file_path: str) -> bool:
+    """Submit video conversion to queue if not already processing. Returns False if the queue is full."""
+    if get_job_failure("conversion", file_path):
+        print(f"⏭️ Skipping conversion for {file_path} - it failed recently")
+        return True
+    if file_path in conversion_processing or file_path in conversion_queued:
+        return True
+    
+    # Journaled either way - a conversion turned away is readmitted once the queue has drained
+    journal_job_queued("conversion", file_path)
+    if len(conversion_queued) >= CONVERSION_QUEUE_LIMIT:
+        admission_state["backlog"]["conversion"] = True
+        admission_state["rejected_saturated"] += 1
+        return False
+    # Add to queue instead of directly starting
+    conversion_queue.put_nowait(file_path)
+    conversion_queued.add(file_path)
+    return True
+
+def resolve_trusted_proxies_sync():
+    """Turn TRUSTED_PROXIES into networks, looking up hostnames (the nginx service) that aren't addresses."""
+    networks = []
+    for proxy in TRUSTED_PROXIES:
+        try:
+            networks.append(ipaddress.ip_network(proxy))
+            continue
+        except ValueError:
+            pass
+        try:
+            addresses = {info[4][0] for info in socket.getaddrinfo(proxy, None)}
+        except OSError as e:
+            print(f"⚠️ Could not resolve trusted proxy {proxy}: {e}")
+            continue
+        networks.extend(ipaddress.ip_network(address.split("%")[0]) for address in addresses)
+    return networks
+
+def get_request_client(request: Request):
+    """Address of the browser behind a request, from the proxy headers when a trusted proxy sent it."""
+    peer = request.client.host if request.client else None
+    try:
+        trusted = peer is not None and any(ipaddress.ip_address(peer) in network for network in trusted_proxy_networks)
+    except ValueError:
+        trusted = False
+    if not trusted:
+        return peer
+    real_ip = request.headers.get("x-real-ip")
+    if real_ip:
+        return real_ip.strip()
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        return forwarded.split(",")[-1].strip()  # Appended by the proxy itself, so it can't be spoofed
+    return peer
+
+def release_queued_thumbnail(file_path: str):
+    """Forget a waiting thumbnail job (its queue entry is skipped) and give its client the slot back."""
+    entry = thumbnail_queued.pop(file_path, None)
+    if entry is not None:
+        same_priority = thumbnail_queued_by_priority.get(entry["priority"])
+        if same_priority is not None:
+            same_priority.pop(file_path, None)
+            if not same_priority:
+                del thumbnail_queued_by_priority[entry["priority"]]
+    client = entry and entry["client"]
+    if client is not None:
+        remaining = client_queued_counts.get(client, 0) - 1
+        if remaining > 0:
+            client_queued_counts[client] = remaining
+        else:
+            client_queued_counts.pop(client, None)
+
+def shed_thumbnail_job(priority: int) -> bool:
+    """Drop the lowest-priority, oldest waiting job to make room for one at `priority`; False if none may go."""
+    if not thumbnail_queued_by_priority:
+        return False
+    victim_priority = max(thumbnail_queued_by_priority)  # Only a handful of priorities are ever in use
+    if victim_priority < priority:
+        return False
+    victim = next(iter(thumbnail_queued_by_priority[victim_priority]))  # Oldest of them
+    if victim_priority == priority and time.monotonic() - thumbnail_queued[victim]["queued_at"] < QUEUE_STALE_SECONDS:
+        return False  # Not even the oldest of this priority has gone stale
+    
+    print(f"🪓 Shed thumbnail for {victim} (priority: {thumbnail_queued[victim]['priority']})")
+    release_queued_thumbnail(victim)
+    # Still journaled as queued, so it's readmitted at background priority once there's room
+    admission_state["backlog"]["thumbnail"] = True
+    admission_state["shed"] += 1
+    return True
+
+def compact_thumbnail_queue():
+    """Rebuild the queue without the entries of shed jobs once they outnumber the queue limit."""
+    if thumbnail_queue.qsize() - len(thumbnail_queued) <= THUMBNAIL_QUEUE_LIMIT:
+        return
+    entries = []
+    while not thumbnail_queue.empty():
+        entries.append(thumbnail_queue.get_nowait())
+        thumbnail_queue.task_done()
+    for priority, file_path in entries:
+        entry = thumbnail_queued.get(file_path)
+        if entry is not None and entry["priority"] == priority:
+            thumbnail_queue.put_nowait((priority, file_path))
+
+async def readmit_journaled_jobs(kind: str, room: int):
+    """Resubmit up to `room` jobs the journal has as queued that aren't waiting in memory (shed or turned away)."""
+    queued = thumbnail_queued if kind == "thumbnail" else conversion_queued
+    processing = thumbnail_processing if kind == "thumbnail" else conversion_processing
+    readmitted = 0
+    admission_state["backlog"][kind] = False  # Set again if there's more than room, or a resubmission is turned away
+    waiting = [path for (job_kind, path), entry in job_states.items() if job_kind == kind and entry["state"] == 'queued']
+    for index, file_path in enumerate(waiting):
+        if index % JOB_RESUME_BATCH_SIZE == 0:
+            await asyncio.sleep(0)
+        if file_path in queued or file_path in processing:
+            continue
+        if readmitted >= room:
+            admission_state["backlog"][kind] = True
+            break
+        resubmit_job(kind, file_path)
+        if file_path in queued:
+            readmitted += 1
+    if readmitted:
+        admission_state["readmitted"] += readmitted
+        print(f"📒 Readmitted {readmitted} {kind} jobs from the journal")
+
+async def admission_backlog_loop():
+    """Requeue shed and turned-away jobs from the journal whenever their queue is below half its limit."""
+    while True:
+        await asyncio.sleep(ADMISSION_READMIT_INTERVAL)
+        try:
+            for kind, queued, limit in (("thumbnail", thumbnail_queued, THUMBNAIL_QUEUE_LIMIT),
+                                        ("conversion", conversion_queued, CONVERSION_QUEUE_LIMIT)):
+                if admission_state["backlog"][kind] and len(queued) < limit // 2:
+                    await readmit_journaled_jobs(kind, limit // 2 - len(queued))
+        except Exception as e:
+            print(f"❌ Error readmitting journaled jobs: {e}")
+
+def set_current_folder(folder_path: str):
+    """Set the current folder for thumbnail priority."""
+    global current_folder
+    old_folder = current_folder
+    current_folder = folder_path
+    
+    # If we're switching to a different folder, clear the queue to prioritize new folder
+    if old_folder != folder_path:
+        clear_thumbnail_queue()
+        print(f"Current folder changed from '{old_folder}' to '{folder_path}' - queue cleared")
+    else:
+        print(f"Current folder set to: {folder_path}")
+
+def clear_thumbnail_queue():
+    """Clear the thumbnail queue to prioritize current folder."""
+    global thumbnail_queue, thumbnail_queued
+    # Clear the existing queue by getting all items, keeping only background (ingest) work
+    kept = []
+    while not thumbnail_queue.empty():
+        try:
+            priority, file_path = thumbnail_queue.get_nowait()
             thumbnail_queue.task_done()
         except asyncio.QueueEmpty:
             break
-    # Clear the queued set as well
-    thumbnail_queued.clear()
-    print("Thumbnail queue cleared for new folder priority")
+        if priority >= BACKGROUND_THUMBNAIL_PRIORITY:
+            kept.append((priority, file_path))
+    for entry in kept:
+        thumbnail_queue.put_nowait(entry)
+    # Drop the other folders' jobs from the journal too - they're requested again if their folder is reopened
+    for file_path, entry in list(thumbnail_queued.items()):
+        if entry["priority"] < BACKGROUND_THUMBNAIL_PRIORITY:
+            release_queued_thumbnail(file_path)
+            journal_job_dropped("thumbnail", file_path)
+    # Stop work on other folders that's already running (kills its ffmpeg) so the new folder gets the workers;
+    # backfill is left alone, it's paused while interactive work runs anyway
+    cancelled = 0
+    for file_path, (job, priority) in list(thumbnail_running_tasks.items()):
+        if priority < BACKGROUND_THUMBNAIL_PRIORITY and not is_current_folder_file(file_path) and not job.done():
+            job.cancel()
+            cancelled += 1
+    print(f"Thumbnail queue cleared for new folder priority ({cancelled} running jobs cancelled)")
 
 def is_current_folder_file(file_path: str) -> bool:
     """Check if a file belongs to the current folder."""
@@ -440,24 +2285,442 @@ def is_current_folder_file(file_path: str) -> bool:
         return False
     return file_path.startswith(current_folder + '/')
 
-def submit_thumbnail_with_priority(file_path: str, background_tasks: BackgroundTasks):
-    """Submit thumbnail generation with priority for current folder."""
-    if file_path not in thumbnail_processing and file_path not in thumbnail_queued:
-        # Check if this is a current folder file
-        if is_current_folder_file(file_path):
-            # For current folder, add with high priority (lower number = higher priority)
-            priority = 1
-            asyncio.create_task(thumbnail_queue.put((priority, file_path)))
-            thumbnail_queued.add(file_path)  # Mark as queued
-            print(f"Priority thumbnail queued for current folder: {file_path} (priority: {priority})")
-        else:
-            # For other folders, add with lower priority
-            priority = 10
-            asyncio.create_task(thumbnail_queue.put((priority, file_path)))
-            thumbnail_queued.add(file_path)  # Mark as queued
-            print(f"Regular thumbnail queued: {file_path} (priority: {priority})")
-    else:
+def submit_thumbnail_with_priority(file_path: str, background_tasks: BackgroundTasks, background: bool = False,
+                                   client: str = None) -> str:
+    """Submit thumbnail generation with priority for current folder; returns "queued", "skipped", "client_limit" or "saturated"."""
+    if get_job_failure("thumbnail", file_path):
+        print(f"⏭️ Skipping thumbnail for {file_path} - it failed recently")
+        return "skipped"
+    if file_path in thumbnail_processing or file_path in thumbnail_queued:
         print(f"Thumbnail already queued or processing: {file_path}")
+        return "skipped"
+    
+    if background:
+        # Ingest of new files - only runs when nothing anyone is looking at is waiting
+        priority = BACKGROUND_THUMBNAIL_PRIORITY
+    elif is_current_folder_file(file_path):
+        # For current folder, add with high priority (lower number = higher priority)
+        priority = 1
+    else:
+        # For other folders, add with lower priority
+        priority = 10
+    
+    if client is not None and client_queued_counts.get(client, 0) >= CLIENT_QUEUED_LIMIT:
+        admission_state["rejected_client"] += 1
+        return "client_limit"
+    
+    journal_job_queued("thumbnail", file_path)
+    if len(thumbnail_queued) >= THUMBNAIL_QUEUE_LIMIT and not shed_thumbnail_job(priority):
+        # Stays journaled as queued, so background work turned away here is readmitted later
+        admission_state["backlog"]["thumbnail"] = True
+        admission_state["rejected_saturated"] += 1
+        return "saturated"
+    
+    thumbnail_queue.put_nowait((priority, file_path))
+    thumbnail_queued[file_path] = {"priority": priority, "queued_at": time.monotonic(), "client": client}
+    thumbnail_queued_by_priority.setdefault(priority, {})[file_path] = None
+    if client is not None:
+        client_queued_counts[client] = client_queued_counts.get(client, 0) + 1
+    compact_thumbnail_queue()
+    
+    if background:
+        print(f"Background thumbnail queued: {file_path} (priority: {priority})")
+    elif priority == 1:
+        print(f"Priority thumbnail queued for current folder: {file_path} (priority: {priority})")
+    else:
+        print(f"Regular thumbnail queued: {file_path} (priority: {priority})")
+    return "queued"
+
+def get_contact_sheet_dir(rel_folder: str) -> Path:
+    """Directory holding all contact sheets of one folder (removed as a unit when the folder goes away)."""
+    return CONTACT_SHEET_DIR / hashlib.md5(rel_folder.encode()).hexdigest()
+
+def get_contact_sheet_page_sync(rel_folder: str, offset: int, limit: int) -> Dict[str, Any]:
+    """Describe one page of a folder's listing: members with their type and a signature of their current state."""
+    folder_full_path = Path(PHOTOS_DIR) / rel_folder
+    names = list_folder_media_sync(folder_full_path)
+    members = []
+    signature = hashlib.md5()
+    for name in names[offset:offset + limit]:
+        rel_path = join_relative_path(rel_folder, name)
+        try:
+            stat = (folder_full_path / name).stat()
+        except OSError:
+            continue
+        file_type = "image" if Path(name).suffix.lower() in IMAGE_EXTENSIONS else "video"
+        # Videos are drawn from the thumbnail cache, so a finished thumbnail changes the sheet too
+        has_thumbnail = file_type == "image" or get_thumbnail_cache_key(rel_path) in thumbnail_cache
+        members.append({"name": name, "path": rel_path, "type": file_type, "placeholder": not has_thumbnail})
+        signature.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}:{has_thumbnail}\n".encode())
+    return {"members": members, "total": len(names), "signature": signature.hexdigest()}
+
+def get_contact_sheet_path(rel_folder: str, offset: int, limit: int, tile: int, fmt: str, signature: str) -> Path:
+    """Cache path for a sheet; the member signature is part of the name so any member change invalidates it."""
+    page_key = f"{offset}_{limit}_{tile}"
+    return get_contact_sheet_dir(rel_folder) / f"{page_key}_{signature}.{fmt}"
+
+def get_contact_sheet_grid(member_count: int):
+    """Columns and rows of a sheet holding member_count tiles (short pages don't get empty columns)."""
+    columns = max(1, min(CONTACT_SHEET_COLUMNS, member_count))
+    return columns, max(1, math.ceil(member_count / columns))
+
+def fit_contact_sheet_tile(img: Image.Image, tile: int) -> Image.Image:
+    """Center-crop an image to a square and scale it to the tile size (like object-fit: cover)."""
+    img.draft('RGB', (tile, tile))
+    img = ImageOps.exif_transpose(img)
+    side = min(img.width, img.height)
+    left = (img.width - side) // 2
+    top = (img.height - side) // 2
+    img = img.crop((left, top, left + side, top + side))
+    img.thumbnail((tile, tile), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return img.convert('RGB')
+
+def render_media_tile_sync(member: Dict[str, Any], tile: int) -> Image.Image:
+    """Square tile of an image, or of a video's cached thumbnail (a placeholder colour if it has none yet)."""
+    if member["type"] == "image":
+        with Image.open(Path(PHOTOS_DIR) / member["path"]) as img:
+            return fit_contact_sheet_tile(img, tile)
+    if member["placeholder"]:
+        return Image.new('RGB', (tile, tile), CONTACT_SHEET_VIDEO_PLACEHOLDER)
+    data_url = thumbnail_cache.get(get_thumbnail_cache_key(member["path"]))
+    if not data_url:
+        raise ValueError("thumbnail evicted")
+    thumbnail_bytes = base64.b64decode(data_url.split(',', 1)[1])
+    with Image.open(io.BytesIO(thumbnail_bytes)) as img:
+        return fit_contact_sheet_tile(img, tile)
+
+def build_contact_sheet_sync(rel_folder: str, members: List[Dict[str, Any]], tile: int, fmt: str, output_path: Path) -> bool:
+    """Pack a page of tiles into one sprite image."""
+    build_started = time.time()
+    try:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        columns, rows = get_contact_sheet_grid(len(members))
+        sheet = Image.new('RGB', (columns * tile, rows * tile), CONTACT_SHEET_BACKGROUND)
+        
+        for index, member in enumerate(members):
+            x = (index % columns) * tile
+            y = (index // columns) * tile
+            try:
+                sheet.paste(render_media_tile_sync(member, tile), (x, y))
+            except Exception as e:
+                # Leave the background showing for tiles we can't decode
+                print(f"⚠️ Contact sheet tile failed for {member['path']}: {e}")
+        
+        temp_path = output_path.with_name(output_path.name + ".tmp")
+        save_kwargs = {"quality": RENDITION_QUALITY[fmt]}
+        if fmt == "webp":
+            save_kwargs["method"] = 2  # Sheets are rebuilt often, favour encode speed
+        sheet.save(temp_path, format=fmt.upper(), **save_kwargs)
+        os.replace(temp_path, output_path)
+        
+        # Drop older versions of this page (same offset/limit/tile, different members). The other format of
+        # this signature stays, and so does anything written since we started - it may be from a newer listing
+        page_prefix, signature = output_path.stem.rsplit('_', 1)
+        for stale in output_path.parent.iterdir():
+            if (not stale.name.startswith(page_prefix + '_') or stale.suffix == '.tmp'
+                    or stale.stem.rsplit('_', 1)[-1] == signature):
+                continue
+            try:
+                if stale.stat().st_mtime < build_started:
+                    stale.unlink()
+            except OSError:
+                pass
+        
+        print(f"✅ Contact sheet created: {rel_folder or '/'} {output_path.name} ({len(members)} tiles)")
+        return True
+    except Exception as e:
+        print(f"❌ Error building contact sheet for {rel_folder or '/'}: {e}")
+        try:
+            output_path.with_name(output_path.name + ".tmp").unlink()
+        except OSError:
+            pass
+        return False
+
+def get_contact_sheet_layout(members: List[Dict[str, Any]], tile: int) -> List[Dict[str, Any]]:
+    """Position of each member's tile in the sheet, in listing order."""
+    columns, _ = get_contact_sheet_grid(len(members))
+    return [
+        {
+            "path": member["path"],
+            "name": member["name"],
+            "type": member["type"],
+            "x": (index % columns) * tile,
+            "y": (index // columns) * tile,
+            "placeholder": member["placeholder"]
+        }
+        for index, member in enumerate(members)
+    ]
+
+def record_folder_change(rel_folder: str):
+    """Bump the change sequence for a folder so clients polling /api/changes can refresh it."""
+    global library_change_seq
+    library_change_seq += 1
+    folder_change_seqs.pop(rel_folder, None)  # Re-insert so the dict stays ordered oldest change first
+    folder_change_seqs[rel_folder] = library_change_seq
+    if len(folder_change_seqs) > MAX_TRACKED_FOLDER_CHANGES:
+        folder_change_seqs.pop(next(iter(folder_change_seqs)))
+
+def clear_cached_artifacts(file_path: str):
+    """Forget the in-memory cache entries of a file that was deleted or changed."""
+    cache_key = thumbnail_cache_keys.pop(file_path, None)
+    if cache_key:
+        thumbnail_cache.pop(cache_key, None)
+    conversion_cache.pop(f"{file_path}_converted", None)
+
+def remove_cached_files_sync(file_path: str):
+    """Delete everything generated on disk from a file that was deleted or changed."""
+    shutil.rmtree(get_rendition_dir(file_path), ignore_errors=True)
+    shutil.rmtree(get_deep_zoom_dir(file_path), ignore_errors=True)
+    get_converted_path(Path(file_path)).unlink(missing_ok=True)
+    # GIF videos and still markers are named after the path's hash and the source mtime
+    prefix = hashlib.md5(file_path.encode()).hexdigest()
+    for pattern in (f"{prefix}_*.mp4", f"{prefix}_*.still"):
+        for stale in GIF_VIDEO_DIR.glob(pattern):
+            stale.unlink(missing_ok=True)
+
+def remove_ingest_cache_files_sync(rel_folder: str, result: Dict[str, Any]):
+    """Delete the on-disk caches an ingest made stale - contact sheets, covers and files' generated artifacts."""
+    shutil.rmtree(get_contact_sheet_dir(rel_folder), ignore_errors=True)
+    for file_path in result["removed"] + result["modified"]:
+        remove_cached_files_sync(file_path)
+    for removed_dir in result["removed_dirs"]:
+        shutil.rmtree(get_contact_sheet_dir(removed_dir), ignore_errors=True)
+        remove_folder_covers(removed_dir)
+
+async def apply_ingest_result(rel_folder: str, result: Dict[str, Any]):
+    """Act on what an index scan found: clean up caches for removed/changed files and queue work for new ones."""
+    changed = result["added"] + result["modified"]
+    if not (changed or result["removed"] or result["removed_dirs"] or result["new_subdirs"]):
+        return
+    
+    record_folder_change(rel_folder)
+    mark_folder_stats_dirty(rel_folder)
+    for file_path in result["removed"] + result["modified"]:
+        clear_cached_artifacts(file_path)
+    for file_path in result["removed"]:
+        forget_jobs(file_path)
+    for removed_dir in result["removed_dirs"]:
+        record_folder_change(removed_dir)
+    # Contact sheets, renditions, pyramids and videos are rebuilt on demand anyway; drop the old ones now
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, remove_ingest_cache_files_sync, rel_folder, result)
+    
+    if search_index_state["initial_build"]:
+        return
+    
+    # Get new media ready before anyone opens the folder
+    for file_path in changed:
+        if Path(file_path).suffix.lower() in VIDEO_EXTENSIONS:
+            submit_thumbnail_with_priority(file_path, None, background=True)
+            if needs_conversion(Path(file_path)):
+                submit_conversion_generation(file_path)
+        elif file_path.lower().endswith('.gif'):
+            try:
+                if is_gif_video_sync(file_path, Path(PHOTOS_DIR) / file_path):
+                    submit_conversion_generation(file_path)
+            except OSError:
+                continue
+    if changed or result["removed"]:
+        print(f"📥 Ingested {rel_folder or '/'}: {len(result['added'])} added, "
+              f"{len(result['modified'])} changed, {len(result['removed'])} removed")
+
+async def ingest_folder(rel_folder: str, only_if_changed: bool = False):
+    """Re-index one folder and ingest what changed, descending into newly created subfolders."""
+    loop = asyncio.get_event_loop()
+    try:
+        result = await run_index_scan(rel_folder, only_if_changed)
+    except Exception as e:
+        print(f"❌ Error ingesting {rel_folder or '/'}: {e}")
+        return
+    
+    await apply_ingest_result(rel_folder, result)
+    
+    for subdir in result["new_subdirs"]:
+        if watcher_state["fd"] is not None:
+            await loop.run_in_executor(None, add_watch_tree_sync, subdir)
+        await ingest_folder(subdir)
+
+def get_mount_fstype(path: Path) -> str:
+    """Filesystem type of the mount a path lives on, from /proc/mounts."""
+    global mount_table
+    if mount_table is None:
+        mount_table = []
+        try:
+            with open("/proc/mounts") as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) >= 3:
+                        # Mount points escape spaces and friends as octal (\040); anything else is literal UTF-8
+                        mount_point = MOUNT_ESCAPE.sub(lambda match: chr(int(match.group(1), 8)), fields[1])
+                        mount_table.append((mount_point.rstrip('/') or '/', fields[2]))
+        except OSError:
+            pass
+        mount_table.sort(key=lambda entry: len(entry[0]), reverse=True)
+    
+    path_str = str(path)
+    for mount_point, fstype in mount_table:
+        if mount_point == '/' or path_str == mount_point or path_str.startswith(mount_point + '/'):
+            return fstype
+    return ""
+
+def is_network_mount(path: Path) -> bool:
+    """Whether inotify can't be trusted for a path (changes made by other machines don't generate events)."""
+    fstype = get_mount_fstype(path)
+    return fstype in NETWORK_FILESYSTEMS or fstype.startswith('fuse')
+
+def add_watch_tree_sync(rel_folder: str) -> int:
+    """Add inotify watches for a folder and everything beneath it."""
+    fd = watcher_state["fd"]
+    if fd is None:
+        return 0
+    
+    added = 0
+    pending = [rel_folder]
+    while pending:
+        current = pending.pop()
+        full_path = Path(PHOTOS_DIR) / current
+        if is_network_mount(full_path):
+            if not watcher_state["fallback_needed"]:
+                print(f"📡 {current or '/'} is on a network mount - relying on periodic rescans")
+            watcher_state["fallback_needed"] = True
+            continue
+        
+        wd = libc.inotify_add_watch(fd, os.fsencode(str(full_path)), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            if errno == 28:  # ENOSPC - out of inotify watches
+                print(f"⚠️ inotify watch limit reached at {current or '/'} - raise fs.inotify.max_user_watches; "
+                      f"falling back to periodic rescans")
+                watcher_state["fallback_needed"] = True
+                return added
+            continue
+        watch_descriptors[wd] = current
+        added += 1
+        
+        try:
+            with os.scandir(full_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(join_relative_path(current, entry.name))
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    
+    watcher_state["watch_count"] = len(watch_descriptors)
+    return added
+
+def remove_watch_tree(rel_folder: str):
+    """Drop the inotify watches of a folder and everything beneath it (e.g. after it was renamed)."""
+    prefix = f"{rel_folder}/"
+    for wd, watched in list(watch_descriptors.items()):
+        if watched == rel_folder or watched.startswith(prefix) or not rel_folder:
+            libc.inotify_rm_watch(watcher_state["fd"], wd)
+            watch_descriptors.pop(wd, None)
+    watcher_state["watch_count"] = len(watch_descriptors)
+
+def read_inotify_events(fd: int) -> List[tuple]:
+    """Read and decode all pending inotify events as (wd, mask, name) tuples."""
+    events = []
+    while True:
+        try:
+            data = os.read(fd, 64 * 1024)
+        except BlockingIOError:
+            return events
+        if not data:
+            return events
+        offset = 0
+        while offset + INOTIFY_EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+            name_start = offset + INOTIFY_EVENT_HEADER.size
+            name = os.fsdecode(data[name_start:name_start + length].rstrip(b'\0'))
+            events.append((wd, mask, name))
+            offset = name_start + length
+
+def handle_inotify_events():
+    """Event loop reader callback: turn inotify events into debounced folder changes."""
+    for wd, mask, name in read_inotify_events(watcher_state["fd"]):
+        if mask & IN_Q_OVERFLOW:
+            # Kernel dropped events - fall back to a full mtime rescan
+            print("⚠️ inotify queue overflowed, rescanning library")
+            start_background_task(refresh_search_index())
+            continue
+        
+        rel_folder = watch_descriptors.get(wd)
+        if rel_folder is None:
+            continue
+        if mask & IN_IGNORED:
+            watch_descriptors.pop(wd, None)
+            watcher_state["watch_count"] = len(watch_descriptors)
+            continue
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            if mask & IN_MOVE_SELF:
+                # The watches still point at the old path; the new location is watched again when it's ingested
+                remove_watch_tree(rel_folder)
+            # The folder itself went away - its parent's scan removes it from the index
+            parent = get_parent_folder(rel_folder)
+            if parent is not None:
+                queue_folder_change(parent)
+            continue
+        
+        # Ignore churn from files we'd never list (partial downloads, sidecars...)
+        if not (mask & IN_ISDIR) and Path(name).suffix.lower() not in SUPPORTED_EXTENSIONS:
+            continue
+        queue_folder_change(rel_folder)
+
+def queue_folder_change(rel_folder: str):
+    """Add a folder to the debounce window, starting the flush task if needed."""
+    now = time.monotonic()
+    if not watcher_state["pending"]:
+        watcher_state["first_event"] = now
+    watcher_state["pending"].add(rel_folder)
+    watcher_state["last_event"] = now
+    if watcher_state["flush_task"] is None:
+        watcher_state["flush_task"] = asyncio.create_task(flush_folder_changes())
+
+async def flush_folder_changes():
+    """Ingest pending folders once changes have settled (or waited too long)."""
+    try:
+        while True:
+            await asyncio.sleep(WATCH_DEBOUNCE_SECONDS)
+            now = time.monotonic()
+            if (now - watcher_state["last_event"] >= WATCH_DEBOUNCE_SECONDS
+                    or now - watcher_state["first_event"] >= WATCH_MAX_DELAY_SECONDS):
+                break
+        pending = sorted(watcher_state["pending"])
+        watcher_state["pending"] = set()
+    finally:
+        watcher_state["flush_task"] = None
+    
+    for rel_folder in pending:
+        # Watched folders get a full re-list: a file rewritten in place doesn't change the folder's mtime
+        await ingest_folder(rel_folder)
+    
+    # Events that arrived while we were ingesting
+    if watcher_state["pending"] and watcher_state["flush_task"] is None:
+        watcher_state["flush_task"] = asyncio.create_task(flush_folder_changes())
+
+async def start_library_watcher():
+    """Set up inotify watches over the library; folders that can't be watched are covered by periodic rescans."""
+    if not WATCH_ENABLED:
+        print("👁️ Filesystem watcher disabled")
+        return
+    
+    try:
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    except (AttributeError, OSError) as e:
+        print(f"⚠️ inotify not available ({e}), relying on periodic rescans every {WATCH_SCAN_INTERVAL}s")
+        watcher_state["fallback_needed"] = True
+        return
+    
+    watcher_state["fd"] = fd
+    loop = asyncio.get_event_loop()
+    loop.add_reader(fd, handle_inotify_events)
+    watch_count = await loop.run_in_executor(None, add_watch_tree_sync, '')
+    print(f"👁️ Watching {watch_count} folders for changes")
 
 @app.get("/")
 async def root():
@@ -471,52 +2734,119 @@ async def health_check():
         "ffmpeg_available": subprocess.run(['which', 'ffmpeg'], capture_output=True).returncode == 0,
         "photos_dir": PHOTOS_DIR,
         "photos_dir_exists": os.path.exists(PHOTOS_DIR),
-        "thumbnail_queue_size": thumbnail_queue.qsize(),
+        "thumbnail_queue_size": len(thumbnail_queued),
         "thumbnail_processing_count": len(thumbnail_processing),
         "thumbnail_cache_size": len(thumbnail_cache),
-        "thumbnail_executor_workers": thumbnail_executor._max_workers,
-        "conversion_queue_size": conversion_queue.qsize(),
+        "thumbnail_executor_workers": MAX_CONCURRENT_THUMBNAILS,  # Queue worker tasks (name kept for existing clients)
+        "conversion_queue_size": len(conversion_queued),
         "conversion_processing_count": len(conversion_processing),
         "conversion_cache_size": len(conversion_cache),
-        "conversion_executor_workers": conversion_executor._max_workers,
+        "conversion_executor_workers": MAX_CONCURRENT_CONVERSIONS,
+        "rendition_inflight_count": len(rendition_inflight),
+        "deepzoom_building_count": len(deepzoom_building),
+        "avif_supported": AVIF_SUPPORTED,
+        "prefetch_pending_count": len(prefetch_pending),
         "current_folder": current_folder,
+        "search_index_ready": search_index_state["ready"],
+        "folder_stats_pending": len(folder_stats_dirty),
+        "recursive_listings_cached": len(recursive_listing_cache),
+        "recursive_walks_running": len(recursive_walk_inflight),
+        "watched_folders": watcher_state["watch_count"],
+        "watch_fallback_scanning": watcher_state["fallback_needed"],
+        "library_change_seq": library_change_seq,
+        "io_devices": {
+            state["device"]: {"kind": state["kind"], "in_flight": state["in_flight"], "queued": sum(1 for _, _, future in state["waiters"] if not future.done())}
+            for state in device_io_state.values()
+        },
         "resource_management": {
             "max_total_ffmpeg_processes": MAX_TOTAL_FFMPEG_PROCESSES,
             "ffmpeg_semaphore_available": ffmpeg_semaphore._value,
+            "running_ffmpeg_processes": current_ffmpeg_processes,
+            "interactive_ffmpeg_jobs": qos_state["interactive_active"],
+            "interactive_ffmpeg_available": interactive_ffmpeg_semaphore._value,
+            "backfill_ffmpeg_processes": len(backfill_processes),
+            "backfill_paused": qos_state["backfill_paused"],
+            "qos_cgroups": sorted(qos_state["cgroup_dirs"]),
             "separate_executors": True,
             "thumbnail_workers": MAX_CONCURRENT_THUMBNAILS,
             "conversion_workers": MAX_CONCURRENT_CONVERSIONS
         }
     }
 
+def list_folders_sync(photos_path: Path) -> List[Dict[str, Any]]:
+    """Top-level folders with their file counts."""
+    if not photos_path.exists():
+        return []
+    
+    folders = []
+    for item in photos_path.iterdir():
+        if item.is_dir():
+            # Count files in folder
+            file_count = sum(1 for f in item.iterdir() 
+                           if f.is_file() and f.suffix.lower() in SUPPORTED_EXTENSIONS)
+            
+            # Check if folder has subfolders
+            subfolder_count = sum(1 for f in item.iterdir() if f.is_dir())
+            
+            folders.append({
+                "name": item.name,
+                "path": str(item.relative_to(photos_path)),
+                "file_count": file_count,
+                "has_subfolders": subfolder_count > 0
+            })
+    return folders
+
 @app.get("/api/folders")
 async def list_folders() -> List[Dict[str, Any]]:
     """List all folders in the photos directory."""
     try:
         photos_path = Path(PHOTOS_DIR)
-        if not photos_path.exists():
-            return []
+        loop = asyncio.get_event_loop()
+        async with device_io_slot(photos_path, "listing", IO_PRIORITY_LIVE):
+            with timing_span("listing"):
+                folders = await loop.run_in_executor(None, list_folders_sync, photos_path)
         
-        folders = []
-        for item in photos_path.iterdir():
+        await add_folder_stats(folders)
+        return sorted(folders, key=lambda x: x["name"].lower())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing folders: {str(e)}")
+
+def list_subfolders_sync(folder_full_path: Path):
+    """Subfolders of a folder with their file counts, or None if the folder doesn't exist."""
+    if not folder_full_path.exists() or not folder_full_path.is_dir():
+        return None
+    
+    subfolders = []
+    for item in folder_full_path.iterdir():
+        try:
             if item.is_dir():
-                # Count files in folder
-                file_count = sum(1 for f in item.iterdir() 
-                               if f.is_file() and f.suffix.lower() in SUPPORTED_EXTENSIONS)
-                
-                # Check if folder has subfolders
-                subfolder_count = sum(1 for f in item.iterdir() if f.is_dir())
+                # Count files in subfolder (with error handling)
+                file_count = 0
+                subfolder_count = 0
+                try:
+                    for f in item.iterdir():
+                        try:
+                            if f.is_file() and f.suffix.lower() in SUPPORTED_EXTENSIONS:
+                                file_count += 1
+                            elif f.is_dir():
+                                subfolder_count += 1
+                        except (OSError, PermissionError):
+                            # Skip files we can't access
+                            continue
+                except (OSError, PermissionError):
+                    # Skip directories we can't access
+                    continue
                 
-                folders.append({
+                subfolders.append({
                     "name": item.name,
-                    "path": str(item.relative_to(photos_path)),
+                    "path": str(item.relative_to(Path(PHOTOS_DIR))),
                     "file_count": file_count,
                     "has_subfolders": subfolder_count > 0
                 })
-        
-        return sorted(folders, key=lambda x: x["name"].lower())
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error listing folders: {str(e)}")
+        except (OSError, PermissionError):
+            # Skip items we can't access
+            continue
+    return subfolders
 
 @app.get("/api/subfolders/{folder_path:path}")
 async def list_subfolders(folder_path: str) -> List[Dict[str, Any]]:
@@ -526,41 +2856,14 @@ async def list_subfolders(folder_path: str) -> List[Dict[str, Any]]:
         from urllib.parse import unquote
         decoded_folder_path = unquote(folder_path)
         folder_full_path = Path(PHOTOS_DIR) / decoded_folder_path
-        
-        if not folder_full_path.exists() or not folder_full_path.is_dir():
+        loop = asyncio.get_event_loop()
+        async with device_io_slot(folder_full_path, "listing", IO_PRIORITY_LIVE):
+            with timing_span("listing"):
+                subfolders = await loop.run_in_executor(None, list_subfolders_sync, folder_full_path)
+        if subfolders is None:
             raise HTTPException(status_code=404, detail="Folder not found")
         
-        subfolders = []
-        for item in folder_full_path.iterdir():
-            try:
-                if item.is_dir():
-                    # Count files in subfolder (with error handling)
-                    file_count = 0
-                    subfolder_count = 0
-                    try:
-                        for f in item.iterdir():
-                            try:
-                                if f.is_file() and f.suffix.lower() in SUPPORTED_EXTENSIONS:
-                                    file_count += 1
-                                elif f.is_dir():
-                                    subfolder_count += 1
-                            except (OSError, PermissionError):
-                                # Skip files we can't access
-                                continue
-                    except (OSError, PermissionError):
-                        # Skip directories we can't access
-                        continue
-                    
-                    subfolders.append({
-                        "name": item.name,
-                        "path": str(item.relative_to(Path(PHOTOS_DIR))),
-                        "file_count": file_count,
-                        "has_subfolders": subfolder_count > 0
-                    })
-            except (OSError, PermissionError):
-                # Skip items we can't access
-                continue
-        
+        await add_folder_stats(subfolders)
         return sorted(subfolders, key=lambda x: x["name"].lower())
     except HTTPException:
         raise
@@ -568,7 +2871,7 @@ async def list_subfolders(folder_path: str) -> List[Dict[str, Any]]:
         raise HTTPException(status_code=500, detail=f"Error listing subfolders: {str(e)}")
 
 @app.get("/api/thumbnail/{file_path:path}")
-async def get_video_thumbnail(file_path: str, background_tasks: BackgroundTasks):
+async def get_video_thumbnail(file_path: str, request: Request, background_tasks: BackgroundTasks):
     """Generate and serve a thumbnail for a video file with caching and background processing."""
     try:
         # URL decode the file path
@@ -576,24 +2879,29 @@ async def get_video_thumbnail(file_path: str, background_tasks: BackgroundTasks)
         decoded_file_path = unquote(file_path)
         full_path = Path(PHOTOS_DIR) / decoded_file_path
         
-        if not full_path.exists() or not full_path.is_file():
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        # Security check: ensure file is within photos directory
-        try:
-            full_path.resolve().relative_to(Path(PHOTOS_DIR).resolve())
-        except ValueError:
-            if not str(full_path).startswith(str(Path(PHOTOS_DIR))):
-                raise HTTPException(status_code=403, detail="Access denied")
+        with timing_span("fs"):
+            if not full_path.exists() or not full_path.is_file():
+                raise HTTPException(status_code=404, detail="File not found")
+            
+            # Security check: ensure file is within photos directory
+            try:
+                full_path.resolve().relative_to(Path(PHOTOS_DIR).resolve())
+            except ValueError:
+                if not str(full_path).startswith(str(Path(PHOTOS_DIR))):
+                    raise HTTPException(status_code=403, detail="Access denied")
         
         # Only generate thumbnails for video files
         if full_path.suffix.lower() not in VIDEO_EXTENSIONS:
             raise HTTPException(status_code=400, detail="File is not a video")
         
         # Check cache first
-        cache_key = get_thumbnail_cache_key(file_path)
-        if cache_key in thumbnail_cache:
-            return {"thumbnail": thumbnail_cache[cache_key], "cached": True}
+        with timing_span("cache"):
+            cache_key = get_thumbnail_cache_key(file_path)
+            if cache_key in thumbnail_cache:
+                return {"thumbnail": thumbnail_cache[cache_key], "cached": True}
+        
+        # Not ready - report how much work is ahead of it
+        add_timing("queue", 0, f"{len(thumbnail_queued)} queued, {len(thumbnail_processing)} running")
         
         # Check if currently processing
         if file_path in thumbnail_processing:
@@ -603,8 +2911,22 @@ async def get_video_thumbnail(file_path: str, background_tasks: BackgroundTasks)
         if file_path in thumbnail_queued:
             return {"status": "queued", "message": "Thumbnail generation already queued"}
         
+        # Don't spend ffmpeg time on a file that keeps failing
+        with timing_span("journal"):
+            failure = get_job_failure("thumbnail", file_path)
+        if failure:
+            return {"status": "failed", "message": "Thumbnail generation failed", **failure}
+        
         # If not in cache, not processing, and not in queue, submit to queue with priority
-        submit_thumbnail_with_priority(file_path, background_tasks)
+        with timing_span("journal"):
+            admission = submit_thumbnail_with_priority(
+                file_path, background_tasks, client=get_request_client(request)
+            )
+        retry_after = {"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)}
+        if admission == "client_limit":
+            raise HTTPException(status_code=429, detail="Too many thumbnails queued for this client", headers=retry_after)
+        if admission == "saturated":
+            raise HTTPException(status_code=503, detail="Thumbnail queue is full", headers=retry_after)
         return {"status": "queued", "message": "Thumbnail generation queued"}
             
     except HTTPException:
@@ -633,6 +2955,14 @@ async def get_thumbnail_status(file_path: str):
         if file_path in thumbnail_processing:
             return {"status": "processing"}
         
+        # Waiting for a worker (a shed job reads as not started, so the client asks for it again)
+        if file_path in thumbnail_queued:
+            return {"status": "queued"}
+        
+        failure = get_job_failure("thumbnail", file_path)
+        if failure:
+            return {"status": "failed", **failure}
+        
         # Not in cache and not processing
         return {"status": "not_started"}
             
@@ -652,76 +2982,626 @@ async def clear_thumbnail_cache():
     thumbnail_processing.clear()
     
     return {
-        "message": "Thumbnail cache cleared",
-        "cleared_cache_entries": cache_size,
-        "cleared_processing_entries": processing_count
+        "message": "Thumbnail cache cleared",
+        "cleared_cache_entries": cache_size,
+        "cleared_processing_entries": processing_count
+    }
+
+@app.get("/api/thumbnail-cache/status")
+async def get_thumbnail_cache_status():
+    """Get the current status of the thumbnail cache."""
+    return {
+        "cache_size": len(thumbnail_cache),
+        "processing_count": len(thumbnail_processing),
+        "queue_size": thumbnail_queue.qsize(),
+        "max_concurrent": MAX_CONCURRENT_THUMBNAILS,
+        "cache_keys": list(thumbnail_cache.keys())[:10],  # Show first 10 keys
+        "processing_files": list(thumbnail_processing)[:10]  # Show first 10 processing files
+    }
+
+def get_job_journal_status_sync() -> Dict[str, Any]:
+    """Job counts by kind and state plus the latest dead jobs."""
+    conn = get_job_journal_connection()
+    counts = {kind: {} for kind in JOB_KINDS}
+    for kind, state, count in conn.execute("SELECT kind, state, COUNT(*) FROM jobs GROUP BY kind, state"):
+        counts.setdefault(kind, {})[state] = count
+    dead = conn.execute(
+        "SELECT kind, path, attempts, last_error, updated FROM jobs WHERE state = 'dead' ORDER BY updated DESC LIMIT 50"
+    ).fetchall()
+    return {"counts": counts, "dead": dead}
+
+@app.get("/api/jobs/status")
+async def get_job_journal_status():
+    """Get job counts by state and the files background jobs have given up on."""
+    loop = asyncio.get_event_loop()
+    await flush_job_journal()
+    page = await loop.run_in_executor(job_journal_executor, get_job_journal_status_sync)
+    counts, dead = page["counts"], page["dead"]
+    return {
+        "counts": counts,
+        "max_attempts": JOB_MAX_ATTEMPTS,
+        "dead_jobs": [
+            {"kind": kind, "path": path, "attempts": attempts, "error": error, "updated": updated}
+            for kind, path, attempts, error, updated in dead
+        ],
+        "database": str(JOBS_DB_PATH)
+    }
+
+@app.post("/api/jobs/clear-failed")
+async def clear_failed_jobs():
+    """Forget past failures so failed files are tried again the next time they're requested."""
+    failed = [key for key, entry in job_states.items() if entry["state"] in ('failed', 'dead')]
+    for kind, file_path in failed:
+        set_job_state(kind, file_path, None)
+    cleared = len(failed)
+    return {"message": "Failed jobs cleared", "cleared_jobs": cleared}
+
+@app.get("/api/admission/status")
+async def get_admission_status():
+    """Get queue depths against their limits, the busiest clients and how much work has been shed or turned away."""
+    busiest = sorted(client_queued_counts.items(), key=lambda item: item[1], reverse=True)[:10]
+    return {
+        "thumbnail_queued": len(thumbnail_queued),
+        "thumbnail_queue_limit": THUMBNAIL_QUEUE_LIMIT,
+        "thumbnail_queue_entries": thumbnail_queue.qsize(),  # Includes entries of shed jobs not yet skipped
+        "conversion_queued": len(conversion_queued),
+        "conversion_queue_limit": CONVERSION_QUEUE_LIMIT,
+        "client_queued_limit": CLIENT_QUEUED_LIMIT,
+        "busiest_clients": [{"client": client, "queued": count} for client, count in busiest],
+        "backlog": admission_state["backlog"],
+        "shed": admission_state["shed"],
+        "rejected_client": admission_state["rejected_client"],
+        "rejected_saturated": admission_state["rejected_saturated"],
+        "readmitted": admission_state["readmitted"]
+    }
+
+@app.get("/api/io-stats")
+async def get_io_stats():
+    """Get the queue depth and read latency of each device the library has touched."""
+    devices = []
+    for state in device_io_state.values():
+        ops = {}
+        for op, stats in state["ops"].items():
+            ops[op] = {
+                "count": stats["count"],
+                "avg_wait_ms": round(stats["wait_total"] / stats["count"] * 1000, 2),
+                "max_wait_ms": round(stats["wait_max"] * 1000, 2),
+                "avg_service_ms": round(stats["service_total"] / stats["count"] * 1000, 2),
+                "recent_service_ms": round(stats["service_ewma"] * 1000, 2),
+                "max_service_ms": round(stats["service_max"] * 1000, 2)
+            }
+        devices.append({
+            "device": state["device"],
+            "kind": state["kind"],
+            "fstype": state["fstype"],
+            "limit": state["limit"],
+            "in_flight": state["in_flight"],
+            "queued": sum(1 for _, _, future in state["waiters"] if not future.done()),
+            "operations": ops
+        })
+    return {"devices": devices, "limits": IO_DEVICE_LIMITS}
+
+def sample_stacks_sync(seconds: float, interval: float, include_idle: bool) -> Dict[str, int]:
+    """Sample every thread's Python stack at a fixed interval and count identical stacks."""
+    own_thread = threading.get_ident()
+    counts = {}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            if not include_idle and frame.f_code.co_name in PROFILE_IDLE_FUNCTIONS:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            frames.append(thread_names.get(thread_id, f"thread-{thread_id}"))
+            stack = ";".join(reversed(frames))
+            counts[stack] = counts.get(stack, 0) + 1
+        time.sleep(interval)
+    return counts
+
+@app.get("/api/admin/profile")
+async def run_sampling_profile(seconds: float = 10, interval_ms: float = 10, idle: bool = False):
+    """Sample all threads for a while and return folded stacks (input for flamegraph.pl, speedscope, ...)."""
+    try:
+        if profile_state["sampling"]:
+            raise HTTPException(status_code=409, detail="A profile is already running")
+        
+        seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+        interval = max(interval_ms, 1) / 1000
+        profile_state["sampling"] = True
+        try:
+            loop = asyncio.get_event_loop()
+            counts = await loop.run_in_executor(profile_executor, sample_stacks_sync, seconds, interval, idle)
+        finally:
+            profile_state["sampling"] = False
+        
+        folded = "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+        return PlainTextResponse(folded, headers={"Content-Disposition": 'inline; filename="profile.folded"'})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error profiling: {str(e)}")
+
+@app.get("/api/admin/profiles/{name}")
+async def get_request_profile(name: str):
+    """Download a saved per-request cProfile dump (pstats format, e.g. for snakeviz or flameprof)."""
+    profile_path = PROFILE_DIR / name
+    if Path(name).name != name or not name.endswith(".prof") or not profile_path.is_file():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path=str(profile_path), media_type="application/octet-stream", filename=name)
+
+def list_folder_photos_sync(folder_full_path: Path):
+    """A folder's media as photo data, its GIFs still to transcode and the time spent detecting file types."""
+    photos = []
+    gif_videos = []
+    type_seconds = 0.0
+    for file_path in folder_full_path.iterdir():
+        try:
+            if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
+                try:
+                    started = time.perf_counter()
+                    file_type = get_file_type(file_path)
+                    type_seconds += time.perf_counter() - started
+                    if file_type != "unknown":
+                        stat = file_path.stat()
+                        photo_data = {
+                            "name": file_path.name,
+                            "path": str(file_path.relative_to(Path(PHOTOS_DIR))),
+                            "type": file_type,
+                            "size": stat.st_size,
+                            "modified": stat.st_mtime
+                        }
+                        
+                        # Add thumbnail info for videos
+                        if file_type == "video":
+                            photo_data["has_thumbnail"] = True
+                        
+                        # Large animated GIFs play as MP4 once transcoded, with a still in the grid
+                        if is_gif_video_sync(photo_data["path"], file_path):
+                            photo_data["gif_video"] = True
+                            if not get_gif_video_path(photo_data["path"], file_path).exists():
+                                gif_videos.append(photo_data["path"])
+                        
+                        photos.append(photo_data)
+                except (OSError, PermissionError):
+                    # Skip files we can't access
+                    continue
+        except (OSError, PermissionError):
+            # Skip items we can't access
+            continue
+    return photos, gif_videos, type_seconds
+
+@app.get("/api/photos/{folder_path:path}")
+async def get_photos(folder_path: str) -> Dict[str, Any]:
+    """Get all photos in a specific folder."""
+    try:
+        # Set this as the current folder for thumbnail priority
+        set_current_folder(folder_path)
+        
+        # URL decode the folder path
+        from urllib.parse import unquote
+        decoded_folder_path = unquote(folder_path)
+        folder_full_path = Path(PHOTOS_DIR) / decoded_folder_path
+        loop = asyncio.get_event_loop()
+        # Try to list the directory directly, even if exists() returns False
+        try:
+            async with device_io_slot(folder_full_path, "listing", IO_PRIORITY_LIVE):
+                with timing_span("listing"):
+                    photos, gif_videos, type_seconds = await loop.run_in_executor(
+                        None, list_folder_photos_sync, folder_full_path
+                    )
+        except (OSError, PermissionError, FileNotFoundError):
+            raise HTTPException(status_code=404, detail="Folder not found")
+        add_timing("type", type_seconds)
+        
+        # We just listed this folder, so let the search index catch up with it
+        submit_index_folder_update(decoded_folder_path.strip('/'))
+        
+        for gif_path in gif_videos:
+            submit_conversion_generation(gif_path)
+        
+        return {
+            "folder": folder_path,
+            "photos": sorted(photos, key=lambda x: x["name"].lower())
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting photos: {str(e)}")
+
+def scan_media_directory_sync(dir_full_path: Path):
+    """A directory's mtime, media files as (name, size, mtime) and subdirectory names."""
+    mtime_ns = dir_full_path.stat().st_mtime_ns
+    files = []
+    subdirs = []
+    with os.scandir(dir_full_path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                elif entry.is_file() and Path(entry.name).suffix.lower() in SUPPORTED_EXTENSIONS:
+                    stat = entry.stat()
+                    files.append((entry.name, stat.st_size, stat.st_mtime))
+            except (OSError, PermissionError):
+                # Skip entries we can't access
+                continue
+    return mtime_ns, files, subdirs
+
+async def walk_media_tree(rel_folder: str) -> Dict[str, Any]:
+    """List every media file beneath a folder, scanning up to RECURSIVE_WALK_CONCURRENCY directories at once."""
+    loop = asyncio.get_event_loop()
+    snapshot = {
+        "seq": library_change_seq,  # Changes recorded after this may not be in the walk
+        "entries": [],  # (path, name, size, mtime, folder)
+        "dir_mtimes": {},  # relative folder -> st_mtime_ns when it was listed
+        "orders": {},  # sort -> entries in ascending order of that sort's key, built on first use
+        "checked": time.monotonic()
+    }
+    pending = asyncio.Queue()
+    pending.put_nowait(rel_folder)
+    
+    async def walk_worker():
+        while True:
+            rel_dir = await pending.get()
+            try:
+                dir_full_path = Path(PHOTOS_DIR) / rel_dir
+                # A walk lists many directories, so each one queues with the index scans rather than ahead of live reads
+                async with device_io_slot(dir_full_path, "walk", IO_PRIORITY_SCAN):
+                    mtime_ns, files, subdirs = await loop.run_in_executor(
+                        recursive_walk_executor, scan_media_directory_sync, dir_full_path
+                    )
+                snapshot["dir_mtimes"][rel_dir] = mtime_ns
+                snapshot["entries"].extend(
+                    (join_relative_path(rel_dir, name), name, size, mtime, rel_dir) for name, size, mtime in files
+                )
+                for name in subdirs:
+                    pending.put_nowait(join_relative_path(rel_dir, name))
+            except (OSError, PermissionError) as e:
+                print(f"⚠️ Could not walk {rel_dir or '/'}: {e}")
+            finally:
+                pending.task_done()
+    
+    start_time = time.time()
+    workers = [asyncio.create_task(walk_worker()) for _ in range(RECURSIVE_WALK_CONCURRENCY)]
+    try:
+        await pending.join()
+    finally:
+        for worker in workers:
+            worker.cancel()
+    print(f"🗂️ Walked {rel_folder or '/'}: {len(snapshot['entries'])} files in {len(snapshot['dir_mtimes'])} folders "
+          f"({time.time() - start_time:.2f}s)")
+    return snapshot
+
+def find_changed_directory_sync(dir_mtimes: Dict[str, int]) -> bool:
+    """Whether any walked directory gained, lost or renamed an entry since it was listed."""
+    for rel_dir, mtime_ns in dir_mtimes.items():
+        try:
+            if (Path(PHOTOS_DIR) / rel_dir).stat().st_mtime_ns != mtime_ns:
+                return True
+        except OSError:
+            return True
+    return False
+
+async def is_recursive_listing_stale(rel_folder: str, snapshot: Dict[str, Any]) -> bool:
+    """Whether a cached subtree may have changed since it was walked."""
+    if watcher_state["fd"] is not None and not watcher_state["fallback_needed"]:
+        # Every folder is watched, so the change log is complete and answers without touching the disk
+        oldest_tracked = next(iter(folder_change_seqs.values()), library_change_seq + 1)
+        if oldest_tracked > snapshot["seq"] + 1 and len(folder_change_seqs) >= MAX_TRACKED_FOLDER_CHANGES:
+            return True
+        prefix = f"{rel_folder}/"
+        for folder, seq in reversed(folder_change_seqs.items()):
+            if seq <= snapshot["seq"]:
+                break
+            if not rel_folder or folder == rel_folder or folder.startswith(prefix):
+                return True
+        return False
+    
+    # Otherwise compare directory mtimes, at most every RECURSIVE_REVALIDATE_SECONDS so paging stays cheap
+    if time.monotonic() - snapshot["checked"] < RECURSIVE_REVALIDATE_SECONDS:
+        return False
+    loop = asyncio.get_event_loop()
+    async with device_io_slot(Path(PHOTOS_DIR) / rel_folder, "walk", IO_PRIORITY_SCAN):
+        changed = await loop.run_in_executor(recursive_walk_executor, find_changed_directory_sync, snapshot["dir_mtimes"])
+    snapshot["checked"] = time.monotonic()
+    return changed
+
+async def get_recursive_listing(rel_folder: str):
+    """Walked subtree from cache, or a fresh walk if it may have changed; returns (snapshot, served from cache)."""
+    snapshot = recursive_listing_cache.get(rel_folder)
+    if snapshot is not None and not await is_recursive_listing_stale(rel_folder, snapshot):
+        # Re-insert so the least recently used subtree is the one dropped
+        recursive_listing_cache.pop(rel_folder, None)
+        recursive_listing_cache[rel_folder] = snapshot
+        return snapshot, True
+    
+    task = recursive_walk_inflight.get(rel_folder)
+    if task is None:
+        task = start_background_task(walk_media_tree(rel_folder))  # Shared by every request waiting on it
+        recursive_walk_inflight[rel_folder] = task
+        task.add_done_callback(lambda _: recursive_walk_inflight.pop(rel_folder, None))
+    # Shielded so one client going away doesn't cancel the walk for everyone waiting on it
+    snapshot = await asyncio.shield(task)
+    recursive_listing_cache.pop(rel_folder, None)
+    recursive_listing_cache[rel_folder] = snapshot
+    if len(recursive_listing_cache) > RECURSIVE_CACHE_SIZE:
+        recursive_listing_cache.pop(next(iter(recursive_listing_cache)))
+    return snapshot, False
+
+def sort_recursive_entries_sync(entries: List[tuple], sort: str) -> List[tuple]:
+    """Walked entries in ascending order of a sort's key."""
+    return sorted(entries, key=RECURSIVE_SORT_KEYS[sort])
+
+def encode_recursive_cursor(key: tuple) -> str:
+    """Opaque cursor holding the sort key of the last entry on a page."""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+def decode_recursive_cursor(cursor: str, sort: str) -> tuple:
+    """Sort key a cursor points after; raises ValueError for anything encode_recursive_cursor didn't produce for this sort."""
+    key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(key, list) or len(key) != 2 or not isinstance(key[1], str):
+        raise ValueError("malformed cursor")
+    if not isinstance(key[0], str if sort == "name" else (int, float)):
+        raise ValueError("cursor belongs to another sort")
+    return tuple(key)
+
+def get_recursive_page(ordered: List[tuple], sort: str, descending: bool, after_key, limit: int):
+    """One page of sorted entries after a cursor key (a sort key, not an offset) and the next page's cursor."""
+    key = RECURSIVE_SORT_KEYS[sort]
+    if descending:
+        end = len(ordered) if after_key is None else bisect.bisect_left(ordered, after_key, key=key)
+        start = max(0, end - limit)
+        page = ordered[start:end][::-1]
+        has_more = start > 0
+    else:
+        start = 0 if after_key is None else bisect.bisect_right(ordered, after_key, key=key)
+        page = ordered[start:start + limit]
+        has_more = start + limit < len(ordered)
+    return page, encode_recursive_cursor(key(page[-1])) if has_more and page else None
+
+def get_indexed_recursive_page_sync(rel_folder: str, sort: str, descending: bool, after_key, limit: int):
+    """A get_recursive_page-compatible page of the indexed files beneath a folder, or None if it isn't indexed."""
+    conn = get_search_read_connection()
+    if rel_folder and conn.execute("SELECT 1 FROM dirs WHERE path = ?", (rel_folder,)).fetchone() is None:
+        return None
+    
+    # Every path under 'folder/' sorts between 'folder/' and 'folder0', so the UNIQUE index on path covers the subtree
+    subtree = "path >= ? AND path < ?" if rel_folder else "1"
+    subtree_params = [rel_folder + '/', rel_folder + '0'] if rel_folder else []
+    file_count = conn.execute(f"SELECT COUNT(*) FROM files WHERE {subtree}", subtree_params).fetchone()[0]
+    folder_count = conn.execute(
+        f"SELECT COUNT(*) FROM dirs WHERE path = ? OR ({subtree})", [rel_folder] + subtree_params
+    ).fetchone()[0]
+    
+    key_column = RECURSIVE_SORT_COLUMNS[sort]
+    direction = "DESC" if descending else "ASC"
+    conditions = [subtree]
+    params = list(subtree_params)
+    if after_key is not None:
+        conditions.append(f"({key_column}, path) {'<' if descending else '>'} (?, ?)")
+        params.extend(after_key)
+    rows = conn.execute(
+        f"SELECT {key_column}, path, name, size, mtime, folder FROM files WHERE {' AND '.join(conditions)} "
+        f"ORDER BY {key_column} {direction}, path {direction} LIMIT ?",
+        params + [limit + 1]  # One extra row tells us whether there is another page
+    ).fetchall()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "entries": [row[1:] for row in rows],
+        "next_cursor": encode_recursive_cursor(rows[-1][:2]) if has_more else None,
+        "total_count": file_count,
+        "folder_count": folder_count
     }
 
-@app.get("/api/thumbnail-cache/status")
-async def get_thumbnail_cache_status():
-    """Get the current status of the thumbnail cache."""
-    return {
-        "cache_size": len(thumbnail_cache),
-        "processing_count": len(thumbnail_processing),
-        "queue_size": thumbnail_queue.qsize(),
-        "max_concurrent": MAX_CONCURRENT_THUMBNAILS,
-        "cache_keys": list(thumbnail_cache.keys())[:10],  # Show first 10 keys
-        "processing_files": list(thumbnail_processing)[:10]  # Show first 10 processing files
+def find_changed_indexed_dirs_sync(rel_folder: str) -> List[str]:
+    """Indexed directories beneath a folder whose mtime no longer matches the index."""
+    conn = get_search_read_connection()
+    rows = conn.execute(
+        "SELECT path, mtime_ns FROM dirs WHERE path = ? OR (path >= ? AND path < ?)" if rel_folder else "SELECT path, mtime_ns FROM dirs",
+        (rel_folder, rel_folder + '/', rel_folder + '0') if rel_folder else ()
+    ).fetchall()
+    changed = []
+    for path, mtime_ns in rows:
+        try:
+            if (Path(PHOTOS_DIR) / path).stat().st_mtime_ns != mtime_ns:
+                changed.append(path)
+        except OSError:
+            changed.append(path)
+    return changed
+
+async def revalidate_indexed_subtree(rel_folder: str):
+    """Without inotify, re-index a subtree's changed directories before its pages are served from the index."""
+    if watcher_state["fd"] is not None and not watcher_state["fallback_needed"]:
+        return  # The watcher keeps the index current
+    if time.monotonic() - recursive_index_checked.get(rel_folder, 0) < RECURSIVE_REVALIDATE_SECONDS:
+        return
+    loop = asyncio.get_event_loop()
+    async with device_io_slot(Path(PHOTOS_DIR) / rel_folder, "walk", IO_PRIORITY_SCAN):
+        changed = await loop.run_in_executor(search_query_executor, find_changed_indexed_dirs_sync, rel_folder)
+    for rel_dir in changed:
+        await ingest_folder(rel_dir, only_if_changed=True)
+    recursive_index_checked.pop(rel_folder, None)  # Re-insert so the oldest check is the one dropped
+    recursive_index_checked[rel_folder] = time.monotonic()
+    if len(recursive_index_checked) > RECURSIVE_CACHE_SIZE:
+        recursive_index_checked.pop(next(iter(recursive_index_checked)))
+
+def get_recursive_photo_data(entry: tuple) -> Dict[str, Any]:
+    """Listing fields of a walked entry, the same as get_photos returns plus the file's folder."""
+    path, name, size, mtime, folder = entry
+    ext = Path(name).suffix.lower()
+    photo_data = {
+        "name": name,
+        "path": path,
+        "type": "image" if ext in IMAGE_EXTENSIONS else "video",
+        "size": size,
+        "modified": mtime,
+        "folder": folder
     }
+    if photo_data["type"] == "video":
+        photo_data["has_thumbnail"] = True
+    if ext == '.gif' and size >= GIF_VIDEO_MIN_BYTES:
+        photo_data["gif_video"] = True
+    return photo_data
 
-@app.get("/api/photos/{folder_path:path}")
-async def get_photos(folder_path: str) -> Dict[str, Any]:
-    """Get all photos in a specific folder."""
+def mark_still_gifs_sync(photos: List[Dict[str, Any]]):
+    """Show large GIFs known to be stills as images."""
+    for photo_data in photos:
+        if not photo_data.get("gif_video"):
+            continue
+        try:
+            if get_gif_still_marker_path(photo_data["path"], Path(PHOTOS_DIR) / photo_data["path"]).exists():
+                del photo_data["gif_video"]
+        except OSError:
+            continue
+
+@app.get("/api/photos-recursive/{folder_path:path}")
+async def get_photos_recursive(folder_path: str, sort: str = "name", order: str = "asc", cursor: str = None,
+                               limit: int = RECURSIVE_DEFAULT_LIMIT) -> Dict[str, Any]:
+    """Get one page of all photos beneath a folder, subfolders included, in the chosen sort order."""
     try:
-        # Set this as the current folder for thumbnail priority
-        set_current_folder(folder_path)
+        if sort not in RECURSIVE_SORT_KEYS:
+            raise HTTPException(status_code=400, detail=f"Sort must be one of: {', '.join(RECURSIVE_SORT_KEYS)}")
+        if order not in ("asc", "desc"):
+            raise HTTPException(status_code=400, detail="Order must be asc or desc")
         
         # URL decode the folder path
         from urllib.parse import unquote
         decoded_folder_path = unquote(folder_path)
-        folder_full_path = Path(PHOTOS_DIR) / decoded_folder_path
-        # Try to access the directory directly, even if exists() returns False
-        try:
-            # Try to list the directory contents
-            list(folder_full_path.iterdir())
-        except (OSError, PermissionError, FileNotFoundError):
+        rel_folder = decoded_folder_path.strip('/')
+        folder_full_path = Path(PHOTOS_DIR) / rel_folder
+        if not folder_full_path.is_dir():
             raise HTTPException(status_code=404, detail="Folder not found")
         
-        photos = []
-        for file_path in folder_full_path.iterdir():
-            try:
-                if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
-                    try:
-                        file_type = get_file_type(file_path)
-                        if file_type != "unknown":
-                            photo_data = {
-                                "name": file_path.name,
-                                "path": str(file_path.relative_to(Path(PHOTOS_DIR))),
-                                "type": file_type,
-                                "size": file_path.stat().st_size,
-                                "modified": file_path.stat().st_mtime
-                            }
-                            
-                            # Add thumbnail info for videos
-                            if file_type == "video":
-                                photo_data["has_thumbnail"] = True
-                            
-                            photos.append(photo_data)
-                    except (OSError, PermissionError):
-                        # Skip files we can't access
-                        continue
-            except (OSError, PermissionError):
-                # Skip items we can't access
-                continue
+        # Security check: ensure folder is within photos directory
+        try:
+            folder_full_path.resolve().relative_to(Path(PHOTOS_DIR).resolve())
+        except ValueError:
+            if not str(folder_full_path).startswith(str(Path(PHOTOS_DIR))):
+                raise HTTPException(status_code=403, detail="Access denied")
+        
+        # Set this as the current folder for thumbnail priority (files in subfolders count as part of it)
+        set_current_folder(folder_path)
+        
+        try:
+            after_key = decode_recursive_cursor(cursor, sort) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        limit = max(1, min(limit, RECURSIVE_MAX_LIMIT))
+        
+        loop = asyncio.get_event_loop()
+        indexed = None
+        if search_index_state["ready"] and search_index_state["last_refresh"] is not None:
+            # The whole library has been indexed and the watcher (or, on polled mounts, a check of the subtree's
+            # directory mtimes) keeps it current, so pages come straight from it
+            with timing_span("revalidate"):
+                await revalidate_indexed_subtree(rel_folder)
+            with timing_span("index"):
+                indexed = await loop.run_in_executor(
+                    search_query_executor, get_indexed_recursive_page_sync, rel_folder, sort, order == "desc", after_key, limit
+                )
+        
+        if indexed is not None:
+            page, next_cursor = indexed["entries"], indexed["next_cursor"]
+            total_count, folder_count, cached = indexed["total_count"], indexed["folder_count"], True
+            submit_index_folder_update(rel_folder)  # Let the index catch up if the folder itself just changed
+        else:
+            # Not indexed yet (first start, or a folder created moments ago) - walk the subtree instead
+            with timing_span("walk"):
+                snapshot, cached = await get_recursive_listing(rel_folder)
+            ordered = snapshot["orders"].get(sort)
+            if ordered is None:
+                with timing_span("sort"):
+                    ordered = await loop.run_in_executor(
+                        recursive_walk_executor, sort_recursive_entries_sync, snapshot["entries"], sort
+                    )
+                snapshot["orders"][sort] = ordered
+            page, next_cursor = get_recursive_page(ordered, sort, order == "desc", after_key, limit)
+            total_count, folder_count = len(ordered), len(snapshot["dir_mtimes"])
+        photos = [get_recursive_photo_data(entry) for entry in page]
+        
+        # Transcodes are queued by folder listings and ingest, not by every page shown here
+        await loop.run_in_executor(None, mark_still_gifs_sync, photos)
         
         return {
             "folder": folder_path,
-            "photos": sorted(photos, key=lambda x: x["name"].lower())
+            "sort": sort,
+            "order": order,
+            "photos": photos,
+            "next_cursor": next_cursor,
+            "total_count": total_count,
+            "folder_count": folder_count,
+            "cached": cached,
+            "indexed": indexed is not None
         }
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error getting photos: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting photos recursively: {str(e)}")
+
+@app.get("/api/search")
+async def search_files(q: str, limit: int = SEARCH_DEFAULT_LIMIT, cursor: int = 0) -> Dict[str, Any]:
+    """Search file paths across the whole library using the prebuilt index."""
+    try:
+        query = q.strip()
+        if not query:
+            raise HTTPException(status_code=400, detail="Search query is empty")
+        
+        if not search_index_state["ready"]:
+            raise HTTPException(status_code=503, detail="Search index is not ready yet")
+        
+        limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+        loop = asyncio.get_event_loop()
+        page = await loop.run_in_executor(search_query_executor, search_index_query_sync, query, limit, cursor)
+        
+        return {
+            "query": query,
+            "results": page["results"],
+            "next_cursor": page["next_cursor"],
+            # False until the first full walk finishes, so results may still be incomplete
+            "index_complete": search_index_state["last_refresh"] is not None
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching files: {str(e)}")
+
+@app.get("/api/search-index/status")
+async def get_search_index_status():
+    """Get the current status of the filename search index."""
+    indexed_files = None
+    if search_index_state["ready"]:
+        def count_files():
+            return get_search_read_connection().execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        indexed_files = await asyncio.get_event_loop().run_in_executor(search_query_executor, count_files)
+    
+    return {
+        "ready": search_index_state["ready"],
+        "trigram_fts": search_index_state["fts"],
+        "refreshing": search_index_state["refreshing"],
+        "last_refresh": search_index_state["last_refresh"],
+        "refresh_interval": SEARCH_REFRESH_INTERVAL,
+        "indexed_files": indexed_files,
+        "database": str(SEARCH_DB_PATH)
+    }
+
+@app.get("/api/changes")
+async def get_library_changes(since: int = 0):
+    """List folders whose contents changed after a given change sequence number."""
+    since = max(since, 0)
+    oldest_tracked = next(iter(folder_change_seqs.values()), library_change_seq + 1)
+    return {
+        "seq": library_change_seq,
+        "folders": [folder for folder, seq in folder_change_seqs.items() if seq > since],
+        # Older changes were forgotten - the client can't tell exactly what changed, so it should reload
+        "truncated": since > 0 and oldest_tracked > since + 1 and len(folder_change_seqs) >= MAX_TRACKED_FOLDER_CHANGES
+    }
 
 @app.post("/api/set-current-folder/{folder_path:path}")
 async def set_current_folder_endpoint(folder_path: str):
@@ -748,28 +3628,37 @@ async def set_current_folder_endpoint(folder_path: str):
         raise HTTPException(status_code=500, detail=f"Error setting current folder: {str(e)}")
 
 @app.get("/api/photo/{file_path:path}")
-async def serve_photo(file_path: str, request: Request):
+async def serve_photo(file_path: str, request: Request, prefetch: bool = False):
     """Serve a specific photo or video file, with HTTP Range support for videos."""
     try:
         # URL decode the file path
         from urllib.parse import unquote
         decoded_file_path = unquote(file_path)
         full_path = Path(PHOTOS_DIR) / decoded_file_path
-        if not full_path.exists() or not full_path.is_file():
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        # Security check: ensure file is within photos directory
-        try:
-            full_path.resolve().relative_to(Path(PHOTOS_DIR).resolve())
-        except ValueError:
-            if not str(full_path).startswith(str(Path(PHOTOS_DIR))):
-                raise HTTPException(status_code=403, detail="Access denied")
+        with timing_span("fs"):
+            if not full_path.exists() or not full_path.is_file():
+                raise HTTPException(status_code=404, detail="File not found")
+            
+            # Security check: ensure file is within photos directory
+            try:
+                full_path.resolve().relative_to(Path(PHOTOS_DIR).resolve())
+            except ValueError:
+                if not str(full_path).startswith(str(Path(PHOTOS_DIR))):
+                    raise HTTPException(status_code=403, detail="Access denied")
         
         # Check if this is a video that needs conversion
         if needs_conversion(full_path):
             # Redirect to conversion endpoint
             return RedirectResponse(url=f"/api/convert/{file_path}")
         
+        device = mark_live_read(full_path)
+        range_header = request.headers.get("range")
+        
+        # Warm the next/previous items when the viewer asks (grid tiles don't) - only on the first request
+        # for a file, not every Range chunk
+        if prefetch and (not range_header or range_header.replace(" ", "").startswith("bytes=0-")):
+            schedule_prefetch(decoded_file_path.strip('/'))
+        
         # Determine content type
         content_type, _ = mimetypes.guess_type(str(full_path))
         if not content_type:
@@ -777,7 +3666,6 @@ async def serve_photo(file_path: str, request: Request):
         
         # If it's a video and Range header is present, handle partial content
         if full_path.suffix.lower() in VIDEO_EXTENSIONS:
-            range_header = request.headers.get("range")
             file_size = full_path.stat().st_size
             if range_header:
                 # Example: Range: bytes=0-1023
@@ -790,9 +3678,15 @@ async def serve_photo(file_path: str, request: Request):
                     end = file_size - 1
                 end = min(end, file_size - 1)
                 chunk_size = end - start + 1
-                with open(full_path, "rb") as f:
-                    f.seek(start)
-                    data = f.read(chunk_size)
+                live_reads_by_device[device] = live_reads_by_device.get(device, 0) + 1
+                try:
+                    async with device_io_slot(full_path, "range_read", IO_PRIORITY_LIVE):
+                        loop = asyncio.get_event_loop()
+                        with timing_span("range_read"):
+                            data = await loop.run_in_executor(io_read_executor, read_file_range_sync, full_path, start, chunk_size)
+                finally:
+                    live_reads_by_device[device] -= 1
+                    last_live_read_by_device[device] = time.monotonic()
                 headers = {
                     "Content-Range": f"bytes {start}-{end}/{file_size}",
                     "Accept-Ranges": "bytes",
@@ -811,25 +3705,420 @@ async def serve_photo(file_path: str, request: Request):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error serving file: {str(e)}")
 
-@app.get("/api/convert/{file_path:path}")
-async def convert_video_stream(file_path: str, request: Request):
-    """Convert and stream a video file on-the-fly."""
+@app.get("/api/display/{file_path:path}")
+async def serve_display_rendition(file_path: str, request: Request, w: int = 1920, h: int = 1080, prefetch: bool = True):
+    """Serve a screen-sized rendition of an image, negotiating AVIF/WebP/JPEG from the Accept header."""
+    try:
+        # URL decode the file path
+        from urllib.parse import unquote
+        decoded_file_path = unquote(file_path)
+        full_path = Path(PHOTOS_DIR) / decoded_file_path
+        if not full_path.exists() or not full_path.is_file():
+            raise HTTPException(status_code=404, detail="File not found")
+        
+        # Security check: ensure file is within photos directory
+        try:
+            full_path.resolve().relative_to(Path(PHOTOS_DIR).resolve())
+        except ValueError:
+            if not str(full_path).startswith(str(Path(PHOTOS_DIR))):
+                raise HTTPException(status_code=403, detail="Access denied")
+        
+        ext = full_path.suffix.lower()
+        if ext not in IMAGE_EXTENSIONS:
+            raise HTTPException(status_code=400, detail="File is not an image")
+        
+        max_width = bucket_rendition_size(max(1, w))
+        max_height = bucket_rendition_size(max(1, h))
+        
+        if is_rendition_passthrough(full_path):
+            return RedirectResponse(url=f"/api/photo/{file_path}")
+        
+        fmt = negotiate_rendition_format(request.headers.get("accept"))
+        output_path = get_rendition_path(decoded_file_path, full_path, max_width, max_height, fmt)
+        
+        # Pre-generate the neighbours' renditions at the same size and format
+        if prefetch:
+            schedule_prefetch(decoded_file_path.strip('/'), (max_width, max_height, fmt))
+        
+        if not output_path.exists():
+            device = mark_live_read(full_path)
+            live_reads_by_device[device] = live_reads_by_device.get(device, 0) + 1
+            try:
+                rendition_ready = await ensure_display_rendition(full_path, output_path, max_width, max_height, fmt)
+            finally:
+                live_reads_by_device[device] -= 1
+                last_live_read_by_device[device] = time.monotonic()
+            if not rendition_ready:
+                # Pillow couldn't handle it - fall back to the original
+                return RedirectResponse(url=f"/api/photo/{file_path}")
+        
+        return FileResponse(
+            path=str(output_path),
+            media_type=RENDITION_MEDIA_TYPES[fmt],
+            headers={
+                "Vary": "Accept",
+                "Cache-Control": "public, max-age=86400"
+            }
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error serving display rendition: {str(e)}")
+
+@app.get("/api/deepzoom/{file_path:path}")
+async def get_deep_zoom_info(file_path: str) -> Dict[str, Any]:
+    """Describe the tile pyramid of a large image, starting a background build if it doesn't exist yet."""
     try:
         # URL decode the file path
         from urllib.parse import unquote
         decoded_file_path = unquote(file_path)
         full_path = Path(PHOTOS_DIR) / decoded_file_path
+        if not full_path.exists() or not full_path.is_file():
+            raise HTTPException(status_code=404, detail="File not found")
+        
+        # Security check: ensure file is within photos directory
+        try:
+            full_path.resolve().relative_to(Path(PHOTOS_DIR).resolve())
+        except ValueError:
+            if not str(full_path).startswith(str(Path(PHOTOS_DIR))):
+                raise HTTPException(status_code=403, detail="Access denied")
         
+        if full_path.suffix.lower() not in DEEP_ZOOM_EXTENSIONS:
+            raise HTTPException(status_code=400, detail="File is not a still image")
+        
+        loop = asyncio.get_event_loop()
+        width, height, scale = await loop.run_in_executor(None, read_deep_zoom_geometry_sync, full_path)
+        if not DEEP_ZOOM_MIN_PIXELS <= width * height or scale == 0:
+            # Small enough for a display rendition (or too big to decode at all)
+            return {"deep_zoom": False, "width": width, "height": height}
+        # Very large JPEGs are tiled from a downscaled decode, so the pyramid tops out below full size
+        width, height = math.ceil(width / scale), math.ceil(height / scale)
+        
+        pyramid_dir = get_deep_zoom_pyramid_dir(decoded_file_path, full_path)
+        if pyramid_dir.exists():
+            status = "ready"
+        elif str(pyramid_dir) in deepzoom_failed:
+            status = "failed"
+        else:
+            submit_deep_zoom_build(full_path, pyramid_dir)
+            status = "building"
+        
+        return {
+            "deep_zoom": True,
+            "status": status,
+            "width": width,
+            "height": height,
+            "tile_size": DEEP_ZOOM_TILE_SIZE,
+            "overlap": DEEP_ZOOM_TILE_OVERLAP,
+            "format": "jpeg",
+            "max_level": get_deep_zoom_max_level(width, height),
+            "scale": scale,
+            "version": pyramid_dir.name
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting deep zoom info: {str(e)}")
+
+@app.get("/api/deepzoom-tile/{file_path:path}")
+async def serve_deep_zoom_tile(file_path: str, level: int, x: int, y: int, v: str = None):
+    """Serve one tile of a built pyramid - of version v if given, else of the current version."""
+    try:
+        # URL decode the file path
+        from urllib.parse import unquote
+        decoded_file_path = unquote(file_path)
+        full_path = Path(PHOTOS_DIR) / decoded_file_path
         if not full_path.exists() or not full_path.is_file():
             raise HTTPException(status_code=404, detail="File not found")
         
-        # Security check
+        # Security check: ensure file is within photos directory
         try:
             full_path.resolve().relative_to(Path(PHOTOS_DIR).resolve())
         except ValueError:
             if not str(full_path).startswith(str(Path(PHOTOS_DIR))):
                 raise HTTPException(status_code=403, detail="Access denied")
         
+        if v is not None and not v.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid pyramid version")
+        pyramid_dir = get_deep_zoom_dir(decoded_file_path) / v if v else get_deep_zoom_pyramid_dir(decoded_file_path, full_path)
+        tile_path = pyramid_dir / str(level) / f"{x}_{y}.jpeg"
+        if not tile_path.exists():
+            raise HTTPException(status_code=404, detail="Tile not found")
+        
+        # A tile of a given version never changes (an edit makes a new version), so only those are cached for good
+        return FileResponse(
+            path=str(tile_path),
+            media_type="image/jpeg",
+            headers={"Cache-Control": "public, max-age=31536000, immutable" if v else "no-cache"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error serving deep zoom tile: {str(e)}")
+
+def has_cached_video_thumbnail(file_path: str) -> bool:
+    """Whether a video's thumbnail is in the cache, without touching the disk."""
+    return thumbnail_cache_keys.get(file_path) in thumbnail_cache
+
+def get_folder_cover_version(cover: List[Dict[str, Any]]) -> str:
+    """Signature of a cover's members and their current state; part of the cover URL and file name."""
+    signature = hashlib.md5()
+    for item in cover:
+        has_thumbnail = item["type"] == "image" or has_cached_video_thumbnail(item["path"])
+        signature.update(f"{item['path']}:{item['mtime']}:{has_thumbnail}\n".encode())
+    return signature.hexdigest()[:16]
+
+def get_folder_cover_prefix(rel_folder: str) -> str:
+    """File name prefix shared by every version of a folder's cover."""
+    return hashlib.md5(rel_folder.encode()).hexdigest() + '_'
+
+def remove_folder_covers(rel_folder: str):
+    """Delete every cached cover of a folder."""
+    for stale in FOLDER_COVER_DIR.glob(get_folder_cover_prefix(rel_folder) + '*'):
+        stale.unlink(missing_ok=True)
+
+def get_folder_stats_fields(rel_folder: str, stats) -> Dict[str, Any]:
+    """Recursive stats and cover URL of a folder for listings (None until its aggregates have been computed)."""
+    if stats is None:
+        return {"recursive_file_count": None, "total_bytes": None, "newest_mtime": None, "cover_url": None}
+    from urllib.parse import quote
+    cover_url = None
+    if stats["cover"]:
+        cover_url = f"/api/folder-cover/{quote(rel_folder)}?v={get_folder_cover_version(stats['cover'])}"
+    return {
+        "recursive_file_count": stats["file_count"],
+        "total_bytes": stats["total_bytes"],
+        "newest_mtime": stats["newest_mtime"],
+        "cover_url": cover_url
+    }
+
+async def add_folder_stats(folders: List[Dict[str, Any]]):
+    """Add the stored recursive stats and cover URL to each folder of a listing."""
+    try:
+        loop = asyncio.get_event_loop()
+        stats = await loop.run_in_executor(search_query_executor, get_folder_stats_sync, [f["path"] for f in folders])
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not read folder stats: {e}")
+        stats = {}
+    for folder in folders:
+        folder.update(get_folder_stats_fields(folder["path"], stats.get(folder["path"])))
+
+def build_folder_cover_sync(rel_folder: str, cover: List[Dict[str, Any]], fmt: str, output_path: Path) -> bool:
+    """Draw a folder's cover: a 2x2 mosaic of its representative media, or one item filling it."""
+    try:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        build_started = time.time()
+        size = FOLDER_COVER_TILE * 2
+        mosaic = Image.new('RGB', (size, size), CONTACT_SHEET_BACKGROUND)
+        tile = size if len(cover) == 1 else FOLDER_COVER_TILE
+        for index, item in enumerate(cover):
+            member = {
+                "path": item["path"],
+                "type": item["type"],
+                "placeholder": item["type"] == "video" and not has_cached_video_thumbnail(item["path"])
+            }
+            try:
+                mosaic.paste(render_media_tile_sync(member, tile), ((index % 2) * tile, (index // 2) * tile))
+            except Exception as e:
+                # Leave the background showing for items we can't decode
+                print(f"⚠️ Folder cover tile failed for {item['path']}: {e}")
+        
+        temp_path = output_path.with_name(output_path.name + ".tmp")
+        mosaic.save(temp_path, format=fmt.upper(), quality=RENDITION_QUALITY[fmt])
+        os.replace(temp_path, output_path)
+        
+        # Drop covers made from older members. The other format of this version stays, and so does anything
+        # written since we started - it may be from newer folder stats
+        version = output_path.stem.rsplit('_', 1)[-1]
+        for stale in FOLDER_COVER_DIR.glob(get_folder_cover_prefix(rel_folder) + '*'):
+            if stale.suffix == '.tmp' or stale.stem.rsplit('_', 1)[-1] == version:
+                continue
+            try:
+                if stale.stat().st_mtime < build_started:
+                    stale.unlink()
+            except OSError:
+                pass
+        return True
+    except Exception as e:
+        print(f"❌ Error building folder cover for {rel_folder or '/'}: {e}")
+        output_path.with_name(output_path.name + ".tmp").unlink(missing_ok=True)
+        return False
+
+def resolve_contact_sheet_request(folder_path: str, offset: int, limit: int, tile: int):
+    """Validate contact sheet parameters, returning (relative folder, offset, limit, tile size)."""
+    from urllib.parse import unquote
+    decoded_folder_path = unquote(folder_path)
+    folder_full_path = Path(PHOTOS_DIR) / decoded_folder_path
+    
+    if not folder_full_path.exists() or not folder_full_path.is_dir():
+        raise HTTPException(status_code=404, detail="Folder not found")
+    
+    # Security check: ensure folder is within photos directory
+    try:
+        folder_full_path.resolve().relative_to(Path(PHOTOS_DIR).resolve())
+    except ValueError:
+        if not str(folder_full_path).startswith(str(Path(PHOTOS_DIR))):
+            raise HTTPException(status_code=403, detail="Access denied")
+    
+    if tile > CONTACT_SHEET_TILE_SIZES[-1]:
+        raise HTTPException(status_code=400, detail=f"Tile size must be at most {CONTACT_SHEET_TILE_SIZES[-1]}")
+    tile = next(size for size in CONTACT_SHEET_TILE_SIZES if max(1, tile) <= size)
+    
+    offset = max(0, offset)
+    limit = max(1, min(limit, CONTACT_SHEET_MAX_LIMIT))
+    return decoded_folder_path.strip('/'), offset, limit, tile
+
+@app.get("/api/contact-sheet-layout/{folder_path:path}")
+async def get_contact_sheet_layout_endpoint(folder_path: str, offset: int = 0, limit: int = CONTACT_SHEET_DEFAULT_LIMIT,
+                                            tile: int = 256) -> Dict[str, Any]:
+    """Get the tile layout of one contact sheet page (the sheet itself is served by /api/contact-sheet)."""
+    try:
+        rel_folder, offset, limit, tile = resolve_contact_sheet_request(folder_path, offset, limit, tile)
+        
+        loop = asyncio.get_event_loop()
+        page = await loop.run_in_executor(None, get_contact_sheet_page_sync, rel_folder, offset, limit)
+        columns, rows = get_contact_sheet_grid(len(page["members"]))
+        
+        from urllib.parse import quote
+        return {
+            "folder": rel_folder,
+            "offset": offset,
+            "limit": limit,
+            "total": page["total"],
+            "tile": tile,
+            "columns": columns,
+            "rows": rows,
+            "width": columns * tile,
+            "height": rows * tile,
+            "signature": page["signature"],
+            # The signature pins the sheet to this layout, so a folder change in between can't mismatch them
+            "url": f"/api/contact-sheet/{quote(rel_folder)}?offset={offset}&limit={limit}&tile={tile}&signature={page['signature']}",
+            "tiles": get_contact_sheet_layout(page["members"], tile)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting contact sheet layout: {str(e)}")
+
+@app.get("/api/contact-sheet/{folder_path:path}")
+async def serve_contact_sheet(folder_path: str, request: Request, offset: int = 0, limit: int = CONTACT_SHEET_DEFAULT_LIMIT,
+                              tile: int = 256, signature: str = None):
+    """Serve one page of a folder as a single sprite image; 409 if its layout signature is outdated."""
+    try:
+        rel_folder, offset, limit, tile = resolve_contact_sheet_request(folder_path, offset, limit, tile)
+        
+        loop = asyncio.get_event_loop()
+        page = await loop.run_in_executor(None, get_contact_sheet_page_sync, rel_folder, offset, limit)
+        if not page["members"]:
+            raise HTTPException(status_code=404, detail="No items in this page")
+        if signature is not None and signature != page["signature"]:
+            raise HTTPException(status_code=409, detail="Contact sheet page changed, reload its layout")
+        
+        # AVIF encodes of a whole sheet are too slow to be worth it here
+        fmt = "webp" if "image/webp" in (request.headers.get("accept") or "").lower() else "jpeg"
+        output_path = get_contact_sheet_path(rel_folder, offset, limit, tile, fmt, page["signature"])
+        
+        if not output_path.exists():
+            built = await run_deduplicated(
+                contact_sheet_inflight, str(output_path), contact_sheet_executor,
+                build_contact_sheet_sync, rel_folder, page["members"], tile, fmt, output_path
+            )
+            if not built:
+                raise HTTPException(status_code=500, detail="Could not build contact sheet")
+        
+        return FileResponse(
+            path=str(output_path),
+            media_type=RENDITION_MEDIA_TYPES[fmt],
+            headers={
+                "Vary": "Accept",
+                # A signed URL never changes content; without one the URL stays the same when members change,
+                # so always revalidate (ETag follows the file)
+                "Cache-Control": "public, max-age=31536000, immutable" if signature else "no-cache"
+            }
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error serving contact sheet: {str(e)}")
+
+@app.get("/api/folder-cover/{folder_path:path}")
+async def serve_folder_cover(folder_path: str, request: Request, v: str = None):
+    """Serve a folder's cover mosaic at the version `v` the listing linked; 409 once that version is gone."""
+    try:
+        # URL decode the folder path
+        from urllib.parse import unquote
+        decoded_folder_path = unquote(folder_path)
+        folder_full_path = Path(PHOTOS_DIR) / decoded_folder_path
+        if not folder_full_path.exists() or not folder_full_path.is_dir():
+            raise HTTPException(status_code=404, detail="Folder not found")
+        
+        # Security check: ensure folder is within photos directory
+        try:
+            folder_full_path.resolve().relative_to(Path(PHOTOS_DIR).resolve())
+        except ValueError:
+            if not str(folder_full_path).startswith(str(Path(PHOTOS_DIR))):
+                raise HTTPException(status_code=403, detail="Access denied")
+        
+        rel_folder = decoded_folder_path.strip('/')
+        loop = asyncio.get_event_loop()
+        stats = (await loop.run_in_executor(search_query_executor, get_folder_stats_sync, [rel_folder])).get(rel_folder)
+        if not stats or not stats["cover"]:
+            raise HTTPException(status_code=404, detail="No cover for this folder")
+        
+        fmt = "webp" if "image/webp" in (request.headers.get("accept") or "").lower() else "jpeg"
+        version = get_folder_cover_version(stats["cover"])
+        if v is not None and v != version:
+            # Linked by an older listing - serve that version while it's still cached, never build it
+            if not v.isalnum():
+                raise HTTPException(status_code=400, detail="Invalid cover version")
+            linked_path = FOLDER_COVER_DIR / f"{get_folder_cover_prefix(rel_folder)}{v}.{fmt}"
+            if not linked_path.exists():
+                raise HTTPException(status_code=409, detail="Folder cover changed, reload the listing")
+            version = v
+        output_path = FOLDER_COVER_DIR / f"{get_folder_cover_prefix(rel_folder)}{version}.{fmt}"
+        
+        if not output_path.exists():
+            built = await run_deduplicated(
+                folder_cover_inflight, str(output_path), contact_sheet_executor,
+                build_folder_cover_sync, rel_folder, stats["cover"], fmt, output_path
+            )
+            if not built:
+                raise HTTPException(status_code=500, detail="Could not build folder cover")
+        
+        return FileResponse(
+            path=str(output_path),
+            media_type=RENDITION_MEDIA_TYPES[fmt],
+            headers={
+                "Vary": "Accept",
+                # Listings link covers with their version, so a URL always means the same image
+                "Cache-Control": "public, max-age=86400"
+            }
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error serving folder cover: {str(e)}")
+
+@app.get("/api/convert/{file_path:path}")
+async def convert_video_stream(file_path: str, request: Request):
+    """Convert and stream a video file on-the-fly."""
+    try:
+        # URL decode the file path
+        from urllib.parse import unquote
+        decoded_file_path = unquote(file_path)
+        full_path = Path(PHOTOS_DIR) / decoded_file_path
+        
+        with timing_span("fs"):
+            if not full_path.exists() or not full_path.is_file():
+                raise HTTPException(status_code=404, detail="File not found")
+            
+            # Security check
+            try:
+                full_path.resolve().relative_to(Path(PHOTOS_DIR).resolve())
+            except ValueError:
+                if not str(full_path).startswith(str(Path(PHOTOS_DIR))):
+                    raise HTTPException(status_code=403, detail="Access denied")
+        
         # Check if file needs conversion
         if not needs_conversion(full_path):
             raise HTTPException(status_code=400, detail="File does not need conversion")
@@ -852,9 +4141,10 @@ async def convert_video_stream(file_path: str, request: Request):
                         end = file_size - 1
                     end = min(end, file_size - 1)
                     chunk_size = end - start + 1
-                    with open(cached_path, "rb") as f:
-                        f.seek(start)
-                        data = f.read(chunk_size)
+                    with timing_span("range_read"):
+                        with open(cached_path, "rb") as f:
+                            f.seek(start)
+                            data = f.read(chunk_size)
                     headers = {
                         "Content-Range": f"bytes {start}-{end}/{file_size}",
                         "Accept-Ranges": "bytes",
@@ -871,7 +4161,8 @@ async def convert_video_stream(file_path: str, request: Request):
             return {"status": "processing", "message": "Video is being converted"}
         
         # Start streaming conversion directly
-        return await stream_conversion(file_path, full_path)
+        with timing_span("ffmpeg_start"):
+            return await stream_conversion(file_path, full_path)
         
     except HTTPException:
         raise
@@ -880,13 +4171,20 @@ async def convert_video_stream(file_path: str, request: Request):
 
 async def stream_conversion(file_path: str, input_path: Path):
     """Stream video conversion on-the-fly."""
+    # Each stream is a full-speed ffmpeg that pauses all backfill, so only a few run at once
+    try:
+        await asyncio.wait_for(interactive_ffmpeg_semaphore.acquire(), timeout=INTERACTIVE_FFMPEG_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Too many conversions streaming",
+                            headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)})
+    process = None
+    output_path = None
+    streaming = False
     try:
         # Create a unique temporary output file for streaming
-        import tempfile
-        import uuid
-        temp_output = tempfile.NamedTemporaryFile(suffix='.mp4', delete=False)
-        temp_output.close()
-        output_path = Path(temp_output.name)
+        fd, temp_output = tempfile.mkstemp(suffix='.mp4')
+        os.close(fd)
+        output_path = Path(temp_output)
         
         # FFmpeg command for streaming conversion
         cmd = [
@@ -897,13 +4195,17 @@ async def stream_conversion(file_path: str, input_path: Path):
             '-y', str(output_path)
         ]
         
-        # Start FFmpeg process
-        process = subprocess.Popen(
-            cmd, 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE,
-            bufsize=0
+        # Start FFmpeg process as interactive work - the user is waiting on this one
+        process = await start_ffmpeg(
+            cmd,
+            "interactive",
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
         )
+        # Keep draining stderr so ffmpeg never blocks on a full pipe
+        stderr_tail = bytearray()
+        stderr_task = asyncio.create_task(collect_stderr_tail(process.stderr, stderr_tail))
         
         # Wait a bit for FFmpeg to start and create the output file
         await asyncio.sleep(0.5)
@@ -911,52 +4213,44 @@ async def stream_conversion(file_path: str, input_path: Path):
         # Stream the output file as it's being created
         async def stream_file():
             last_position = 0
+            begin_interactive_work()  # Background conversions pause while this streams
             try:
-                while process.poll() is None or output_path.exists():
-                    if output_path.exists():
-                        # Read only new data since last read
-                        with open(output_path, 'rb') as f:
-                            f.seek(last_position)
-                            while True:
-                                chunk = f.read(8192)  # 8KB chunks
-                                if not chunk:
-                                    break
-                                yield chunk
-                            # Update position for next read
-                            last_position = f.tell()
-                        
-                        # If process is still running, wait a bit before next read
-                        if process.poll() is None:
-                            await asyncio.sleep(0.1)
-                        else:
-                            # Process finished, read any remaining data
-                            if output_path.exists():
-                                with open(output_path, 'rb') as f:
-                                    f.seek(last_position)
-                                    while True:
-                                        chunk = f.read(8192)
-                                        if not chunk:
-                                            break
-                                        yield chunk
-                            break
-                    else:
-                        # File doesn't exist yet, wait a bit
-                        await asyncio.sleep(0.1)
+                while True:
+                    # Check before reading, so nothing written just before exit is missed
+                    finished = process.returncode is not None
+                    # Read only new data since last read
+                    with open(output_path, 'rb') as f:
+                        f.seek(last_position)
+                        while True:
+                            chunk = f.read(8192)  # 8KB chunks
+                            if not chunk:
+                                break
+                            yield chunk
+                        # Update position for next read
+                        last_position = f.tell()
+                    
+                    if finished:
+                        # Process finished and the remaining data has been read
+                        if process.returncode != 0:
+                            await stderr_task
+                            print(f"❌ Streaming conversion failed for {file_path}: {stderr_tail.decode(errors='replace')}")
+                        break
+                    # Process is still running, wait a bit before next read
+                    await asyncio.sleep(0.1)
             finally:
-                # Clean up
-                try:
-                    process.terminate()
-                    process.wait(timeout=5)
-                except:
-                    process.kill()
+                # Clean up - also runs when the client goes away mid-stream
+                stderr_task.cancel()
+                await stop_ffmpeg(process)
+                end_interactive_work()
+                interactive_ffmpeg_semaphore.release()
                 
                 # Clean up temporary file
-                if output_path.exists():
-                    output_path.unlink()
+                output_path.unlink(missing_ok=True)
                 
                 print(f"Streaming conversion completed for {file_path}")
         
-        # Return streaming response
+        # Return streaming response - from here stream_file releases the interactive slot
+        streaming = True
         return StreamingResponse(
             stream_file(),
             media_type="video/mp4",
@@ -968,7 +4262,53 @@ async def stream_conversion(file_path: str, input_path: Path):
         
     except Exception as e:
         print(f"Error in streaming conversion for {file_path}: {e}")
+        if process is not None:
+            await stop_ffmpeg(process)
+        if output_path is not None:
+            output_path.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=f"Streaming conversion failed: {str(e)}")
+    finally:
+        if not streaming:
+            interactive_ffmpeg_semaphore.release()
+
+@app.get("/api/gif-video/{file_path:path}")
+async def serve_gif_video(file_path: str):
+    """Serve the MP4 transcode of a large animated GIF, queueing the transcode if it doesn't exist yet."""
+    try:
+        # URL decode the file path
+        from urllib.parse import unquote
+        decoded_file_path = unquote(file_path)
+        full_path = Path(PHOTOS_DIR) / decoded_file_path
+        if not full_path.exists() or not full_path.is_file():
+            raise HTTPException(status_code=404, detail="File not found")
+        
+        # Security check: ensure file is within photos directory
+        try:
+            full_path.resolve().relative_to(Path(PHOTOS_DIR).resolve())
+        except ValueError:
+            if not str(full_path).startswith(str(Path(PHOTOS_DIR))):
+                raise HTTPException(status_code=403, detail="Access denied")
+        
+        if not is_gif_video_sync(decoded_file_path, full_path):
+            raise HTTPException(status_code=400, detail="Not a GIF that is served as video")
+        
+        output_path = get_gif_video_path(decoded_file_path, full_path)
+        if not output_path.exists():
+            if file_path not in conversion_processing and not submit_conversion_generation(file_path):
+                raise HTTPException(status_code=503, detail="Conversion queue is full",
+                                    headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)})
+            raise HTTPException(status_code=404, detail="Video not ready")
+        
+        conversion_cache[f"{file_path}_converted"] = output_path
+        return FileResponse(
+            path=str(output_path),
+            media_type="video/mp4",
+            headers={"Cache-Control": "public, max-age=86400"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error serving GIF video: {str(e)}")
 
 @app.get("/api/conversion-status/{file_path:path}")
 async def get_conversion_status(file_path: str):
@@ -993,6 +4333,10 @@ async def get_conversion_status(file_path: str):
         if file_path in conversion_processing:
             return {"status": "processing"}
         
+        failure = get_job_failure("conversion", file_path)
+        if failure:
+            return {"status": "failed", **failure}
+        
         # Not in cache and not processing
         return {"status": "not_started"}
             
@@ -1007,7 +4351,7 @@ async def get_conversion_cache_status():
     return {
         "cache_size": len(conversion_cache),
         "processing_count": len(conversion_processing),
-        "queue_size": conversion_queue.qsize(),
+        "queue_size": len(conversion_queued),
         "max_concurrent": MAX_CONCURRENT_CONVERSIONS,
         "cache_keys": list(conversion_cache.keys())[:10],  # Show first 10 keys
         "processing_files": list(conversion_processing)[:10]  # Show first 10 processing files
@@ -15,8 +15,55 @@ const photoApi = {
     const response = await axios.get(`${API_BASE_URL}/api/photos/${encodeURIComponent(folderPath)}`);
     return response.data;
   },
-  getPhotoUrl: (photoPath) => {
-    return `${API_BASE_URL}/api/photo/${encodeURIComponent(photoPath)}`;
+  getPhotosRecursive: async (folderPath, sort, order, cursor = null) => {
+    const response = await axios.get(`${API_BASE_URL}/api/photos-recursive/${encodeURIComponent(folderPath)}`, {
+      params: { sort, order, ...(cursor ? { cursor } : {}) }
+    });
+    return response.data;
+  },
+  searchFiles: async (query, cursor = 0) => {
+    const response = await axios.get(`${API_BASE_URL}/api/search`, { params: { q: query, cursor } });
+    return response.data;
+  },
+  getContactSheetLayout: async (folderPath, offset, limit, tile) => {
+    const response = await axios.get(`${API_BASE_URL}/api/contact-sheet-layout/${encodeURIComponent(folderPath)}`, {
+      params: { offset, limit, tile }
+    });
+    return response.data;
+  },
+  getContactSheetUrl: (layout) => {
+    // The layout's URL carries its signature, so the sheet always matches the layout
+    return `${API_BASE_URL}${layout.url}`;
+  },
+  getChanges: async (since) => {
+    const response = await axios.get(`${API_BASE_URL}/api/changes`, { params: { since } });
+    return response.data;
+  },
+  // Original file; full-screen viewing opts in to warming the next/previous items, grid tiles never do
+  getPhotoUrl: (photoPath, prefetch = false) => {
+    return `${API_BASE_URL}/api/photo/${encodeURIComponent(photoPath)}${prefetch ? '?prefetch=true' : ''}`;
+  },
+  // Screen-sized rendition for full-screen viewing (format is negotiated by the browser's Accept header)
+  getDisplayUrl: (photoPath) => {
+    const dpr = window.devicePixelRatio || 1;
+    const width = Math.round(window.innerWidth * dpr);
+    const height = Math.round(window.innerHeight * dpr);
+    return `${API_BASE_URL}/api/display/${encodeURIComponent(photoPath)}?w=${width}&h=${height}`;
+  },
+  // First-frame still of a large GIF, sized for a grid tile
+  getStillUrl: (photoPath, size) => {
+    const pixels = Math.round(size * (window.devicePixelRatio || 1));
+    return `${API_BASE_URL}/api/display/${encodeURIComponent(photoPath)}?w=${pixels}&h=${pixels}&prefetch=false`;
+  },
+  getGifVideoUrl: (photoPath) => {
+    return `${API_BASE_URL}/api/gif-video/${encodeURIComponent(photoPath)}`;
+  },
+  getDeepZoomInfo: async (photoPath) => {
+    const response = await axios.get(`${API_BASE_URL}/api/deepzoom/${encodeURIComponent(photoPath)}`);
+    return response.data;
+  },
+  getDeepZoomTileUrl: (photoPath, level, x, y, version) => {
+    return `${API_BASE_URL}/api/deepzoom-tile/${encodeURIComponent(photoPath)}?level=${level}&x=${x}&y=${y}&v=${version}`;
   }
 };
 
@@ -33,6 +80,156 @@ const formatDate = (timestamp) => {
   return new Date(timestamp * 1000).toLocaleDateString();
 };
 
+// Contact sheets: each page of the grid is drawn from one sprite image instead of one request per tile
+const CONTACT_SHEET_PAGE_SIZE = 100;
+const CONTACT_SHEET_TILE_SIZES = [128, 256, 384, 512]; // Must match the backend buckets
+
+const getContactSheetTileSize = (imageSize) => {
+  const wanted = Math.ceil(imageSize * (window.devicePixelRatio || 1));
+  return CONTACT_SHEET_TILE_SIZES.find(size => wanted <= size) || null;
+};
+
+// Background style that shows one tile of a sheet, scaled to whatever box it's applied to
+const getContactSheetTileStyle = (sheet, tile) => {
+  const column = tile.x / sheet.tile;
+  const row = tile.y / sheet.tile;
+  return {
+    backgroundImage: `url(${sheet.imageUrl})`,
+    backgroundSize: `${sheet.columns * 100}% ${sheet.rows * 100}%`,
+    backgroundPosition: `${sheet.columns > 1 ? (column / (sheet.columns - 1)) * 100 : 0}% ${sheet.rows > 1 ? (row / (sheet.rows - 1)) * 100 : 0}%`
+  };
+};
+
+// Loads contact sheet pages for a folder; returns null when sheets aren't used for this view
+const useContactSheets = (folderPath, photoCount, imageSize, enabled, pages) => {
+  const [sheets, setSheets] = useState({}); // page -> layout, or 'failed'
+  const requestedRef = React.useRef(new Set());
+  const tileSize = getContactSheetTileSize(imageSize);
+  const sheetKey = enabled && folderPath && tileSize ? `${folderPath}|${tileSize}|${photoCount}` : null;
+
+  useEffect(() => {
+    requestedRef.current = new Set();
+    setSheets({});
+  }, [sheetKey]);
+
+  useEffect(() => {
+    if (!sheetKey) return;
+    const requested = requestedRef.current;
+    pages.forEach(async (page) => {
+      if (requested.has(page)) return;
+      requested.add(page);
+      const offset = page * CONTACT_SHEET_PAGE_SIZE;
+      try {
+        const layout = await photoApi.getContactSheetLayout(folderPath, offset, CONTACT_SHEET_PAGE_SIZE, tileSize);
+        const imageUrl = photoApi.getContactSheetUrl(layout);
+        new Image().src = imageUrl;
+        const tilesByPath = {};
+        layout.tiles.forEach(tile => { tilesByPath[tile.path] = tile; });
+        if (requestedRef.current === requested) {
+          setSheets(prev => ({ ...prev, [page]: { ...layout, imageUrl, tilesByPath } }));
+        }
+      } catch (error) {
+        console.log('Could not load contact sheet page:', page, error);
+        if (requestedRef.current === requested) {
+          setSheets(prev => ({ ...prev, [page]: 'failed' }));
+        }
+      }
+    });
+  }, [sheetKey, pages.join(',')]);
+
+  return sheetKey ? sheets : null;
+};
+
+// Virtualized grid: only rows near the viewport are mounted, so huge folders don't create (or fetch) every tile
+const GRID_GAP = 16; // Matches the 1rem gap of the grid
+const GRID_OVERSCAN_ROWS = 3; // Rows mounted above and below the viewport
+const GRID_INFO_HEIGHT = 64; // Estimated height of the name/size block until a row has been measured
+const MASONRY_MOUNT_MARGIN = '1000px'; // Masonry tiles mount when they get this close to the viewport
+const THUMBNAIL_RETRY_AFTER_DEFAULT = 5; // Seconds to wait when the server turns a thumbnail away without a Retry-After
+
+// Which part of an element is inside its scroll container; `top` is rounded down to `step` to limit re-renders
+const useVisibleRegion = (scrollContainerRef, elementRef, step, active) => {
+  const [region, setRegion] = useState({ top: 0, height: window.innerHeight, width: 0 });
+
+  React.useLayoutEffect(() => {
+    const container = scrollContainerRef?.current;
+    const element = elementRef.current;
+    if (!element) return;
+    let frame = null;
+    const measure = () => {
+      frame = null;
+      const viewTop = container ? container.getBoundingClientRect().top : 0;
+      const top = Math.max(0, viewTop - element.getBoundingClientRect().top);
+      const next = {
+        top: Math.floor(top / step) * step,
+        height: container ? container.clientHeight : window.innerHeight,
+        width: element.clientWidth
+      };
+      setRegion(prev => (prev.top === next.top && prev.height === next.height && prev.width === next.width) ? prev : next);
+    };
+    const scheduleMeasure = () => {
+      if (frame === null) frame = requestAnimationFrame(measure);
+    };
+    measure();
+
+    const scrollTarget = container || window;
+    scrollTarget.addEventListener('scroll', scheduleMeasure, { passive: true });
+    const resizeObserver = new ResizeObserver(scheduleMeasure);
+    resizeObserver.observe(element);
+    if (container) resizeObserver.observe(container);
+    return () => {
+      scrollTarget.removeEventListener('scroll', scheduleMeasure);
+      resizeObserver.disconnect();
+      if (frame !== null) cancelAnimationFrame(frame);
+    };
+  }, [scrollContainerRef, elementRef, step, active]);
+
+  return region;
+};
+
+// One IntersectionObserver per scroll container, shared by all masonry tiles
+const nearViewportObservers = new WeakMap(); // root element (or document) -> { observer, callbacks }
+
+const observeNearViewport = (root, element, callback) => {
+  const key = root || document;
+  let shared = nearViewportObservers.get(key);
+  if (!shared) {
+    const callbacks = new Map();
+    const observer = new IntersectionObserver(
+      (entries) => entries.forEach(entry => callbacks.get(entry.target)?.(entry.isIntersecting)),
+      { root, rootMargin: MASONRY_MOUNT_MARGIN }
+    );
+    shared = { observer, callbacks };
+    nearViewportObservers.set(key, shared);
+  }
+  shared.callbacks.set(element, callback);
+  shared.observer.observe(element);
+  return () => {
+    shared.callbacks.delete(element);
+    shared.observer.unobserve(element);
+  };
+};
+
+// Mounts its content only while near the viewport; keeps the last measured height as a placeholder otherwise
+const LazyMount = ({ scrollContainerRef, estimatedHeight, render }) => {
+  const ref = React.useRef(null);
+  const heightRef = React.useRef(null);
+  const [nearViewport, setNearViewport] = useState(false);
+
+  useEffect(() => {
+    const element = ref.current;
+    return observeNearViewport(scrollContainerRef?.current || null, element, (isNear) => {
+      if (!isNear) heightRef.current = element.offsetHeight;
+      setNearViewport(isNear);
+    });
+  }, [scrollContainerRef]);
+
+  return React.createElement('div', {
+    ref: ref,
+    style: nearViewport ? undefined : { height: `${heightRef.current || estimatedHeight}px` }
+  }, nearViewport ? render() : null);
+};
+
 // Performance monitoring for lazy loading
 const lazyLoadingStats = {
   totalVideos: 0,
@@ -73,7 +270,7 @@ window.resetLazyLoadingStats = () => {
 };
 
 // Video Thumbnail Component with Lazy Loading
-const VideoThumbnail = ({ photo, imageSize, isMuted, setHoveredVideo, hoveredVideo, showSpeedOverlay, videoSpeed, overlayTarget, originalAspectRatio, onPhotoClick }) => {
+const VideoThumbnail = ({ photo, imageSize, isMuted, setHoveredVideo, hoveredVideo, showSpeedOverlay, videoSpeed, overlayTarget, originalAspectRatio, onPhotoClick, sheetPosterStyle }) => {
   const [isLoaded, setIsLoaded] = useState(false);
   const [isVideoReady, setIsVideoReady] = useState(false);
   const [isHovered, setIsHovered] = useState(false);
@@ -145,6 +342,12 @@ const VideoThumbnail = ({ photo, imageSize, isMuted, setHoveredVideo, hoveredVid
 
   // Load thumbnail asynchronously
   React.useEffect(() => {
+    // The contact sheet already has this video's thumbnail
+    if (sheetPosterStyle) {
+      setThumbnailStatus('ready');
+      return;
+    }
+
     const loadThumbnail = async () => {
       try {
         // First check if thumbnail is ready
@@ -161,24 +364,15 @@ const VideoThumbnail = ({ photo, imageSize, isMuted, setHoveredVideo, hoveredVid
             // Start polling for completion
             startThumbnailPolling();
             return;
+          } else if (statusData.status === 'failed') {
+            // The backend gave up on this file (or is waiting to retry it)
+            setThumbnailStatus('failed');
+            return;
           }
         }
         
         // If not started, initiate thumbnail generation
-        const response = await fetch(`${API_BASE_URL}/api/thumbnail/${encodeURIComponent(photo.path)}`);
-        if (response.ok) {
-          const data = await response.json();
-          
-          if (data.thumbnail) {
-            // Immediate response (cached)
-            setThumbnail(data.thumbnail);
-            setThumbnailStatus('ready');
-          } else if (data.status === 'processing' || data.status === 'queued') {
-            // Started processing, begin polling
-            setThumbnailStatus('processing');
-            startThumbnailPolling();
-          }
-        }
+        await requestThumbnail();
       } catch (error) {
         console.log('Could not load thumbnail for video:', photo.path);
         setThumbnailStatus('failed');
@@ -208,6 +402,32 @@ const VideoThumbnail = ({ photo, imageSize, isMuted, setHoveredVideo, hoveredVid
     }
   }, [thumbnail, thumbnailStatus, photo.path]);
 
+  const requestThumbnail = async () => {
+    const response = await fetch(`${API_BASE_URL}/api/thumbnail/${encodeURIComponent(photo.path)}`);
+    if (response.status === 429 || response.status === 503) {
+      // The server's queue (or our share of it) is full - ask again when it says to
+      const retryAfter = parseInt(response.headers.get('Retry-After'), 10) || THUMBNAIL_RETRY_AFTER_DEFAULT;
+      setThumbnailStatus('processing');
+      thumbnailPollingRef.current = setTimeout(() => {
+        requestThumbnail().catch(() => setThumbnailStatus('failed'));
+      }, retryAfter * 1000);
+    } else if (response.ok) {
+      const data = await response.json();
+      
+      if (data.thumbnail) {
+        // Immediate response (cached)
+        setThumbnail(data.thumbnail);
+        setThumbnailStatus('ready');
+      } else if (data.status === 'processing' || data.status === 'queued') {
+        // Started processing, begin polling
+        setThumbnailStatus('processing');
+        startThumbnailPolling();
+      } else if (data.status === 'failed') {
+        setThumbnailStatus('failed');
+      }
+    }
+  };
+
   const startThumbnailPolling = () => {
     const pollThumbnail = async () => {
       try {
@@ -219,9 +439,14 @@ const VideoThumbnail = ({ photo, imageSize, isMuted, setHoveredVideo, hoveredVid
             setThumbnail(data.thumbnail);
             setThumbnailStatus('ready');
             return; // Stop polling
-          } else if (data.status === 'processing') {
+          } else if (data.status === 'processing' || data.status === 'queued') {
             // Continue polling
             thumbnailPollingRef.current = setTimeout(pollThumbnail, 1000); // Poll every second
+          } else if (data.status === 'not_started') {
+            // Shed from a full queue - ask for it again
+            await requestThumbnail();
+          } else if (data.status === 'failed') {
+            setThumbnailStatus('failed');
           }
         }
       } catch (error) {
@@ -408,11 +633,12 @@ const VideoThumbnail = ({ photo, imageSize, isMuted, setHoveredVideo, hoveredVid
     }
   },
     // Always show thumbnail when available, but fade it out when video is ready
-    thumbnail && thumbnailStatus === 'ready' ? 
-      React.createElement('img', {
-        src: thumbnail,
+    (thumbnail || sheetPosterStyle) && thumbnailStatus === 'ready' ? 
+      React.createElement(sheetPosterStyle ? 'div' : 'img', {
+        src: sheetPosterStyle ? undefined : thumbnail,
         style: {
           ...thumbnailStyle,
+          ...sheetPosterStyle,
           ...(originalAspectRatio && {
             width: '100%',
             height: '100%',
@@ -509,7 +735,42 @@ const VideoThumbnail = ({ photo, imageSize, isMuted, setHoveredVideo, hoveredVid
   );
 };
 
-const PhotoGrid = ({ photos, onPhotoClick, imageSize, showImageInfo, setHoveredVideo, hoveredVideo, videoSpeed, showSpeedOverlay, overlayTarget, originalAspectRatio, isMuted }) => {
+const PhotoGrid = ({ photos, onPhotoClick, imageSize, showImageInfo, setHoveredVideo, hoveredVideo, videoSpeed, showSpeedOverlay, overlayTarget, originalAspectRatio, isMuted, sheetFolder, scrollContainerRef }) => {
+  // Window of rows to mount in the fixed-height grid
+  const gridRef = React.useRef(null);
+  const firstTileRef = React.useRef(null);
+  const [measuredRowHeight, setMeasuredRowHeight] = useState(null);
+  const rowHeight = measuredRowHeight || imageSize + (showImageInfo ? GRID_INFO_HEIGHT : 0);
+  const rowStride = rowHeight + GRID_GAP;
+  const region = useVisibleRegion(scrollContainerRef, gridRef, rowStride, !originalAspectRatio);
+  const columnCount = Math.max(1, Math.floor((region.width + GRID_GAP) / (imageSize + GRID_GAP)));
+  const rowCount = Math.ceil(photos.length / columnCount);
+  const visibleRows = Math.ceil(region.height / rowStride) + 1;
+  const firstRow = Math.max(0, Math.min(rowCount - 1, Math.floor(region.top / rowStride) - GRID_OVERSCAN_ROWS));
+  const lastRow = Math.max(firstRow, Math.min(rowCount - 1, firstRow + visibleRows + 2 * GRID_OVERSCAN_ROWS));
+  const startIndex = firstRow * columnCount;
+  const endIndex = Math.min(photos.length, (lastRow + 1) * columnCount);
+  // Tiles are keyed by slot, so scrolling reuses DOM nodes instead of creating new ones
+  const slotCount = (visibleRows + 2 * GRID_OVERSCAN_ROWS + 1) * columnCount;
+
+  // Row height depends on the info block, so measure it once rendered
+  React.useLayoutEffect(() => {
+    const height = firstTileRef.current?.offsetHeight;
+    if (height && Math.abs(height - rowHeight) > 0.5) {
+      setMeasuredRowHeight(height);
+    }
+  });
+
+  // Contact sheets are only used in the fixed-height grid of a single folder (sheet order = folder listing order);
+  // only the pages with mounted tiles are requested
+  const firstSheetPage = Math.floor(startIndex / CONTACT_SHEET_PAGE_SIZE);
+  const lastSheetPage = Math.floor(Math.max(startIndex, endIndex - 1) / CONTACT_SHEET_PAGE_SIZE);
+  const sheetPages = React.useMemo(
+    () => Array.from({ length: lastSheetPage - firstSheetPage + 1 }, (_, i) => firstSheetPage + i),
+    [firstSheetPage, lastSheetPage]
+  );
+  const contactSheets = useContactSheets(sheetFolder, photos.length, imageSize, !originalAspectRatio, sheetPages);
+
   // Row-first masonry logic
   if (originalAspectRatio) {
     // Calculate number of columns based on window width and imageSize
@@ -534,114 +795,155 @@ const PhotoGrid = ({ photos, onPhotoClick, imageSize, showImageInfo, setHoveredV
           style: { flex: 1, minWidth: 0, display: 'flex', flexDirection: 'column' }
         },
           col.map((photo) =>
-            React.createElement('div', {
+            React.createElement(LazyMount, {
               key: photo.path,
-              className: 'photo-card cursor-pointer',
-              style: { 
-                marginBottom: '1rem',
-                width: '100%'
-              },
-              onClick: () => onPhotoClick?.(photo)
-            },
-              React.createElement('div', { className: 'relative' },
-                photo.type === 'image' ?
-                  React.createElement('img', {
-                    src: photoApi.getPhotoUrl(photo.path),
-                    alt: photo.name,
-                    style: { width: '100%', height: 'auto', maxWidth: '100%', transition: 'transform 0.2s' },
-                    loading: 'lazy'
-                  }) :
-                  React.createElement(VideoThumbnail, {
-                    photo: photo,
-                    imageSize: imageSize,
-                    isMuted: isMuted,
-                    setHoveredVideo: setHoveredVideo,
-                    hoveredVideo: hoveredVideo,
-                    showSpeedOverlay: showSpeedOverlay,
-                    videoSpeed: videoSpeed,
-                    overlayTarget: overlayTarget,
-                    originalAspectRatio: originalAspectRatio,
-                    onPhotoClick: onPhotoClick
-                  }),
-                React.createElement('div', { className: 'absolute top-2 right-2' },
-                  photo.type === 'image' ?
-                    React.createElement('div', { className: 'text-white drop-shadow text-sm' }, '📷') :
-                    React.createElement('div', { className: 'text-white drop-shadow text-sm' }, '▶')
-                )
-              ),
-              showImageInfo && React.createElement('div', { 
-                className: 'p-3',
+              scrollContainerRef: scrollContainerRef,
+              estimatedHeight: imageSize + GRID_GAP + (showImageInfo ? GRID_INFO_HEIGHT : 0),
+              render: () => React.createElement('div', {
+                className: 'photo-card cursor-pointer',
                 style: { 
-                  position: 'relative',
-                  zIndex: 10,
-                  backgroundColor: 'white',
-                  borderTop: '1px solid #e5e7eb'
-                }
+                  marginBottom: '1rem',
+                  width: '100%'
+                },
+                onClick: () => onPhotoClick?.(photo)
               },
-                React.createElement('h3', {
-                  className: 'text-sm font-medium text-gray-900 truncate',
-                  title: photo.name
-                }, photo.name),
-                React.createElement('div', { className: 'flex justify-between items-center mt-1 text-xs text-gray-500' },
-                  React.createElement('span', null, formatFileSize(photo.size)),
-                  React.createElement('span', null, formatDate(photo.modified))
+                React.createElement('div', { className: 'relative' },
+                  photo.type === 'image' ?
+                    React.createElement('img', {
+                      src: photo.gif_video ? photoApi.getStillUrl(photo.path, imageSize) : photoApi.getPhotoUrl(photo.path),
+                      alt: photo.name,
+                      style: { width: '100%', height: 'auto', maxWidth: '100%', transition: 'transform 0.2s' },
+                      loading: 'lazy'
+                    }) :
+                    React.createElement(VideoThumbnail, {
+                      photo: photo,
+                      imageSize: imageSize,
+                      isMuted: isMuted,
+                      setHoveredVideo: setHoveredVideo,
+                      hoveredVideo: hoveredVideo,
+                      showSpeedOverlay: showSpeedOverlay,
+                      videoSpeed: videoSpeed,
+                      overlayTarget: overlayTarget,
+                      originalAspectRatio: originalAspectRatio,
+                      onPhotoClick: onPhotoClick
+                    }),
+                  React.createElement('div', { className: 'absolute top-2 right-2' },
+                    photo.type === 'image' ?
+                      React.createElement('div', { className: 'text-white drop-shadow text-sm' }, photo.gif_video ? 'GIF' : '📷') :
+                      React.createElement('div', { className: 'text-white drop-shadow text-sm' }, '▶')
+                  )
+                ),
+                showImageInfo && React.createElement('div', { 
+                  className: 'p-3',
+                  style: { 
+                    position: 'relative',
+                    zIndex: 10,
+                    backgroundColor: 'white',
+                    borderTop: '1px solid #e5e7eb'
+                  }
+                },
+                  React.createElement('h3', {
+                    className: 'text-sm font-medium text-gray-900 truncate',
+                    title: photo.name
+                  }, photo.name),
+                  React.createElement('div', { className: 'flex justify-between items-center mt-1 text-xs text-gray-500' },
+                    React.createElement('span', null, formatFileSize(photo.size)),
+                    React.createElement('span', null, formatDate(photo.modified))
+                  )
                 )
               )
-            )
+            })
           )
         )
       )
     );
   }
 
-  // Default grid layout
+  // Default grid layout - same columns as repeat(auto-fill, minmax(imageSize, 1fr)), but only the mounted rows
   const gridStyle = {
     display: 'grid',
-    gridTemplateColumns: `repeat(auto-fill, minmax(${imageSize}px, 1fr))`,
+    gridTemplateColumns: `repeat(${columnCount}, minmax(0, 1fr))`,
     gap: '1rem'
   };
 
-  return React.createElement('div', { style: gridStyle },
-    photos.map((photo) =>
-      React.createElement('div', {
-        key: photo.path,
-        className: 'photo-card cursor-pointer',
-        onClick: () => onPhotoClick?.(photo)
-      },
-        React.createElement('div', { className: 'relative' },
-          photo.type === 'image' ?
-            React.createElement('img', {
-              src: photoApi.getPhotoUrl(photo.path),
-              alt: photo.name,
-              style: { width: '100%', height: `${imageSize}px`, objectFit: 'cover', transition: 'transform 0.2s' },
-              loading: 'lazy'
-            }) :
-            React.createElement(VideoThumbnail, {
-              photo: photo,
-              imageSize: imageSize,
-              isMuted: isMuted,
-              setHoveredVideo: setHoveredVideo,
-              hoveredVideo: hoveredVideo,
-              showSpeedOverlay: showSpeedOverlay,
-              videoSpeed: videoSpeed,
-              overlayTarget: overlayTarget,
-              originalAspectRatio: originalAspectRatio,
-              onPhotoClick: onPhotoClick
-            }),
-          React.createElement('div', { className: 'absolute top-2 right-2' },
-            photo.type === 'image' ?
-              React.createElement('div', { className: 'text-white drop-shadow text-sm' }, '📷') :
-              React.createElement('div', { className: 'text-white drop-shadow text-sm' }, '▶')
-          )
-        ),
-        showImageInfo && React.createElement('div', { className: 'p-3' },
-          React.createElement('h3', {
-            className: 'text-sm font-medium text-gray-900 truncate',
-            title: photo.name
-          }, photo.name),
-          React.createElement('div', { className: 'flex justify-between items-center mt-1 text-xs text-gray-500' },
-            React.createElement('span', null, formatFileSize(photo.size)),
-            React.createElement('span', null, formatDate(photo.modified))
+  const renderGridTile = (photo, index) => {
+    let sheetPosterStyle = null;
+    if (contactSheets) {
+      const sheet = contactSheets[Math.floor(index / CONTACT_SHEET_PAGE_SIZE)];
+      if (sheet === undefined) {
+        // Sheet still loading - hold the tile instead of firing a per-tile request
+        return React.createElement('div', { className: 'bg-gray-200', style: { width: '100%', height: `${imageSize}px` } });
+      }
+      const tile = sheet !== 'failed' && sheet.tilesByPath[photo.path];
+      if (tile && !tile.placeholder) {
+        sheetPosterStyle = getContactSheetTileStyle(sheet, tile);
+      }
+    }
+
+    if (photo.type === 'image') {
+      return sheetPosterStyle ?
+        React.createElement('div', {
+          role: 'img',
+          'aria-label': photo.name,
+          style: { ...sheetPosterStyle, width: '100%', height: `${imageSize}px` }
+        }) :
+        React.createElement('img', {
+          src: photo.gif_video ? photoApi.getStillUrl(photo.path, imageSize) : photoApi.getPhotoUrl(photo.path),
+          alt: photo.name,
+          style: { width: '100%', height: `${imageSize}px`, objectFit: 'cover', transition: 'transform 0.2s' },
+          loading: 'lazy'
+        });
+    }
+
+    return React.createElement(VideoThumbnail, {
+      key: photo.path, // Video state belongs to one file, so videos aren't recycled across slots
+      photo: photo,
+      imageSize: imageSize,
+      isMuted: isMuted,
+      setHoveredVideo: setHoveredVideo,
+      hoveredVideo: hoveredVideo,
+      showSpeedOverlay: showSpeedOverlay,
+      videoSpeed: videoSpeed,
+      overlayTarget: overlayTarget,
+      originalAspectRatio: originalAspectRatio,
+      onPhotoClick: onPhotoClick,
+      sheetPosterStyle: sheetPosterStyle
+    });
+  };
+
+  // Spacers above and below stand in for the rows that aren't mounted
+  return React.createElement('div', {
+    ref: gridRef,
+    style: {
+      paddingTop: `${firstRow * rowStride}px`,
+      paddingBottom: `${Math.max(0, rowCount - lastRow - 1) * rowStride}px`
+    }
+  },
+    React.createElement('div', { style: gridStyle },
+      photos.slice(startIndex, endIndex).map((photo, offset) =>
+        React.createElement('div', {
+          key: (startIndex + offset) % slotCount,
+          ref: offset === 0 ? firstTileRef : undefined,
+          className: 'photo-card cursor-pointer',
+          onClick: () => onPhotoClick?.(photo)
+        },
+          React.createElement('div', { className: 'relative' },
+            renderGridTile(photo, startIndex + offset),
+            React.createElement('div', { className: 'absolute top-2 right-2' },
+              photo.type === 'image' ?
+                React.createElement('div', { className: 'text-white drop-shadow text-sm' }, photo.gif_video ? 'GIF' : '📷') :
+                React.createElement('div', { className: 'text-white drop-shadow text-sm' }, '▶')
+            )
+          ),
+          showImageInfo && React.createElement('div', { className: 'p-3' },
+            React.createElement('h3', {
+              className: 'text-sm font-medium text-gray-900 truncate',
+              title: photo.name
+            }, photo.name),
+            React.createElement('div', { className: 'flex justify-between items-center mt-1 text-xs text-gray-500' },
+              React.createElement('span', null, formatFileSize(photo.size)),
+              React.createElement('span', null, formatDate(photo.modified))
+            )
           )
         )
       )
@@ -806,11 +1108,26 @@ const FolderList = ({ folders, selectedFolder, onFolderSelect, expandedFolders,
             },
             style: { width: '16px', height: '16px' }
           }, '▶'),
-          React.createElement('div', { className: 'text-gray-500 text-lg' }, '📁'),
+          folder.cover_url ?
+            React.createElement('img', {
+              src: `${API_BASE_URL}${folder.cover_url}`,
+              alt: '',
+              className: 'rounded flex-shrink-0 bg-gray-200',
+              style: { width: '40px', height: '40px', objectFit: 'cover' },
+              loading: 'lazy'
+            }) :
+            React.createElement('div', { className: 'text-gray-500 text-lg' }, '📁'),
           React.createElement('div', { className: 'flex-1 min-w-0' },
             React.createElement('p', { className: 'text-sm font-medium text-gray-900 truncate' }, folder.name),
-            React.createElement('p', { className: 'text-xs text-gray-500' },
-              `${folder.file_count} ${folder.file_count === 1 ? 'file' : 'files'}`
+            React.createElement('p', {
+              className: 'text-xs text-gray-500 truncate',
+              title: folder.newest_mtime ? `Newest: ${formatDate(folder.newest_mtime)}` : undefined
+            },
+              `${folder.file_count} ${folder.file_count === 1 ? 'file' : 'files'}`,
+              // Totals including subfolders, once the backend has aggregated them
+              folder.recursive_file_count != null && folder.recursive_file_count !== folder.file_count &&
+                ` · ${folder.recursive_file_count} in total`,
+              folder.total_bytes ? ` · ${formatFileSize(folder.total_bytes)}` : null
             )
           ),
           React.createElement('input', {
@@ -840,6 +1157,62 @@ const FolderList = ({ folders, selectedFolder, onFolderSelect, expandedFolders,
   );
 };
 
+// Large GIFs play as their MP4 transcode; until it's ready (or if it fails) the original GIF is shown
+const GifVideoPlayer = ({ photo, className, style }) => {
+  const [failed, setFailed] = useState(false);
+
+  useEffect(() => {
+    setFailed(false);
+  }, [photo.path]);
+
+  if (failed) {
+    return React.createElement('img', { src: photoApi.getPhotoUrl(photo.path), alt: photo.name, className, style });
+  }
+  return React.createElement('video', {
+    src: photoApi.getGifVideoUrl(photo.path),
+    poster: photoApi.getDisplayUrl(photo.path),
+    autoPlay: true,
+    loop: true,
+    muted: true,
+    playsInline: true,
+    className,
+    style,
+    onError: () => setFailed(true)
+  });
+};
+
+// Deep zoom: very large images are shown from a tile pyramid, fetching only the tiles for the current view and zoom
+const DEEP_ZOOM_POLL_INTERVAL = 2000; // How often to check whether a pyramid has finished building
+const RECURSIVE_SORT_ORDERS = { name: 'asc', modified: 'desc', size: 'desc' }; // Newest and largest first
+
+const DeepZoomViewer = ({ photo, info }) => {
+  const ref = React.useRef(null);
+
+  useEffect(() => {
+    const viewer = OpenSeadragon({
+      element: ref.current,
+      tileSources: {
+        width: info.width,
+        height: info.height,
+        tileSize: info.tile_size,
+        tileOverlap: info.overlap,
+        minLevel: 0,
+        maxLevel: info.max_level,
+        getTileUrl: (level, x, y) => photoApi.getDeepZoomTileUrl(photo.path, level, x, y, info.version)
+      },
+      showNavigationControl: false, // The zoom buttons need image assets; wheel, drag and pinch still work
+      visibilityRatio: 1,
+      maxZoomPixelRatio: 2
+    });
+    return () => viewer.destroy();
+  }, [photo.path, info.version]);
+
+  return React.createElement('div', {
+    ref: ref,
+    style: { width: 'calc(100vw - 2rem)', height: 'calc(100vh - 2rem)' }
+  });
+};
+
 function App() {
   const [folders, setFolders] = useState([]);
   const [selectedFolder, setSelectedFolder] = useState(null);
@@ -860,6 +1233,16 @@ function App() {
   const [expandedFolders, setExpandedFolders] = useState(new Set()); // Track which folders are expanded
   const [subfolders, setSubfolders] = useState({}); // Cache subfolders by parent folder path
   const [selectedFolders, setSelectedFolders] = useState(new Set()); // Track which folders are checked
+  const [showOriginal, setShowOriginal] = useState(false); // Load the original file instead of the display rendition
+  const [deepZoom, setDeepZoom] = useState(null); // Tile pyramid of the full-screen image, once it's built
+  const [searchQuery, setSearchQuery] = useState(''); // Text in the search box
+  const [activeSearch, setActiveSearch] = useState(null); // Query whose results are shown (null when not searching)
+  const [searchCursor, setSearchCursor] = useState(null); // Cursor for the next page of search results
+  const [includeSubfolders, setIncludeSubfolders] = useState(false); // Show everything beneath the selected folder
+  const [recursiveSort, setRecursiveSort] = useState('name'); // Sort of the subfolder-inclusive view
+  const [recursiveCursor, setRecursiveCursor] = useState(null); // Cursor for its next page
+  const [recursiveTotal, setRecursiveTotal] = useState(0); // Media count of the whole subtree
+  const scrollContainerRef = React.useRef(null); // Main content area - the grid virtualizes against its scroll position
 
   useEffect(() => {
     loadFolders();
@@ -871,7 +1254,90 @@ function App() {
     } else {
       setPhotos([]);
     }
-  }, [selectedFolder]);
+  }, [selectedFolder, includeSubfolders, recursiveSort]);
+
+  // Large images switch from the display rendition to the deep zoom viewer once their pyramid is built
+  useEffect(() => {
+    setDeepZoom(null);
+    if (!selectedPhoto || selectedPhoto.type !== 'image' || !window.OpenSeadragon || /\.gif$/i.test(selectedPhoto.name)) {
+      return;
+    }
+    let cancelled = false;
+    let pollTimeout = null;
+    const checkDeepZoom = async () => {
+      try {
+        const info = await photoApi.getDeepZoomInfo(selectedPhoto.path);
+        if (cancelled || !info.deep_zoom) return;
+        if (info.status === 'ready') {
+          setDeepZoom({ ...info, path: selectedPhoto.path });
+        } else if (info.status === 'building') {
+          pollTimeout = setTimeout(checkDeepZoom, DEEP_ZOOM_POLL_INTERVAL);
+        }
+      } catch (error) {
+        console.log('Deep zoom not available:', error);
+      }
+    };
+    checkDeepZoom();
+    return () => {
+      cancelled = true;
+      clearTimeout(pollTimeout);
+    };
+  }, [selectedPhoto?.path]);
+
+  // Debounced library search
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (!query) {
+      if (activeSearch !== null) {
+        setActiveSearch(null);
+        setSearchCursor(null);
+        setPhotos([]);
+      }
+      return;
+    }
+    const searchTimeout = setTimeout(() => runSearch(query), 300);
+    return () => clearTimeout(searchTimeout);
+  }, [searchQuery]);
+
+  // Pick up files added or removed on disk without a manual reload
+  const changeSeqRef = React.useRef(null);
+  useEffect(() => {
+    const pollInterval = setInterval(async () => {
+      try {
+        const changes = await photoApi.getChanges(changeSeqRef.current || 0);
+        const firstPoll = changeSeqRef.current === null;
+        changeSeqRef.current = changes.seq;
+        if (firstPoll || (changes.folders.length === 0 && !changes.truncated)) {
+          return;
+        }
+        const changed = new Set(changes.folders);
+        if (changes.truncated || changed.has('')) {
+          setFolders(await photoApi.getFolders());
+        }
+        if (activeSearch !== null) {
+          return;
+        }
+        if (selectedFolders.size > 0) {
+          if (changes.truncated || [...selectedFolders].some(path => changed.has(path))) {
+            loadPhotosFromMultipleFolders([...selectedFolders]);
+          }
+        } else if (selectedFolder && !includeSubfolders && (changes.truncated || changed.has(selectedFolder.path))) {
+          // (The subfolder view isn't refreshed here - replacing its loaded pages would lose the scroll position)
+          // Refresh in place - no loading spinner, scroll position is kept
+          const photoData = await photoApi.getPhotos(selectedFolder.path);
+          setPhotos(photoData.photos);
+        }
+      } catch (err) {
+        console.error('Error checking for library changes:', err);
+      }
+    }, 10000);
+    return () => clearInterval(pollInterval);
+  }, [selectedFolder, selectedFolders, activeSearch, includeSubfolders]);
+
+  // Go back to the display rendition whenever the full-screen item changes
+  useEffect(() => {
+    setShowOriginal(false);
+  }, [selectedPhoto]);
 
   useEffect(() => {
     let overlayTimeout;
@@ -888,6 +1354,10 @@ function App() {
   // Handle Escape key to close full-screen modal
   useEffect(() => {
     const handleKeyDown = (event) => {
+      // Let text inputs (like the search box) receive their keys
+      if (event.target.tagName === 'INPUT' && !['range', 'checkbox'].includes(event.target.type)) {
+        return;
+      }
       if (selectedPhoto) {
         // Always allow Escape to close full-screen first
         if (event.key === 'Escape') {
@@ -907,6 +1377,12 @@ function App() {
           setFillScreen(!fillScreen);
           return;
         }
+        // Toggle original file for full-screen image
+        if (selectedPhoto.type === 'image' && (event.key === 'o' || event.key === 'O')) {
+          event.preventDefault();
+          setShowOriginal(!showOriginal);
+          return;
+        }
         // Video speed control for full-screen
         if (selectedPhoto.type === 'video' && (event.key === 'q' || event.key === 'Q' || event.key === 'e' || event.key === 'E')) {
           event.preventDefault();
@@ -1034,7 +1510,7 @@ function App() {
     return () => {
       document.removeEventListener('keydown', handleKeyDown);
     };
-      }, [selectedPhoto, photos, toggleImageInfo, hoveredVideo, fillScreen, originalAspectRatio]);
+      }, [selectedPhoto, photos, toggleImageInfo, hoveredVideo, fillScreen, originalAspectRatio, showOriginal]);
 
   const loadFolders = async () => {
     try {
@@ -1065,6 +1541,10 @@ function App() {
         console.error('Failed to set current folder:', err);
       }
       
+      if (includeSubfolders) {
+        await loadRecursivePhotos(folderPath);
+        return;
+      }
       const photoData = await photoApi.getPhotos(folderPath);
       setPhotos(photoData.photos);
     } catch (err) {
@@ -1075,6 +1555,22 @@ function App() {
     }
   };
 
+  const loadRecursivePhotos = async (folderPath, cursor = null) => {
+    const data = await photoApi.getPhotosRecursive(folderPath, recursiveSort, RECURSIVE_SORT_ORDERS[recursiveSort], cursor);
+    setPhotos(prev => cursor === null ? data.photos : [...prev, ...data.photos]);
+    setRecursiveCursor(data.next_cursor);
+    setRecursiveTotal(data.total_count);
+  };
+
+  const loadMoreRecursivePhotos = async () => {
+    try {
+      await loadRecursivePhotos(selectedFolder.path, recursiveCursor);
+    } catch (err) {
+      setError('Failed to load more photos.');
+      console.error('Error loading more photos:', err);
+    }
+  };
+
   const loadPhotosFromMultipleFolders = async (folderPaths) => {
     try {
       setLoading(true);
@@ -1119,6 +1615,28 @@ function App() {
     }
   };
 
+  const runSearch = async (query, cursor = 0) => {
+    try {
+      setLoading(cursor === 0);
+      setError(null);
+      if (cursor === 0) {
+        // Search results replace any folder selection
+        setSelectedFolder(null);
+        setSelectedFolders(new Set());
+      }
+      
+      const data = await photoApi.searchFiles(query, cursor);
+      setPhotos(prev => cursor === 0 ? data.results : [...prev, ...data.results]);
+      setSearchCursor(data.next_cursor);
+      setActiveSearch(query);
+    } catch (err) {
+      setError('Failed to search files.');
+      console.error('Error searching files:', err);
+    } finally {
+      setLoading(false);
+    }
+  };
+
   const handleFolderSelect = (folder) => {
     if (folder === null) {
       // Clear selected folder when using checkboxes
@@ -1127,9 +1645,13 @@ function App() {
       setSelectedFolder(folder);
       // Clear all checkboxes when selecting a single folder
       setSelectedFolders(new Set());
+      setSearchQuery('');
     }
   };
 
+  // Subfolder-inclusive listing of the selected folder (checked folders and search results are always direct)
+  const recursiveView = includeSubfolders && selectedFolder !== null && selectedFolders.size === 0 && activeSearch === null;
+
   const handlePhotoClick = (photo) => {
     setSelectedPhoto(photo);
   };
@@ -1254,6 +1776,15 @@ function App() {
             title: sidebarCollapsed ? 'Expand sidebar' : 'Collapse sidebar'
           }, sidebarCollapsed ? '▶' : '◀')
         ),
+        !sidebarCollapsed && React.createElement('div', { className: 'p-3 border-b border-gray-200 flex-shrink-0' },
+          React.createElement('input', {
+            type: 'search',
+            value: searchQuery,
+            onChange: (e) => setSearchQuery(e.target.value),
+            placeholder: 'Search all files...',
+            className: 'w-full px-3 py-2 text-sm border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500'
+          })
+        ),
         !sidebarCollapsed && React.createElement('div', { className: 'flex-1 overflow-y-auto' },
           React.createElement(FolderList, {
             folders: folders,
@@ -1283,7 +1814,7 @@ function App() {
             )
           )
         ),
-      React.createElement('div', { className: 'flex-1 overflow-auto p-8' },
+      React.createElement('div', { ref: scrollContainerRef, className: 'flex-1 overflow-auto p-8' },
         error ?
           React.createElement('div', { className: 'mb-6 bg-red-50 border border-red-200 rounded-lg p-4' },
             React.createElement('p', { className: 'text-red-800' }, error),
@@ -1292,14 +1823,39 @@ function App() {
               className: 'mt-2 text-sm text-red-600 hover:text-red-800 underline'
             }, 'Try again')
           ) :
-          (selectedFolder || selectedFolders.size > 0) ?
+          (selectedFolder || selectedFolders.size > 0 || activeSearch !== null) ?
             React.createElement('div', null,
               React.createElement('div', { className: 'mb-6' },
                 React.createElement('h2', { className: 'text-2xl font-bold text-gray-900 mb-2' }, 
+                  activeSearch !== null ? `Search: "${activeSearch}"` :
                   selectedFolder ? selectedFolder.name : `${selectedFolders.size} selected folder${selectedFolders.size === 1 ? '' : 's'}`
                 ),
-                React.createElement('p', { className: 'text-gray-600' },
-                  `${photos.length} ${photos.length === 1 ? 'photo' : 'photos'}`
+                React.createElement('div', { className: 'flex items-center space-x-4' },
+                  React.createElement('p', { className: 'text-gray-600' },
+                    recursiveView ?
+                      `${photos.length} of ${recursiveTotal} ${recursiveTotal === 1 ? 'photo' : 'photos'} including subfolders` :
+                      `${photos.length}${searchCursor ? '+' : ''} ${photos.length === 1 ? 'photo' : 'photos'}`
+                  ),
+                  activeSearch === null && selectedFolder && selectedFolders.size === 0 &&
+                    React.createElement('label', { className: 'flex items-center text-sm text-gray-600' },
+                      React.createElement('input', {
+                        type: 'checkbox',
+                        checked: includeSubfolders,
+                        onChange: (e) => setIncludeSubfolders(e.target.checked),
+                        className: 'mr-2 h-4 w-4 text-blue-600 focus:ring-blue-500 border-gray-300 rounded'
+                      }),
+                      'Include subfolders'
+                    ),
+                  recursiveView &&
+                    React.createElement('select', {
+                      value: recursiveSort,
+                      onChange: (e) => setRecursiveSort(e.target.value),
+                      className: 'text-sm border border-gray-300 rounded px-2 py-1'
+                    },
+                      React.createElement('option', { value: 'name' }, 'Name'),
+                      React.createElement('option', { value: 'modified' }, 'Newest first'),
+                      React.createElement('option', { value: 'size' }, 'Largest first')
+                    )
                 )
               ),
               loading ?
@@ -1310,6 +1866,7 @@ function App() {
                 photos.length > 0 ?
                   React.createElement(PhotoGrid, {
                     photos: photos,
+                    sheetFolder: activeSearch === null && selectedFolders.size === 0 && !includeSubfolders ? selectedFolder?.path : null,
                     onPhotoClick: handlePhotoClick,
                     imageSize: imageSize,
                     showImageInfo: showImageInfo,
@@ -1319,12 +1876,29 @@ function App() {
                     showSpeedOverlay: showSpeedOverlay,
                     overlayTarget: overlayTarget,
                     originalAspectRatio: originalAspectRatio,
-                    isMuted: isMuted
+                    isMuted: isMuted,
+                    scrollContainerRef: scrollContainerRef
                   }) :
                   React.createElement('div', { className: 'text-center py-12' },
                     React.createElement('div', { className: 'text-gray-300 text-4xl mb-3' }, '📸'),
-                    React.createElement('p', { className: 'text-gray-500' }, 'No photos found in this folder')
-                  )
+                    React.createElement('p', { className: 'text-gray-500' },
+                      activeSearch !== null ? 'No files match this search' : 'No photos found in this folder'
+                    )
+                  ),
+              // Next page of search results
+              !loading && activeSearch !== null && searchCursor && React.createElement('div', { className: 'text-center py-6' },
+                React.createElement('button', {
+                  onClick: () => runSearch(activeSearch, searchCursor),
+                  className: 'btn-secondary'
+                }, 'Load more results')
+              ),
+              // Next page of the subfolder-inclusive view
+              !loading && recursiveView && recursiveCursor && React.createElement('div', { className: 'text-center py-6' },
+                React.createElement('button', {
+                  onClick: loadMoreRecursivePhotos,
+                  className: 'btn-secondary'
+                }, 'Load more photos')
+              )
             ) :
             React.createElement('div', { className: 'text-center py-12' },
               React.createElement('div', { className: 'text-gray-300 text-5xl mb-4' }, '📸'),
@@ -1363,19 +1937,31 @@ function App() {
             React.createElement('div', { className: 'text-sm text-gray-300' },
               React.createElement('div', null, `Size: ${formatFileSize(selectedPhoto.size)}`),
               React.createElement('div', null, `Modified: ${formatDate(selectedPhoto.modified)}`),
-              React.createElement('div', null, `Type: ${selectedPhoto.type}`)
+              React.createElement('div', null, `Type: ${selectedPhoto.type}`),
+              selectedPhoto.type === 'image' && React.createElement('div', null,
+                deepZoom?.path === selectedPhoto.path ? `Deep zoom: ${deepZoom.width} × ${deepZoom.height} (scroll to zoom, drag to pan)` :
+                showOriginal ? 'Showing original (O for screen size)' : 'Showing screen size (O for original)'
+              )
             )
           ),
           // Main image/video
+          deepZoom?.path === selectedPhoto.path ?
+            React.createElement(DeepZoomViewer, { photo: selectedPhoto, info: deepZoom }) :
+          selectedPhoto.gif_video && !showOriginal ?
+            React.createElement(GifVideoPlayer, {
+              photo: selectedPhoto,
+              className: fillScreen ? 'w-full h-full object-contain' : 'max-w-full max-h-full object-contain',
+              style: fillScreen ? { width: '100vw', height: '100vh' } : { maxHeight: 'calc(100vh - 2rem)' }
+            }) :
           selectedPhoto.type === 'image' ?
             React.createElement('img', {
-              src: photoApi.getPhotoUrl(selectedPhoto.path),
+              src: showOriginal ? photoApi.getPhotoUrl(selectedPhoto.path, true) : photoApi.getDisplayUrl(selectedPhoto.path),
               alt: selectedPhoto.name,
               className: fillScreen ? 'w-full h-full object-contain' : 'max-w-full max-h-full object-contain',
               style: fillScreen ? { width: '100vw', height: '100vh' } : { maxHeight: 'calc(100vh - 2rem)' }
             }) :
             React.createElement('video', {
-              src: photoApi.getPhotoUrl(selectedPhoto.path),
+              src: photoApi.getPhotoUrl(selectedPhoto.path, true),
               controls: true,
               muted: isMuted,
               className: fillScreen ? 'w-full h-full object-contain' : 'max-w-full max-h-full object-contain',